@@ -0,0 +1,161 @@
+"""
+Awaitable facade over pymongo.
+
+pymongo is a blocking driver, so calling it directly from a coroutine
+stalls the event loop (gateway heartbeats included) for the duration
+of every round trip. The classes here dispatch each call onto a bounded
+thread pool shared by the whole bot, so coroutines can simply await them.
+"""
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+_T = TypeVar("_T")
+
+
+class AsyncCollection:
+    """
+    Awaitable wrapper around a pymongo Collection.
+
+    Only the subset of the Collection API used by the bot is exposed.
+    Cursors are fully materialized inside the worker thread,
+    so `find()` returns a list rather than a cursor.
+
+    Attributes
+    ----------
+    collection : Collection
+        The underlying (blocking) pymongo collection.
+    executor : ThreadPoolExecutor
+        The pool on which all blocking calls are run.
+    """
+
+    collection: Collection
+    executor: ThreadPoolExecutor
+
+    def __init__(self, collection: Collection, executor: ThreadPoolExecutor):
+        self.collection = collection
+        self.executor = executor
+
+    @property
+    def name(self) -> str:
+        return self.collection.name
+
+    async def _run(self, fn: Callable[..., _T], *args, **kwargs) -> _T:
+        """
+        Run a blocking function in the executor and await its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(fn, *args, **kwargs)
+        )
+
+    async def find_one(self, *args, **kwargs) -> dict[str, Any] | None:
+        return await self._run(self.collection.find_one, *args, **kwargs)
+
+    async def find(self, *args, **kwargs) -> list[dict[str, Any]]:
+        def _find_all() -> list[dict[str, Any]]:
+            return list(self.collection.find(*args, **kwargs))
+
+        return await self._run(_find_all)
+
+    async def count_documents(self, *args, **kwargs) -> int:
+        return await self._run(self.collection.count_documents, *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs) -> InsertOneResult:
+        return await self._run(self.collection.insert_one, *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs) -> InsertManyResult:
+        return await self._run(self.collection.insert_many, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs) -> UpdateResult:
+        return await self._run(self.collection.update_one, *args, **kwargs)
+
+    async def update_many(self, *args, **kwargs) -> UpdateResult:
+        return await self._run(self.collection.update_many, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs) -> DeleteResult:
+        return await self._run(self.collection.delete_one, *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs) -> DeleteResult:
+        return await self._run(self.collection.delete_many, *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs) -> BulkWriteResult:
+        return await self._run(self.collection.bulk_write, *args, **kwargs)
+
+    async def create_index(self, *args, **kwargs) -> str:
+        return await self._run(self.collection.create_index, *args, **kwargs)
+
+
+class AsyncDatabase:
+    """
+    Awaitable wrapper around a pymongo Database.
+
+    Collections are accessed the same way as with pymongo,
+    e.g. `await async_db.roles.find_one(...)`.
+
+    Attributes
+    ----------
+    database : Database
+        The underlying (blocking) pymongo database.
+    executor : ThreadPoolExecutor
+        Bounded pool shared by every collection of this database.
+    """
+
+    database: Database
+    executor: ThreadPoolExecutor
+
+    def __init__(self, database: Database, max_workers: int = 8):
+        self.database = database
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="comrade-mongo"
+        )
+        self._collections: dict[str, AsyncCollection] = {}
+
+    @property
+    def name(self) -> str:
+        return self.database.name
+
+    def __getitem__(self, name: str) -> AsyncCollection:
+        if name not in self._collections:
+            self._collections[name] = AsyncCollection(
+                self.database[name], self.executor
+            )
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> AsyncCollection:
+        # Only called when normal attribute lookup fails
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def wrap(self, collection: Collection) -> AsyncCollection:
+        """
+        Wrap an existing pymongo Collection so that it runs on this
+        database's executor.
+
+        Parameters
+        ----------
+        collection : Collection
+            The collection to wrap; it may belong to a different database.
+
+        Returns
+        -------
+        AsyncCollection
+            The awaitable collection.
+        """
+        if collection.database == self.database:
+            return self[collection.name]
+        return AsyncCollection(collection, self.executor)
@@ -5,9 +5,12 @@ from aiohttp import ClientSession
 from interactions import Client, Timestamp
 from pymongo.database import Database
 
+from comrade.core.async_db import AsyncDatabase
 from comrade.core.configuration import (
     TIMEZONE,
 )
+from comrade.core.http_cache import HTTPCache
+from comrade.core.http_client import HTTPMetrics
 
 
 class AugmentedClient(Client):
@@ -18,15 +21,18 @@ class AugmentedClient(Client):
     Extra Additions
 
     ---------------
-    - MongoDB connection
+    - MongoDB connection (blocking, and awaitable)
     - Configuration store
     - aiohttp ClientSession
     """
 
     db: Database
+    async_db: AsyncDatabase
     tz: timezone = ZoneInfo(TIMEZONE)
     notify_on_restart: int = 0  # Channel ID to notify on restart
     http_session: ClientSession
+    http_metrics: HTTPMetrics
+    http_cache: HTTPCache | None
 
     @property
     def start_timestamp(self) -> Timestamp | None:
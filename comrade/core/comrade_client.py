@@ -1,18 +1,23 @@
+import asyncio
 from logging import getLogger
 
-import orjson
-from aiohttp import ClientSession
 from interactions import Activity, ActivityType, listen
 from pymongo import MongoClient
 
 from comrade._version import __version__
+from comrade.core.async_db import AsyncDatabase
 from comrade.core.augmentations import AugmentedClient
 from comrade.core.configuration import (
+    HTTP_CACHE_MAX_SIZE,
+    HTTP_CACHE_PATH,
+    MONGODB_MAX_WORKERS,
     MONGODB_URI,
     RELAY_GUILD_ID,
     TEST_GUILD_ID,
 )
 from comrade.core.const import CLIENT_INIT_KWARGS
+from comrade.core.http_cache import HTTPCache, HTTPDiskCache
+from comrade.core.http_client import HTTPMetrics, create_http_session
 from comrade.core.relay_system import RelayMixin
 from comrade.lib.discord_utils import messageable_from_context_id
 
@@ -28,9 +33,9 @@ class Comrade(
 
     Extra Additions
     ---------------
-    - MongoDB connection
+    - MongoDB connection (blocking, and awaitable)
     - Configuration store
-    - aiohttp ClientSession
+    - aiohttp ClientSession (see http_client), its metrics and cache
 
     Overrides
     ---------
@@ -56,6 +61,23 @@ class Comrade(
         self.db = mongo_client[mongo_client.list_database_names()[0]]
         logger.info(f"Connected to MongoDB, database name: {self.db.name}")
 
+        # Awaitable view of the same database, for use inside coroutines
+        self.async_db = AsyncDatabase(self.db, max_workers=MONGODB_MAX_WORKERS)
+
+        # Set by init_relay, once the relay guild is set up
+        self.relay_ready = asyncio.Event()
+
+        # Requests sent by the aiohttp ClientSession, per host
+        self.http_metrics = HTTPMetrics()
+
+        # On-disk cache of pages fetched as text, if enabled
+        if HTTP_CACHE_PATH:
+            self.http_cache = HTTPCache(
+                HTTPDiskCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_SIZE)
+            )
+        else:
+            self.http_cache = None
+
         if kwargs.get("notify_on_restart"):
             self.notify_on_restart = kwargs["notify_on_restart"]
 
@@ -65,7 +87,7 @@ class Comrade(
         Hook onto the first even in the asyncio loop in order
         to initialize the aiohttp ClientSession.
         """
-        self.http_session = ClientSession(json_serialize=orjson.dumps)
+        self.http_session = create_http_session(self.http_metrics)
 
     @listen()
     async def on_ready(self):
@@ -7,6 +7,165 @@ RELAY_GUILD_ID: int = config("COMRADE_RELAY_GUILD_ID", cast=int)
 TIMEZONE: str = config("COMRADE_TIMEZONE", default="UTC")
 ACCENT_COLOUR: int = config("COMRADE_ACCENT_COLOUR", cast=int, default=0xD7342A)
 
+# Performance tuning
+MONGODB_MAX_WORKERS: int = config(
+    "COMRADE_MONGODB_MAX_WORKERS", cast=int, default=8
+)  # threads used to run blocking MongoDB calls off the event loop
+
+# Shared HTTP client
+HTTP_CONNECTION_LIMIT: int = config(
+    "COMRADE_HTTP_CONNECTION_LIMIT", cast=int, default=100
+)  # open connections, across all hosts
+HTTP_CONNECTION_LIMIT_PER_HOST: int = config(
+    "COMRADE_HTTP_CONNECTION_LIMIT_PER_HOST", cast=int, default=10
+)  # open connections to the same host
+HTTP_KEEPALIVE_TIMEOUT: float = config(
+    "COMRADE_HTTP_KEEPALIVE_TIMEOUT", cast=float, default=30.0
+)  # seconds an idle connection is kept open for reuse
+HTTP_DNS_CACHE_TTL: int = config(
+    "COMRADE_HTTP_DNS_CACHE_TTL", cast=int, default=300
+)  # seconds DNS lookups are cached for
+HTTP_TIMEOUT: float = config(
+    "COMRADE_HTTP_TIMEOUT", cast=float, default=60.0
+)  # default limit on a whole request (retries included), in seconds; 0 for none
+HTTP_CONNECT_TIMEOUT: float = config(
+    "COMRADE_HTTP_CONNECT_TIMEOUT", cast=float, default=10.0
+)  # default limit on opening a connection, in seconds; 0 for none
+HTTP_READ_TIMEOUT: float = config(
+    "COMRADE_HTTP_READ_TIMEOUT", cast=float, default=30.0
+)  # default limit on waiting for more data, in seconds; 0 for none
+HTTP_RETRIES: int = config(
+    "COMRADE_HTTP_RETRIES", cast=int, default=2
+)  # extra attempts for idempotent requests which fail transiently
+HTTP_RETRY_BACKOFF: float = config(
+    "COMRADE_HTTP_RETRY_BACKOFF", cast=float, default=0.5
+)  # base delay between attempts, in seconds, doubled after each one
+HTTP_CACHE_PATH: str = config(
+    "COMRADE_HTTP_CACHE_PATH", default=""
+)  # SQLite file caching pages fetched as text (e.g. ./cache/http_pages.sqlite3); off if empty
+HTTP_CACHE_MAX_SIZE: int = config(
+    "COMRADE_HTTP_CACHE_MAX_SIZE", cast=int, default=256 * 1024 * 1024
+)  # total size of cached response bodies, in bytes
+HTTP_CACHE_MAX_ENTRY_SIZE: int = config(
+    "COMRADE_HTTP_CACHE_MAX_ENTRY_SIZE", cast=int, default=4 * 1024 * 1024
+)  # largest response body cached, in bytes
+HTTP_CACHE_HOST_TTLS: str = config(
+    "COMRADE_HTTP_CACHE_HOST_TTLS", default=""
+)  # "host=seconds,..." overriding how long the host's responses stay fresh
+
+# Relay blob cache (memory tier in front of an on-disk SQLite tier)
+RELAY_CACHE_MEMORY_SIZE: int = config(
+    "COMRADE_RELAY_CACHE_MEMORY_SIZE", cast=int, default=1024
+)
+RELAY_CACHE_DISK_SIZE: int = config(
+    "COMRADE_RELAY_CACHE_DISK_SIZE", cast=int, default=65536
+)
+RELAY_CACHE_DISK_PATH: str = config(
+    "COMRADE_RELAY_CACHE_DISK_PATH", default="./cache/relay_blobs.sqlite3"
+)  # set to an empty string to disable the on-disk tier
+RELAY_CACHE_EVICTION: str = config(
+    "COMRADE_RELAY_CACHE_EVICTION", default="lru"
+)  # "lru" or "fifo"
+RELAY_CACHE_WARM_COUNT: int = config(
+    "COMRADE_RELAY_CACHE_WARM_COUNT", cast=int, default=1024
+)  # number of recent blobs pulled from MongoDB at startup
+
+# Relay blob uploads
+RELAY_UPLOAD_BATCH_WINDOW: float = config(
+    "COMRADE_RELAY_UPLOAD_BATCH_WINDOW", cast=float, default=0.2
+)  # seconds to wait for more blobs before sending a batch
+RELAY_UPLOAD_BATCH_MAX_BYTES: int = config(
+    "COMRADE_RELAY_UPLOAD_BATCH_MAX_BYTES", cast=int, default=8 * 1024 * 1024
+)  # total attachment size per batched message
+
+RELAY_MAX_BLOB_SIZE: int = config(
+    "COMRADE_RELAY_MAX_BLOB_SIZE", cast=int, default=10 * 1024 * 1024
+)  # larger blobs are rejected instead of being mirrored
+RELAY_STREAM_THRESHOLD: int = config(
+    "COMRADE_RELAY_STREAM_THRESHOLD", cast=int, default=1024 * 1024
+)  # larger (or unknown-size) downloads are streamed to Discord unbuffered
+
+# NHentai page prefetching
+NHENTAI_PREFETCH_WORKERS: int = config(
+    "COMRADE_NHENTAI_PREFETCH_WORKERS", cast=int, default=4
+)  # pages prefetched at once, across all sessions
+NHENTAI_PREFETCH_PER_HOST: int = config(
+    "COMRADE_NHENTAI_PREFETCH_PER_HOST", cast=int, default=2
+)  # pages prefetched at once from the same image host
+NHENTAI_PREFETCH_MAX_DEPTH: int = config(
+    "COMRADE_NHENTAI_PREFETCH_MAX_DEPTH", cast=int, default=8
+)  # upper bound on the adaptive prefetch depth, in pages
+NHENTAI_GALLERY_CACHE_SIZE: int = config(
+    "COMRADE_NHENTAI_GALLERY_CACHE_SIZE", cast=int, default=256
+)  # parsed galleries kept in memory
+NHENTAI_GALLERY_CACHE_TTL: float = config(
+    "COMRADE_NHENTAI_GALLERY_CACHE_TTL", cast=float, default=3600.0
+)  # seconds before a cached gallery is fetched again
+NHENTAI_GALLERY_CACHE_MONGO: bool = config(
+    "COMRADE_NHENTAI_GALLERY_CACHE_MONGO", cast=bool, default=False
+)  # also cache parsed galleries in MongoDB, so they survive restarts
+NHENTAI_SEARCH_CACHE_SIZE: int = config(
+    "COMRADE_NHENTAI_SEARCH_CACHE_SIZE", cast=int, default=512
+)  # parsed search result pages kept in memory
+NHENTAI_SEARCH_PREFETCH_COUNT: int = config(
+    "COMRADE_NHENTAI_SEARCH_PREFETCH_COUNT", cast=int, default=5
+)  # top search results prefetched in the background; 0 to disable
+NHENTAI_MIRROR_CONCURRENCY: int = config(
+    "COMRADE_NHENTAI_MIRROR_CONCURRENCY", cast=int, default=4
+)  # pages downloaded at once by each /nhentai mirror job
+NHENTAI_MIRROR_SAVE_INTERVAL: float = config(
+    "COMRADE_NHENTAI_MIRROR_SAVE_INTERVAL", cast=float, default=5.0
+)  # seconds between saves of a mirror job's progress to MongoDB
+
+# NHentai sources
+NHENTAI_HEDGE_DELAY: float = config(
+    "COMRADE_NHENTAI_HEDGE_DELAY", cast=float, default=1.0
+)  # seconds before also trying the next source; 0 for all at once, -1 to disable
+NHENTAI_SOURCE_TIMEOUT: float = config(
+    "COMRADE_NHENTAI_SOURCE_TIMEOUT", cast=float, default=10.0
+)  # default per-source request timeout, in seconds
+NHENTAI_BREAKER_THRESHOLD: int = config(
+    "COMRADE_NHENTAI_BREAKER_THRESHOLD", cast=int, default=3
+)  # consecutive failures before a source is only tried as a last resort
+NHENTAI_BREAKER_COOLDOWN: float = config(
+    "COMRADE_NHENTAI_BREAKER_COOLDOWN", cast=float, default=300.0
+)  # seconds a failing source stays deprioritized
+NHENTAI_PARSER: str = config(
+    "COMRADE_NHENTAI_PARSER", default="lxml"
+)  # "lxml" (fast) or "bs4" (BeautifulSoup, the original parser)
+NHENTAI_PARSE_POOL: str = config(
+    "COMRADE_NHENTAI_PARSE_POOL", default="thread"
+)  # where pages are parsed: "thread", "process" or "inline" (on the event loop)
+NHENTAI_PARSE_WORKERS: int = config(
+    "COMRADE_NHENTAI_PARSE_WORKERS", cast=int, default=2
+)  # threads or processes used to parse pages
+
+# Booru
+BOORU_RATE_LIMIT: float = config(
+    "COMRADE_BOORU_RATE_LIMIT", cast=float, default=2.0
+)  # requests per second to each booru, on average; 0 for no limit
+BOORU_RATE_BURST: int = config(
+    "COMRADE_BOORU_RATE_BURST", cast=int, default=5
+)  # requests to each booru that may be sent back to back
+BOORU_CONCURRENCY: int = config(
+    "COMRADE_BOORU_CONCURRENCY", cast=int, default=2
+)  # requests to each booru in flight at once
+BOORU_READ_AHEAD: int = config(
+    "COMRADE_BOORU_READ_AHEAD", cast=int, default=10
+)  # posts from the end of a page at which the next one starts loading
+BOORU_TAG_CACHE_SIZE: int = config(
+    "COMRADE_BOORU_TAG_CACHE_SIZE", cast=int, default=2048
+)  # autocompleted tag prefixes kept in memory, per booru
+BOORU_TAG_CACHE_TTL: float = config(
+    "COMRADE_BOORU_TAG_CACHE_TTL", cast=float, default=6 * 60 * 60
+)  # seconds before a prefix's tag suggestions are fetched again
+BOORU_AUTOCOMPLETE_DEBOUNCE: float = config(
+    "COMRADE_BOORU_AUTOCOMPLETE_DEBOUNCE", cast=float, default=0.3
+)  # seconds to wait for the next keystroke before asking the booru
+BOORU_AUTOCOMPLETE_DEADLINE: float = config(
+    "COMRADE_BOORU_AUTOCOMPLETE_DEADLINE", cast=float, default=2.5
+)  # seconds before answering from the cache instead (Discord allows 3)
+
 # Testing-only
 DEV_MODE: bool = config("COMRADE_DEV_MODE", cast=bool, default=False)
 TEST_GUILD_ID: int = config("COMRADE_TEST_GUILD_ID", cast=int, default=0)
@@ -0,0 +1,447 @@
+"""
+On-disk cache of pages fetched as text (see `get_text`).
+
+Pages are stored in SQLite, and served from there while they are fresh,
+without touching the network. Stale pages with an ETag or Last-Modified
+header are revalidated with a conditional request; a 304 Not Modified
+response is then served from the cache.
+
+How long a response stays fresh is decided by its Cache-Control and
+Expires headers, unless the lifetime for its host is overridden
+(e.g. for an API whose responses never change, whatever it says).
+"""
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from functools import partial
+from pathlib import Path
+from time import time
+from typing import Callable, NamedTuple, TypeVar
+
+import orjson
+from aiohttp import ClientResponse, ClientSession
+from multidict import CIMultiDictProxy
+from yarl import URL
+
+from comrade.core.configuration import (
+    HTTP_CACHE_HOST_TTLS,
+    HTTP_CACHE_MAX_ENTRY_SIZE,
+)
+
+# Headers kept with a cached page, to revalidate it once it is stale
+VALIDATOR_HEADERS = ("ETag", "Last-Modified")
+
+# Access times of reads wait in memory for the next write,
+# unless this many have accumulated first
+ACCESS_FLUSH_SIZE = 256
+
+_T = TypeVar("_T")
+
+
+class CacheEntry(NamedTuple):
+    status: int
+    headers: list[tuple[str, str]]
+    body: bytes
+    expires: float  # UNIX time after which the entry must be revalidated
+
+    def header(self, name: str) -> str | None:
+        name = name.lower()
+        return next((v for k, v in self.headers if k.lower() == name), None)
+
+
+class HTTPDiskCache:
+    """
+    Persistent store of HTTP responses, backed by SQLite.
+
+    Entries are keyed by URL. Eviction is performed after each write,
+    removing the least recently used entries until the bodies stored
+    take at most `max_bytes` in total.
+
+    The methods are blocking; coroutines should call them through `run`,
+    which serializes them on a dedicated thread. The number of entries
+    and their total size are tracked in memory, and the access times of
+    reads are batched and written with the next write.
+
+    Table schema:
+    {
+        "url": request URL (primary key)
+        "status": response status code
+        "headers": validator headers, as a JSON list of pairs
+        "body": response text, encoded as UTF-8
+        "size": length of the body, in bytes
+        "expires": UNIX time after which the entry is stale
+        "last_access": UNIX time at which the entry was last read or written
+    }
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="http-disk-cache"
+        )
+        # Only ever used by one thread at a time (the executor's,
+        # or the caller's when used synchronously)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " headers BLOB NOT NULL,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access"
+            " ON responses (last_access)"
+        )
+        self.connection.commit()
+
+        self._count, self._size = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        self._accessed: dict[str, float] = {}
+
+    async def run(self, fn: Callable[..., _T], *args) -> _T:
+        """
+        Run one of the (blocking) methods in the executor
+        and await its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args))
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def size(self) -> int:
+        """
+        Total size of the bodies stored, in bytes.
+        """
+        return self._size
+
+    def get(self, url: str) -> CacheEntry | None:
+        """
+        Get the stored response for a URL, fresh or not, if there is one.
+        """
+        row = self.connection.execute(
+            "SELECT status, headers, body, expires FROM responses"
+            " WHERE url = ?",
+            (url,),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        self._accessed[url] = time()
+        if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+            self._write_accesses()
+            self.connection.commit()
+
+        status, headers, body, expires = row
+        return CacheEntry(
+            status, [tuple(h) for h in orjson.loads(headers)], body, expires
+        )
+
+    def _write_accesses(self) -> None:
+        """
+        Write the access times recorded by reads since the last write.
+        """
+        if not self._accessed:
+            return
+        self.connection.executemany(
+            "UPDATE responses SET last_access = ? WHERE url = ?",
+            [(accessed, url) for url, accessed in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def put(self, url: str, entry: CacheEntry) -> None:
+        """
+        Store the response for a URL, then evict entries
+        if the store is over capacity.
+        """
+        self._write_accesses()
+
+        previous = self.connection.execute(
+            "SELECT size FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if previous is None:
+            self._count += 1
+        else:
+            self._size -= previous[0]
+
+        now = time()
+        self.connection.execute(
+            "INSERT INTO responses"
+            " (url, status, headers, body, size, expires, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (url) DO UPDATE SET"
+            " status = excluded.status, headers = excluded.headers,"
+            " body = excluded.body, size = excluded.size,"
+            " expires = excluded.expires, last_access = excluded.last_access",
+            (
+                url,
+                entry.status,
+                orjson.dumps(entry.headers),
+                entry.body,
+                len(entry.body),
+                entry.expires,
+                now,
+            ),
+        )
+        self._size += len(entry.body)
+        self._evict()
+        self.connection.commit()
+
+    def _evict(self) -> None:
+        """
+        Delete the least recently used entries until
+        at most `max_bytes` of bodies remain.
+        """
+        if self._size <= self.max_bytes:
+            return
+
+        rows = self.connection.execute(
+            "SELECT url, size FROM responses ORDER BY last_access ASC"
+        )
+
+        # Only as many rows as needed are read
+        evicted = []
+        for url, size in rows:
+            if self._size <= self.max_bytes:
+                break
+            evicted.append((url,))
+            self._size -= size
+        rows.close()
+
+        self.connection.executemany(
+            "DELETE FROM responses WHERE url = ?", evicted
+        )
+        self._count -= len(evicted)
+
+    def close(self) -> None:
+        self._write_accesses()
+        self.connection.commit()
+        self.connection.close()
+        self.executor.shutdown(wait=False)
+
+
+def parse_host_ttls(spec: str) -> dict[str, float]:
+    """
+    Parses per-host cache lifetimes, e.g.
+    "nhentai.net=3600, tenor.com=86400"
+    """
+    host_ttls = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        host, ttl = item.split("=")
+        host_ttls[host.strip().lower()] = float(ttl)
+    return host_ttls
+
+
+def freshness_lifetime(headers: CIMultiDictProxy[str]) -> float | None:
+    """
+    How long a response stays fresh, in seconds, according to its
+    Cache-Control and Expires headers; None if it must not be stored.
+    """
+    directives = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    if (max_age := directives.get("max-age", "")).isdigit():
+        return float(max_age)
+
+    if expires := headers.get("Expires"):
+        try:
+            expires_at = parsedate_to_datetime(expires).timestamp()
+            date = parsedate_to_datetime(headers["Date"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            # Invalid dates mean "already expired"
+            return 0
+        return max(expires_at - date, 0)
+
+    return 0
+
+
+class TextResponse(NamedTuple):
+    status: int
+    text: str
+
+
+class HTTPCache:
+    """
+    Cache of pages fetched as text (HTML pages, API responses)
+    through `get_text`, stored in an HTTPDiskCache.
+
+    Only successful responses are stored, if they can be revalidated
+    or stay fresh for a while, and if they are at most `max_entry_size`
+    bytes once encoded as UTF-8.
+
+    Attributes
+    ----------
+    store : HTTPDiskCache
+        Where responses are stored
+    host_ttls : dict[str, float]
+        Lifetimes overriding the one given by the server, by host
+    max_entry_size : int
+        Largest response body stored, in bytes
+    stats : defaultdict[str, Counter[str]]
+        Per host:
+        `hit`: pages served from the cache, without a request
+        `revalidated`: pages served from the cache after a 304
+        `miss`: pages which had to be fetched in full
+        `stored`: responses written to the cache
+    """
+
+    def __init__(
+        self,
+        store: HTTPDiskCache,
+        host_ttls: dict[str, float] | None = None,
+        max_entry_size: int = HTTP_CACHE_MAX_ENTRY_SIZE,
+    ):
+        self.store = store
+        self.host_ttls = (
+            parse_host_ttls(HTTP_CACHE_HOST_TTLS)
+            if host_ttls is None
+            else host_ttls
+        )
+        self.max_entry_size = max_entry_size
+        self.stats: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+    def hit_ratio(self, host: str | None = None) -> float | None:
+        """
+        Fraction of pages (from `host`, or from any host)
+        served from the cache, if there were any.
+        """
+        if host is None:
+            stats = sum(self.stats.values(), Counter())
+        else:
+            stats = self.stats.get(host, Counter())
+
+        served = stats["hit"] + stats["revalidated"]
+        if not (total := served + stats["miss"]):
+            return None
+        return served / total
+
+    def _lifetime(
+        self, host: str, headers: CIMultiDictProxy[str]
+    ) -> float | None:
+        if host in self.host_ttls:
+            return self.host_ttls[host]
+        return freshness_lifetime(headers)
+
+    def _entry(
+        self, host: str, response: ClientResponse, text: str
+    ) -> CacheEntry | None:
+        """
+        The entry to store for a response, or None if it can't be stored.
+        """
+        if response.status != 200:
+            return None
+
+        lifetime = self._lifetime(host, response.headers)
+        validators = [
+            (name, response.headers[name])
+            for name in VALIDATOR_HEADERS
+            if name in response.headers
+        ]
+        if (
+            lifetime is None
+            or (lifetime <= 0 and not validators)
+            or response.headers.get("Vary", "accept-encoding").lower()
+            != "accept-encoding"
+        ):
+            return None
+
+        body = text.encode()
+        if len(body) > self.max_entry_size:
+            return None
+        return CacheEntry(response.status, validators, body, time() + lifetime)
+
+    async def get_text(
+        self, session: ClientSession, url: str | URL
+    ) -> TextResponse:
+        """
+        GET a page as text, from the cache if it is fresh there.
+
+        A stale page with an ETag or Last-Modified header is revalidated
+        with a conditional request, and served from the cache if the
+        server answers 304 Not Modified.
+
+        Parameters
+        ----------
+        session : ClientSession
+            The session to send requests with
+        url : str | URL
+            The page to get
+
+        Returns
+        -------
+        TextResponse
+            The status and decoded body of the response
+        """
+        url = URL(url)
+        host = (url.host or "").lower()
+        key = str(url)
+
+        cached = await self.store.run(self.store.get, key)
+        if cached is not None and cached.expires > time():
+            self.stats[host]["hit"] += 1
+            return TextResponse(cached.status, cached.body.decode())
+
+        # Ask the server whether the cached copy is still good
+        headers = {}
+        if cached is not None:
+            if etag := cached.header("ETag"):
+                headers["If-None-Match"] = etag
+            if last_modified := cached.header("Last-Modified"):
+                headers["If-Modified-Since"] = last_modified
+
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and cached is not None:
+                self.stats[host]["revalidated"] += 1
+
+                lifetime = self._lifetime(host, response.headers) or 0
+                cached = cached._replace(expires=time() + lifetime)
+                await self.store.run(self.store.put, key, cached)
+                return TextResponse(cached.status, cached.body.decode())
+
+            self.stats[host]["miss"] += 1
+            text = await response.text()
+
+        if (entry := self._entry(host, response, text)) is not None:
+            await self.store.run(self.store.put, key, entry)
+            self.stats[host]["stored"] += 1
+
+        return TextResponse(response.status, text)
+
+
+async def get_text(
+    session: ClientSession, url: str | URL, cache: HTTPCache | None = None
+) -> TextResponse:
+    """
+    GET a page as text, through `cache` if there is one
+    (see HTTPCache.get_text).
+    """
+    if cache is not None:
+        return await cache.get_text(session, url)
+
+    async with session.get(url) as response:
+        return TextResponse(response.status, await response.text())
@@ -0,0 +1,339 @@
+"""
+The bot's shared HTTP client.
+
+Everything that talks to the internet (nhentai sources, boorus, tenor,
+relay downloads) shares one aiohttp ClientSession, created here with:
+
+- a connection pool with a per-host limit, kept-alive connections
+  and a DNS cache, so that repeated requests to the same few hosts
+  skip the TCP/TLS handshake and DNS lookup
+- default timeouts, which can be overridden per call as usual
+  with `session.get(url, timeout=ClientTimeout(...))`
+- retries with exponential backoff for idempotent requests which fail
+  with a connection error or a transient status (RetryMiddleware)
+- per-host request counts, latency histograms and errors (HTTPMetrics)
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from logging import getLogger
+from math import inf
+from time import perf_counter
+from typing import Any
+
+import orjson
+from aiohttp import (
+    ClientConnectionError,
+    ClientHandlerType,
+    ClientRequest,
+    ClientResponse,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+)
+
+from comrade.core.configuration import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_CONNECTION_LIMIT,
+    HTTP_CONNECTION_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP_RETRY_BACKOFF,
+    HTTP_TIMEOUT,
+)
+
+logger = getLogger(__name__)
+
+# Requests which can safely be sent again
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Statuses which usually go away by themselves
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Longest wait between attempts, in seconds
+MAX_RETRY_BACKOFF = 10.0
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, inf)
+
+
+@dataclass
+class HostMetrics:
+    """
+    Requests sent to one host.
+
+    Every attempt counts as a request, including retries.
+    Latency is measured until the response headers arrive.
+
+    Attributes
+    ----------
+    requests : int
+        Number of requests sent
+    retries : int
+        Number of requests which were retries of a failed one
+    statuses : Counter[int]
+        Number of responses, by status code
+    errors : Counter[str]
+        Number of requests which failed without a response,
+        by exception type
+    latency_buckets : list[int]
+        Number of responses per LATENCY_BUCKETS bucket
+    latency_sum : float
+        Total latency of all responses, in seconds
+    """
+
+    requests: int = 0
+    retries: int = 0
+    statuses: Counter[int] = field(default_factory=Counter)
+    errors: Counter[str] = field(default_factory=Counter)
+    latency_buckets: list[int] = field(
+        default_factory=lambda: [0] * len(LATENCY_BUCKETS)
+    )
+    latency_sum: float = 0.0
+
+    @property
+    def responses(self) -> int:
+        return sum(self.latency_buckets)
+
+    @property
+    def error_count(self) -> int:
+        """
+        Requests which failed, with or without a response.
+        """
+        return sum(self.errors.values()) + sum(
+            n for status, n in self.statuses.items() if status >= 400
+        )
+
+    def observe(self, latency: float):
+        self.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.latency_sum += latency
+
+    def latency_percentile(self, q: float) -> float | None:
+        """
+        Upper bound of the q-th quantile (0 to 1) of latencies,
+        from the histogram, if there are any responses.
+        """
+        if not (responses := self.responses):
+            return None
+
+        seen = 0
+        for upper_bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            seen += count
+            if seen >= q * responses:
+                return upper_bound
+        return inf
+
+    @property
+    def summary(self) -> str:
+        """
+        Human-readable summary, for display in Discord.
+        """
+        summary = (
+            f"{self.requests} requests, {self.retries} retries,"
+            f" {self.error_count} errors"
+        )
+        if self.responses:
+            summary += (
+                f"\nMean latency: {self.latency_sum / self.responses:.2f} s,"
+                f" p95 under {self.latency_percentile(0.95)} s"
+            )
+        if self.errors:
+            common = ", ".join(
+                f"{e} ({n})" for e, n in self.errors.most_common(3)
+            )
+            summary += f"\nErrors: {common}"
+        return summary
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "statuses": dict(self.statuses),
+            "errors": dict(self.errors),
+            "latency_histogram": {
+                str(upper_bound): count
+                for upper_bound, count in zip(
+                    LATENCY_BUCKETS, self.latency_buckets
+                )
+            },
+            "latency_sum": self.latency_sum,
+        }
+
+
+class HTTPMetrics:
+    """
+    Client middleware recording every request sent by a ClientSession,
+    per host (see HostMetrics).
+
+    Attributes
+    ----------
+    hosts : defaultdict[str, HostMetrics]
+        Metrics of each host contacted so far
+    """
+
+    def __init__(self):
+        self.hosts: defaultdict[str, HostMetrics] = defaultdict(HostMetrics)
+
+    async def __call__(
+        self, request: ClientRequest, handler: ClientHandlerType
+    ) -> ClientResponse:
+        metrics = self.hosts[request.url.host or ""]
+        metrics.requests += 1
+
+        start = perf_counter()
+        try:
+            response = await handler(request)
+        except Exception as e:
+            metrics.errors[type(e).__name__] += 1
+            raise
+
+        metrics.observe(perf_counter() - start)
+        metrics.statuses[response.status] += 1
+        return response
+
+    def busiest(self, n: int) -> list[tuple[str, HostMetrics]]:
+        """
+        The `n` hosts with the most requests.
+        """
+        return sorted(
+            self.hosts.items(), key=lambda item: item[1].requests, reverse=True
+        )[:n]
+
+    def export(self) -> bytes:
+        """
+        All metrics, as JSON.
+        """
+        return orjson.dumps(
+            {host: metrics.to_dict() for host, metrics in self.hosts.items()},
+            option=orjson.OPT_INDENT_2
+            | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_SORT_KEYS,
+        )
+
+
+class RetryMiddleware:
+    """
+    Client middleware retrying idempotent requests (see RETRY_METHODS)
+    which fail with a connection error, or with a status in RETRY_STATUSES.
+
+    Attempts are spaced by exponential backoff with full jitter,
+    or by the server's Retry-After header. If the server asks to wait
+    longer than MAX_RETRY_BACKOFF, its response is returned instead of
+    retrying. Retries count towards the timeout of the call.
+
+    Attributes
+    ----------
+    retries : int
+        Maximum number of attempts after the first one
+    backoff : float
+        Base backoff, in seconds; attempt n waits up to backoff * 2^n
+    metrics : HTTPMetrics | None
+        Where to count retries, per host
+    """
+
+    def __init__(
+        self,
+        retries: int = HTTP_RETRIES,
+        backoff: float = HTTP_RETRY_BACKOFF,
+        metrics: HTTPMetrics | None = None,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = metrics
+
+    def delay(
+        self, attempt: int, response: ClientResponse | None
+    ) -> float | None:
+        """
+        How long to wait before retrying, after the `attempt`-th attempt
+        (starting from 0) failed with `response` (None for an error);
+        None if the server asks to wait too long to retry at all.
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                if int(retry_after) > MAX_RETRY_BACKOFF:
+                    return None
+                return float(retry_after)
+
+        return random.uniform(
+            0, min(self.backoff * 2**attempt, MAX_RETRY_BACKOFF)
+        )
+
+    async def __call__(
+        self, request: ClientRequest, handler: ClientHandlerType
+    ) -> ClientResponse:
+        if request.method not in RETRY_METHODS:
+            return await handler(request)
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0 and self.metrics is not None:
+                self.metrics.hosts[request.url.host or ""].retries += 1
+
+            last_attempt = attempt == self.retries
+            try:
+                response = await handler(request)
+            except ClientConnectionError as e:
+                if last_attempt:
+                    raise
+                logger.debug(f"Retrying {request.url} after {e!r}")
+                await asyncio.sleep(self.delay(attempt, None))
+                continue
+
+            if response.status not in RETRY_STATUSES or last_attempt:
+                return response
+
+            if (delay := self.delay(attempt, response)) is None:
+                return response
+
+            logger.debug(f"Retrying {request.url} after HTTP {response.status}")
+            response.release()
+            await asyncio.sleep(delay)
+
+
+def create_http_session(metrics: HTTPMetrics | None = None) -> ClientSession:
+    """
+    Create a ClientSession using the HTTP settings in configuration.
+
+    Must be called from a coroutine, since the session
+    is bound to the running event loop.
+
+    Parameters
+    ----------
+    metrics : HTTPMetrics | None, optional
+        Where to record requests sent by the session, if anywhere
+
+    Returns
+    -------
+    ClientSession
+        The session; close it when done.
+    """
+    connector = TCPConnector(
+        limit=HTTP_CONNECTION_LIMIT,
+        limit_per_host=HTTP_CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    )
+    timeout = ClientTimeout(
+        total=HTTP_TIMEOUT or None,
+        sock_connect=HTTP_CONNECT_TIMEOUT or None,
+        sock_read=HTTP_READ_TIMEOUT or None,
+    )
+
+    # The first middleware is the outermost: every retry is recorded
+    middlewares = [RetryMiddleware(metrics=metrics)]
+    if metrics is not None:
+        middlewares.append(metrics)
+
+    return ClientSession(
+        connector=connector,
+        timeout=timeout,
+        json_serialize=orjson.dumps,
+        middlewares=middlewares,
+    )
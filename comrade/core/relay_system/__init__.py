@@ -1,7 +1,8 @@
 from .bot_mixin import RelayMixin
-from .relay_main import Relay
+from .relay_main import BlobTooLargeError, Relay
 
 __all__ = [
     "RelayMixin",
     "Relay",
+    "BlobTooLargeError",
 ]
@@ -1,9 +1,15 @@
+import asyncio
+
 from .relay_main import Relay
 
 
 class RelayMixin:
     relay: Relay
 
+    # Set once `relay` is usable; listeners on on_ready run concurrently
+    # with the one initializing the relay, so they have to wait on this
+    relay_ready: asyncio.Event
+
     async def init_relay(self, guild_id: int):
         """
         Initialize the relay system
@@ -15,3 +21,4 @@ class RelayMixin:
 
         """
         self.relay = await Relay.from_bot(self, guild_id)
+        self.relay_ready.set()
@@ -1,17 +1,99 @@
 from collections import Counter, OrderedDict
+from logging import getLogger
 from typing import Any
 
+from comrade.core.async_db import AsyncCollection
+from comrade.core.configuration import (
+    RELAY_CACHE_DISK_PATH,
+    RELAY_CACHE_DISK_SIZE,
+    RELAY_CACHE_EVICTION,
+    RELAY_CACHE_MEMORY_SIZE,
+)
+
+from .disk_cache import BlobDiskCache
+
+logger = getLogger(__name__)
+
 
 class RelayCacheMixin:
+    """
+    Two-tier cache of blob documents.
+
+    1. in-memory tier: an OrderedDict holding at most `cache_max_size` blobs
+    2. on-disk tier: a SQLite store which survives restarts (optional)
+
+    Lookups check memory first, then disk (promoting disk hits into memory).
+    Writes go to both tiers. The on-disk tier is accessed off the event
+    loop, on the BlobDiskCache's own thread.
+
+    Eviction policy is either "lru" (least recently used is evicted first)
+    or "fifo" (oldest entry is evicted first), and applies to both tiers.
+
+    Hits and misses are counted per tier in `cache_stats`, under the keys
+    `memory_hit`, `memory_miss`, `disk_hit` and `disk_miss`;
+    `hit` and `miss` count the outcome of the lookup as a whole.
+    """
+
     # in-memory cache
-    local_cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
-    cache_max_size: int = 1024  # maximum number of blobs to store in the cache
+    local_cache: OrderedDict[str, dict[str, Any]]
+    cache_max_size: int  # maximum number of blobs to store in memory
+    cache_eviction_policy: str
+
+    # on-disk cache
+    disk_cache: BlobDiskCache | None
+
+    cache_stats: Counter[str]
+
+    def init_cache(
+        self,
+        max_size: int = RELAY_CACHE_MEMORY_SIZE,
+        disk_path: str = RELAY_CACHE_DISK_PATH,
+        disk_max_size: int = RELAY_CACHE_DISK_SIZE,
+        eviction_policy: str = RELAY_CACHE_EVICTION,
+    ):
+        """
+        Initialize both cache tiers.
 
-    cache_stats: Counter[str] = Counter()
+        Parameters
+        ----------
+        max_size : int, optional
+            Maximum number of blobs to keep in memory
+        disk_path : str, optional
+            Path of the SQLite file used for the on-disk tier;
+            an empty string disables the on-disk tier
+        disk_max_size : int, optional
+            Maximum number of blobs to keep on disk
+        eviction_policy : str, optional
+            Either "lru" or "fifo"
+        """
+        if eviction_policy not in ("lru", "fifo"):
+            raise ValueError(f"Unknown eviction policy `{eviction_policy}`")
+
+        self.local_cache = OrderedDict()
+        self.cache_max_size = max_size
+        self.cache_eviction_policy = eviction_policy
+        self.cache_stats = Counter()
+
+        if disk_path:
+            self.disk_cache = BlobDiskCache(
+                disk_path, disk_max_size, eviction_policy
+            )
+        else:
+            self.disk_cache = None
+
+    def _cache_in_memory(self, blob: dict[str, Any]) -> None:
+        """
+        Put a blob document in the in-memory tier only.
+        """
+        self.local_cache[blob["_id"]] = blob
+        if self.cache_eviction_policy == "lru":
+            self.local_cache.move_to_end(blob["_id"])
+        if len(self.local_cache) > self.cache_max_size:
+            self.local_cache.popitem(last=False)
 
-    def get_cached_blob(self, source_url: str) -> dict[str, Any] | None:
+    async def get_cached_blob(self, source_url: str) -> dict[str, Any] | None:
         """
-        Get a blob document from the in-memory cache
+        Get a blob document from the cache
         (if it exists)
 
         Parameters
@@ -23,12 +105,26 @@ class RelayCacheMixin:
 
         doc = self.local_cache.get(source_url)
         if doc is not None:
+            self.cache_stats["memory_hit"] += 1
             self.cache_stats["hit"] += 1
+            if self.cache_eviction_policy == "lru":
+                self.local_cache.move_to_end(source_url)
             return doc
+        self.cache_stats["memory_miss"] += 1
+
+        if self.disk_cache is not None:
+            doc = await self.disk_cache.run(self.disk_cache.get, source_url)
+            if doc is not None:
+                self.cache_stats["disk_hit"] += 1
+                self.cache_stats["hit"] += 1
+                self._cache_in_memory(doc)
+                return doc
+            self.cache_stats["disk_miss"] += 1
+
         self.cache_stats["miss"] += 1
         return None
 
-    def cache_blob(self, blob: dict[str, Any]) -> None:
+    async def cache_blob(self, blob: dict[str, Any]) -> None:
         """
         Cache a blob document
 
@@ -37,11 +133,26 @@ class RelayCacheMixin:
         blob : dict
             The blob document to cache
         """
-        self.local_cache[blob["_id"]] = blob
-        if len(self.local_cache) > self.cache_max_size:
-            self.local_cache.popitem(last=False)
+        self._cache_in_memory(blob)
+        if self.disk_cache is not None:
+            await self.disk_cache.run(self.disk_cache.put, blob)
+
+    async def cache_blobs(self, blobs: list[dict[str, Any]]) -> None:
+        """
+        Cache several blob documents at once,
+        writing them to disk in a single transaction.
+
+        Parameters
+        ----------
+        blobs : list[dict]
+            The blob documents to cache
+        """
+        for blob in blobs:
+            self._cache_in_memory(blob)
+        if self.disk_cache is not None and blobs:
+            await self.disk_cache.run(self.disk_cache.put_many, blobs)
 
-    def uncache_blob(self, source_url: str) -> None:
+    async def uncache_blob(self, source_url: str) -> None:
         """
         Remove a blob document from the cache
 
@@ -51,3 +162,54 @@ class RelayCacheMixin:
             The source URL of the blob
         """
         self.local_cache.pop(source_url, None)
+        if self.disk_cache is not None:
+            await self.disk_cache.run(self.disk_cache.delete, source_url)
+
+    async def warm_cache(self, collection: AsyncCollection, count: int) -> int:
+        """
+        Pre-populate the cache at startup.
+
+        The most recently uploaded blobs in MongoDB (by message ID)
+        are seeded into the on-disk tier, and then the most recently used
+        blobs on disk are loaded into memory. Blobs that were used before
+        the restart take precedence over freshly seeded ones.
+
+        Parameters
+        ----------
+        collection : AsyncCollection
+            The blob storage collection to warm from
+        count : int
+            The number of documents to pull from MongoDB
+
+        Returns
+        -------
+        int
+            The number of blobs held in memory after warming.
+        """
+        recent_docs = []
+        if count > 0:
+            recent_docs = await collection.find(
+                {}, sort=[("message_id", -1)], limit=count
+            )
+
+        if self.disk_cache is not None:
+            await self.disk_cache.run(self.disk_cache.seed, recent_docs)
+            warm_docs = await self.disk_cache.run(
+                self.disk_cache.most_recent, self.cache_max_size
+            )
+        else:
+            warm_docs = recent_docs
+
+        # Insert least recent first, so that the most recent end up last
+        for doc in reversed(warm_docs):
+            self._cache_in_memory(doc)
+
+        logger.info(
+            f"Warmed relay cache with {len(self.local_cache)} blobs in memory"
+            + (
+                f", {len(self.disk_cache)} on disk"
+                if self.disk_cache is not None
+                else ""
+            )
+        )
+        return len(self.local_cache)
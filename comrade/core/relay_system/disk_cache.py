@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from time import time
+from typing import Any, Callable, TypeVar
+
+import orjson
+from interactions import Timestamp
+
+_T = TypeVar("_T")
+
+# Reads only record their access time in memory; the times are written
+# along with the next write, or once this many reads have piled up
+ACCESS_FLUSH_SIZE = 256
+
+
+class BlobDiskCache:
+    """
+    Persistent key-value store of blob documents, backed by SQLite.
+
+    Used as the second tier of the Relay's blob cache, so that
+    the cache survives restarts.
+
+    Documents are keyed by their `_id` (i.e. the source URL),
+    and serialized using orjson.
+
+    Table schema:
+    {
+        "source_url": blob source URL (primary key)
+        "document": the serialized blob document
+        "created": UNIX time at which the entry was written
+        "last_access": UNIX time at which the entry was last read or written
+    }
+
+    Eviction is performed after each write, removing the entries with the
+    oldest `last_access` (LRU policy) or `created` (FIFO policy) time
+    until the store holds at most `max_size` entries.
+
+    The methods are blocking; coroutines should call them through `run`,
+    which serializes them on a dedicated thread. Under LRU, the access
+    times of reads are batched and written with the next write.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_size: int = 65536,
+        eviction_policy: str = "lru",
+    ):
+        if eviction_policy not in ("lru", "fifo"):
+            raise ValueError(f"Unknown eviction policy `{eviction_policy}`")
+
+        self.path = Path(path)
+        self.max_size = max_size
+        self.eviction_policy = eviction_policy
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="blob-disk-cache"
+        )
+        # Only ever used by one thread at a time (the executor's,
+        # or the caller's when used synchronously)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        # WAL mode: readers don't block the writer, and commits
+        # don't need to fsync the whole database
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " source_url TEXT PRIMARY KEY,"
+            " document BLOB NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS blobs_last_access"
+            " ON blobs (last_access)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS blobs_created ON blobs (created)"
+        )
+        self.connection.commit()
+
+        self._count = self.connection.execute(
+            "SELECT COUNT(*) FROM blobs"
+        ).fetchone()[0]
+        self._accessed: dict[str, float] = {}
+
+    async def run(self, fn: Callable[..., _T], *args) -> _T:
+        """
+        Run one of the (blocking) methods in the executor
+        and await its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args))
+
+    @property
+    def _eviction_column(self) -> str:
+        return "last_access" if self.eviction_policy == "lru" else "created"
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, source_url: str) -> bool:
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM blobs WHERE source_url = ?", (source_url,)
+            ).fetchone()
+            is not None
+        )
+
+    def get(self, source_url: str) -> dict[str, Any] | None:
+        """
+        Get a blob document from the store, if it exists.
+
+        Parameters
+        ----------
+        source_url : str
+            The source URL of the blob
+
+        Returns
+        -------
+        dict[str, Any] | None
+            The blob document, or None if it is not stored.
+        """
+        row = self.connection.execute(
+            "SELECT document FROM blobs WHERE source_url = ?", (source_url,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        if self.eviction_policy == "lru":
+            self._accessed[source_url] = time()
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                self._write_accesses()
+                self.connection.commit()
+
+        return orjson.loads(row[0])
+
+    def _write_accesses(self) -> None:
+        """
+        Write the access times recorded by reads since the last write.
+        """
+        if not self._accessed:
+            return
+        self.connection.executemany(
+            "UPDATE blobs SET last_access = ? WHERE source_url = ?",
+            [(accessed, url) for url, accessed in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def put_many(self, blobs: list[dict[str, Any]]) -> None:
+        """
+        Store several blob documents, then evict entries if the
+        store is over capacity.
+
+        Parameters
+        ----------
+        blobs : list[dict[str, Any]]
+            The blob documents to store; each must have an `_id`.
+        """
+        self._write_accesses()
+
+        source_urls = list({blob["_id"] for blob in blobs})
+        existing = self.connection.execute(
+            "SELECT COUNT(*) FROM blobs WHERE source_url IN"
+            " (SELECT value FROM json_each(?))",
+            (orjson.dumps(source_urls),),
+        ).fetchone()[0]
+
+        now = time()
+        self.connection.executemany(
+            "INSERT INTO blobs (source_url, document, created, last_access)"
+            " VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (source_url) DO UPDATE SET"
+            " document = excluded.document, last_access = excluded.last_access",
+            [
+                (blob["_id"], orjson.dumps(blob, default=str), now, now)
+                for blob in blobs
+            ],
+        )
+        self._count += len(source_urls) - existing
+        self._evict()
+        self.connection.commit()
+
+    def put(self, blob: dict[str, Any]) -> None:
+        """
+        Store a single blob document.
+
+        Parameters
+        ----------
+        blob : dict[str, Any]
+            The blob document to store; it must have an `_id`.
+        """
+        self.put_many([blob])
+
+    def seed(self, blobs: list[dict[str, Any]]) -> None:
+        """
+        Store blob documents which are not already in the store,
+        without touching the ones that are.
+
+        Seeded entries are dated by the upload time of their Discord message
+        rather than the current time, so that they rank below entries which
+        were actually used before a restart.
+
+        Parameters
+        ----------
+        blobs : list[dict[str, Any]]
+            The blob documents to store; each must have an `_id`.
+        """
+        rows = []
+        for blob in blobs:
+            uploaded_at = 0.0
+            if message_id := blob.get("message_id"):
+                uploaded_at = Timestamp.from_snowflake(message_id).timestamp()
+            rows.append(
+                (
+                    blob["_id"],
+                    orjson.dumps(blob, default=str),
+                    uploaded_at,
+                    uploaded_at,
+                )
+            )
+
+        self._write_accesses()
+        cursor = self.connection.executemany(
+            "INSERT INTO blobs (source_url, document, created, last_access)"
+            " VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (source_url) DO NOTHING",
+            rows,
+        )
+        self._count += max(cursor.rowcount, 0)
+        self._evict()
+        self.connection.commit()
+
+    def delete(self, source_url: str) -> None:
+        """
+        Remove a blob document from the store, if it exists.
+
+        Parameters
+        ----------
+        source_url : str
+            The source URL of the blob
+        """
+        self._accessed.pop(source_url, None)
+        self._write_accesses()
+        cursor = self.connection.execute(
+            "DELETE FROM blobs WHERE source_url = ?", (source_url,)
+        )
+        self._count -= cursor.rowcount
+        self.connection.commit()
+
+    def most_recent(self, count: int) -> list[dict[str, Any]]:
+        """
+        Get the most recently used (or written, for FIFO)
+        blob documents, most recent first.
+
+        Parameters
+        ----------
+        count : int
+            The maximum number of documents to return
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            The blob documents.
+        """
+        self._write_accesses()
+        self.connection.commit()
+
+        rows = self.connection.execute(
+            "SELECT document FROM blobs"
+            f" ORDER BY {self._eviction_column} DESC LIMIT ?",
+            (count,),
+        ).fetchall()
+        return [orjson.loads(row[0]) for row in rows]
+
+    def _evict(self) -> None:
+        """
+        Delete the least recently used (or oldest, for FIFO)
+        entries until at most `max_size` remain.
+        """
+        excess = self._count - self.max_size
+        if excess <= 0:
+            return
+
+        cursor = self.connection.execute(
+            "DELETE FROM blobs WHERE source_url IN"
+            " (SELECT source_url FROM blobs"
+            f" ORDER BY {self._eviction_column} ASC LIMIT ?)",
+            (excess,),
+        )
+        self._count -= cursor.rowcount
+
+    def close(self) -> None:
+        self._write_accesses()
+        self.connection.commit()
+        self.connection.close()
+        self.executor.shutdown(wait=False)
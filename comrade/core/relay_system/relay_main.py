@@ -1,28 +1,58 @@
 from __future__ import annotations
 
-from io import BufferedIOBase, BytesIO
+from hashlib import sha256
+from io import BufferedIOBase
 from logging import getLogger
-from typing import Any
+from typing import Any, AsyncIterator, Iterable
 
+from aiohttp import ClientResponse, StreamReader
 from interactions import (
-    File,
     Guild,
     GuildText,
     Message,
     listen,
 )
 from interactions.api.events import MessageCreate
+from interactions.client.utils.serializer import get_file_mimetype
 from pymongo.collection import Collection
 from pymongo.errors import DuplicateKeyError
 
+from comrade.core.async_db import AsyncCollection
 from comrade.core.augmentations import AugmentedClient
+from comrade.core.configuration import (
+    RELAY_CACHE_WARM_COUNT,
+    RELAY_MAX_BLOB_SIZE,
+    RELAY_STREAM_THRESHOLD,
+    RELAY_UPLOAD_BATCH_MAX_BYTES,
+    RELAY_UPLOAD_BATCH_WINDOW,
+)
+from comrade.lib.concurrency import SingleFlight
 from comrade.lib.file_utils import give_filename_extension
 
 from .cache_mixin import RelayCacheMixin
 from .update_hook import is_valid_update_wh, perform_update
+from .upload_batcher import BlobUploadBatcher
 
 logger = getLogger(__name__)
 
+# Bytes read from a stream to guess the type of a blob
+SNIFF_SIZE = 2048
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class BlobTooLargeError(ValueError):
+    pass
+
+
+async def read_head(stream: StreamReader, size: int) -> bytes:
+    """
+    Read the first `size` bytes of a stream, or all of it if it is shorter.
+    """
+    head = b""
+    while len(head) < size and (chunk := await stream.read(size - len(head))):
+        head += chunk
+    return head
+
 
 class Relay(RelayCacheMixin):
     """
@@ -41,21 +71,38 @@ class Relay(RelayCacheMixin):
         "channel_id": the ID of the channel the blob was sent in
         "message_id": the ID of the message the blob was sent in
         "filename": the filename of the blob
+        "content_hash": SHA-256 hex digest of the blob contents
     }
 
-    An in-memory cache is used to avoid unnecessary database queries.
-    The in-memory cache starts off empty on startup, and is populated
-    as requests are made to find_blob_by_url() and create_blob_from_bytes().
+    Blobs are deduplicated by content: a new source URL whose contents
+    match an existing blob (found via the `content_hash` index) gets its
+    own document, pointing at the existing attachment.
+
+    A two-tier cache (memory, then disk) is used to avoid unnecessary
+    database queries. The on-disk tier persists across restarts, and both
+    tiers are warmed on startup from the most recently uploaded blobs;
+    afterwards, they are populated as requests are made to
+    find_blob_by_url() and create_blob_from_bytes().
+
+    Uploads made within a short window of each other are batched into
+    a single multi-attachment message; see `upload_batcher`.
     """
 
     bot: AugmentedClient
     guild: Guild
     blob_storage_collection: Collection
 
+    # (collection name, source URL) -> in-progress mirroring of that URL
+    # stats["coalesced"] counts uploads which were deduplicated
+    url_upload_flights: SingleFlight[tuple[str, str], dict[str, Any]]
+
     # channels
     blob_storage_channel: GuildText = None
     relay_channel: GuildText = None
 
+    # batches uploads to the blob-storage channel
+    upload_batcher: BlobUploadBatcher = None
+
     def __init__(
         self,
         bot: AugmentedClient,
@@ -66,6 +113,9 @@ class Relay(RelayCacheMixin):
         self.guild = guild
         self.blob_storage_collection = blob_storage_collection
 
+        self.init_cache()
+        self.url_upload_flights = SingleFlight()
+
         @listen(event_name="message_create")
         async def relay_msg_callback(event: MessageCreate):
             msg = event.message
@@ -109,8 +159,25 @@ class Relay(RelayCacheMixin):
                 " because it did not exist."
             )
 
+        self.upload_batcher = BlobUploadBatcher(
+            self.blob_storage_channel,
+            window=RELAY_UPLOAD_BATCH_WINDOW,
+            max_bytes=RELAY_UPLOAD_BATCH_MAX_BYTES,
+        )
+
         logger.info(f"all channels initialized in {self.guild.name}")
 
+    def _async_collection(
+        self, mongodb_collection: Collection = None
+    ) -> AsyncCollection:
+        """
+        Returns an awaitable view of the given collection,
+        defaulting to the one passed to the constructor.
+        """
+        if mongodb_collection is None:
+            mongodb_collection = self.blob_storage_collection
+        return self.bot.async_db.wrap(mongodb_collection)
+
     @classmethod
     async def from_bot(cls, bot: AugmentedClient, guild_id: int) -> Relay:
         """
@@ -139,22 +206,27 @@ class Relay(RelayCacheMixin):
         relay = cls(bot, guild, bot.db.blobStorage)
 
         await relay.ensure_channels()
+        await relay._async_collection().create_index("content_hash")
+        await relay.warm_cache(
+            relay._async_collection(), RELAY_CACHE_WARM_COUNT
+        )
 
         return relay
 
     async def create_blob_from_bytes(
         self,
-        data: BufferedIOBase,
+        data: BufferedIOBase | bytes,
         mongodb_collection: Collection = None,
         document_data: dict = {},
         filename: str = "blob",
+        urgent: bool = False,
     ) -> dict[str, Any]:
         """
         Upload a blob to the blob-storage channel and sync it to MongoDB
 
         Parameters
         ----------
-        data : BufferedIOBase
+        data : BufferedIOBase | bytes
             The data to store in the blob
         mongodb_collection : Collection, optional
             The MongoDB collection to sync to, by default the one
@@ -163,6 +235,10 @@ class Relay(RelayCacheMixin):
             Additional fields to store in the MongoDB document, by default {}
         filename : str, optional
             The filename to use for the blob, by default "blob"
+        urgent : bool, optional
+            Whether someone is waiting on the blob, by default False.
+            Urgent blobs are sent right away (together with any blobs
+            already waiting), instead of waiting out the batching window.
 
         Notes
         -----
@@ -171,6 +247,12 @@ class Relay(RelayCacheMixin):
         - channel_id: the ID of the Discord channel containing the blob
         - message_id: the ID of the Discord message containing the blob
 
+        The blob may be sent in the same message as other blobs,
+        so the message ID is not necessarily unique to this blob.
+
+        If a blob with the same contents already exists (by `content_hash`),
+        its attachment is reused instead of uploading the blob again.
+
         Returns
         -------
         dict[str, Any]
@@ -178,44 +260,184 @@ class Relay(RelayCacheMixin):
             or the existing document if the blob already exists
 
         """
-        if mongodb_collection is None:
-            mongodb_collection = self.blob_storage_collection
+        collection = self._async_collection(mongodb_collection)
 
         # Shortcut: if the document is already in the database, return it
-        if "_id" in document_data and (
-            doc := mongodb_collection.find_one({"_id": document_data["_id"]})
+        if doc := await self._find_existing_blob(collection, document_data):
+            return doc
+
+        payload = data if isinstance(data, bytes) else data.read()
+        if len(payload) > RELAY_MAX_BLOB_SIZE:
+            raise BlobTooLargeError(
+                f"Blob is {len(payload)} bytes,"
+                f" over the limit of {RELAY_MAX_BLOB_SIZE} bytes"
+            )
+
+        content_hash = sha256(payload).hexdigest()
+        document_data = {"content_hash": content_hash} | document_data
+
+        # Reuse the attachment of an identical blob, if there is one
+        if existing := await collection.find_one(
+            {"content_hash": content_hash}
         ):
-            # Cache the document
-            self.cache_blob(doc)
+            document = await self._reuse_blob(
+                collection, existing, document_data
+            )
+        else:
+            filename = give_filename_extension(filename, payload)
+
+            # Batched with other uploads; this also takes care of
+            # returning the existing document if the _id is already taken
+            document = await self.upload_batcher.upload(
+                payload, filename, collection, document_data, flush_now=urgent
+            )
+
+        # Cache the document
+        await self.cache_blob(document)
+        return document
+
+    async def create_blob_from_stream(
+        self,
+        response: ClientResponse,
+        mongodb_collection: Collection = None,
+        document_data: dict = {},
+        filename: str = "blob",
+    ) -> dict[str, Any]:
+        """
+        Upload a blob to the blob-storage channel straight from an HTTP
+        response body, and sync it to MongoDB
+
+        The blob type is guessed from the first chunk, and the rest of the
+        body is piped into the upload as it arrives, so the blob is never
+        held in memory in full.
+
+        Parameters
+        ----------
+        response : ClientResponse
+            The response to read the blob from
+        mongodb_collection : Collection, optional
+            The MongoDB collection to sync to, by default the one
+            passed to the constructor
+        document_data : dict, optional
+            Additional fields to store in the MongoDB document, by default {}
+        filename : str, optional
+            The filename to use for the blob, by default "blob"
+
+        Raises
+        ------
+        BlobTooLargeError
+            If the body is over `RELAY_MAX_BLOB_SIZE` bytes;
+            the upload is aborted once the limit is reached
+        ClientConnectionError
+            If the upload fails, including when Discord rate-limits it:
+            the body is streamed, so it cannot be sent again
+            (see `BlobUploadBatcher.upload_stream`)
+
+        Returns
+        -------
+        dict[str, Any]
+            The MongoDB document that was created,
+            or the existing document if the blob already exists
+
+        """
+        collection = self._async_collection(mongodb_collection)
+
+        # Shortcut: if the document is already in the database, return it
+        if doc := await self._find_existing_blob(collection, document_data):
             return doc
 
-        filename = give_filename_extension(filename, data.read())
-        data.seek(0)
+        head = await read_head(response.content, SNIFF_SIZE)
+        filename = give_filename_extension(filename, head)
+
+        # The content hash is only known once the body is fully sent,
+        # which is before the batcher reads the document data
+        hasher = sha256(head)
+        document_data = dict(document_data)
+
+        too_large = False
+
+        async def body() -> AsyncIterator[bytes]:
+            nonlocal too_large
+            size = len(head)
+            yield head
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                size += len(chunk)
+                if size > RELAY_MAX_BLOB_SIZE:
+                    # Raising (rather than ending the body early) aborts
+                    # the upload instead of sending a truncated blob
+                    too_large = True
+                    raise BlobTooLargeError(
+                        f"Blob is over the limit of {RELAY_MAX_BLOB_SIZE} bytes"
+                    )
+                hasher.update(chunk)
+                yield chunk
+            document_data.setdefault("content_hash", hasher.hexdigest())
 
-        msg = await self.blob_storage_channel.send(
-            file=File(data, file_name=filename)
-        )
+        try:
+            document = await self.upload_batcher.upload_stream(
+                body(),
+                filename,
+                get_file_mimetype(head),
+                collection,
+                document_data,
+            )
+        except Exception as e:
+            # aiohttp reports errors raised by the body as connection errors
+            if too_large:
+                raise BlobTooLargeError(
+                    f"Blob is over the limit of {RELAY_MAX_BLOB_SIZE} bytes"
+                ) from e
+            raise
+
+        # Cache the document
+        await self.cache_blob(document)
+        return document
+
+    async def _reuse_blob(
+        self,
+        collection: AsyncCollection,
+        existing: dict[str, Any],
+        document_data: dict,
+    ) -> dict[str, Any]:
+        """
+        Create a document for a blob whose contents were already uploaded,
+        pointing at the existing attachment.
 
-        base_document = {
-            "_id": msg.attachments[0].url,
-            "blob_url": msg.attachments[0].url,
-            "channel_id": self.blob_storage_channel.id,
-            "message_id": msg.id,
-            "filename": filename,
-        }
+        Without an `_id` (i.e. a source URL to find the blob by later),
+        there is nothing to key a new document by, so the existing
+        document is returned as is.
+        """
+        if "_id" not in document_data:
+            return existing
 
-        # merge the base document with the additional data, with the
-        # additional data taking precedence
-        document = base_document | document_data
+        document = {
+            "blob_url": existing["blob_url"],
+            "channel_id": existing["channel_id"],
+            "message_id": existing["message_id"],
+            "filename": existing["filename"],
+        } | document_data
 
-        # For safety, check if the document is already in the database
         try:
-            mongodb_collection.insert_one(document)
-            # Cache the document
-            self.cache_blob(document)
+            await collection.insert_one(document)
+            logger.debug(f"Reused {existing['blob_url']} for {document['_id']}")
             return document
         except DuplicateKeyError:
-            return mongodb_collection.find_one({"_id": document["_id"]})
+            return await collection.find_one({"_id": document["_id"]})
+
+    async def _find_existing_blob(
+        self, collection: AsyncCollection, document_data: dict
+    ) -> dict[str, Any] | None:
+        """
+        Returns (and caches) the document with the `_id` given
+        in `document_data`, if it is already in the database.
+        """
+        if "_id" not in document_data:
+            return None
+
+        if doc := await collection.find_one({"_id": document_data["_id"]}):
+            # Cache the document
+            await self.cache_blob(doc)
+        return doc
 
     async def create_blob_from_url(
         self,
@@ -223,6 +445,7 @@ class Relay(RelayCacheMixin):
         mongodb_collection: Collection = None,
         document_data: dict = {},
         filename: str = "blob",
+        urgent: bool = False,
     ) -> dict[str, Any]:
         """
         Mirrors an existing blob from the internet to the
@@ -239,6 +462,9 @@ class Relay(RelayCacheMixin):
             Additional fields to store in the MongoDB document, by default {}
         filename : str, optional
             The filename to use for the blob by default "blob"
+        urgent : bool, optional
+            Whether someone is waiting on the blob, by default False;
+            see `create_blob_from_bytes()`
 
         Returns
         -------
@@ -247,18 +473,56 @@ class Relay(RelayCacheMixin):
 
         This allows the function to transparently mirror
         blobs from the internet to Discord,
-        """
 
-        async with self.bot.http_session.get(source_url) as resp:
-            resp.raise_for_status()
-            data = BytesIO(await resp.read())
+        Concurrent calls for the same source URL (and collection)
+        share a single download and upload; see `url_upload_flights`.
+
+        Blobs over `RELAY_STREAM_THRESHOLD` bytes (or of unknown size) are
+        streamed to Discord as they download, rather than buffered;
+        see `create_blob_from_stream()`.
 
-        # Tack on the blob URL to the MongoDB document, so we can find it later
-        modified_document_data = {"_id": source_url} | document_data
+        Raises
+        ------
+        BlobTooLargeError
+            If the blob is over `RELAY_MAX_BLOB_SIZE` bytes
+        """
+        collection_name = self._async_collection(mongodb_collection).name
+
+        async def mirror() -> dict[str, Any]:
+            # Tack on the source URL to the MongoDB document, to find it later
+            modified_document_data = {"_id": source_url} | document_data
+
+            async with self.bot.http_session.get(source_url) as resp:
+                resp.raise_for_status()
+
+                size = resp.content_length
+                if size is not None and size > RELAY_MAX_BLOB_SIZE:
+                    raise BlobTooLargeError(
+                        f"{source_url} is {size} bytes,"
+                        f" over the limit of {RELAY_MAX_BLOB_SIZE} bytes"
+                    )
+
+                if size is None or size > RELAY_STREAM_THRESHOLD:
+                    return await self.create_blob_from_stream(
+                        resp,
+                        mongodb_collection,
+                        modified_document_data,
+                        filename,
+                    )
+
+                data = await resp.read()
+
+            # Upload the blob
+            return await self.create_blob_from_bytes(
+                data,
+                mongodb_collection,
+                modified_document_data,
+                filename,
+                urgent,
+            )
 
-        # Upload the blob
-        return await self.create_blob_from_bytes(
-            data, mongodb_collection, modified_document_data, filename
+        return await self.url_upload_flights.run(
+            (collection_name, source_url), mirror
         )
 
     async def find_blob_by_url(
@@ -284,21 +548,71 @@ class Relay(RelayCacheMixin):
 
         """
         # check cache
-        if doc := self.get_cached_blob(source_url):
+        if doc := await self.get_cached_blob(source_url):
             return doc["blob_url"]
 
-        if mongodb_collection is None:
-            mongodb_collection = self.blob_storage_collection
+        collection = self._async_collection(mongodb_collection)
 
         # Check if the blob is already mirrored
-        doc = mongodb_collection.find_one({"_id": source_url})
+        doc = await collection.find_one({"_id": source_url})
         if doc:
             # Cache the document to speed up future lookups
-            self.cache_blob(doc)
+            await self.cache_blob(doc)
             return doc["blob_url"]
         else:
             return None
 
+    async def find_blobs_by_urls(
+        self,
+        source_urls: Iterable[str],
+        mongodb_collection: Collection = None,
+    ) -> dict[str, str | None]:
+        """
+        Gets several blobs from the blob-storage channel at once.
+
+        The cache is checked first; all remaining URLs are then
+        looked up with a single MongoDB query.
+
+        Parameters
+        ----------
+        source_urls : Iterable[str]
+            The source URLs of the blobs to find (i.e. the external URLs)
+        mongodb_collection : Collection, optional
+            The MongoDB collection to sync to, by default
+            the one passed to the constructor
+
+        Returns
+        -------
+        dict[str, str | None]
+            The URL of the mirrored blob for each source URL,
+            or None if it has not been mirrored
+
+        """
+        blob_urls: dict[str, str | None] = {}
+        misses = []
+
+        # check cache
+        for source_url in source_urls:
+            if doc := await self.get_cached_blob(source_url):
+                blob_urls[source_url] = doc["blob_url"]
+            else:
+                blob_urls[source_url] = None
+                misses.append(source_url)
+
+        if not misses:
+            return blob_urls
+
+        collection = self._async_collection(mongodb_collection)
+
+        docs = await collection.find({"_id": {"$in": misses}})
+
+        # Cache the documents to speed up future lookups
+        await self.cache_blobs(docs)
+        for doc in docs:
+            blob_urls[doc["_id"]] = doc["blob_url"]
+
+        return blob_urls
+
     async def delete_blob(
         self,
         source_url: str,
@@ -322,18 +636,17 @@ class Relay(RelayCacheMixin):
             Whether to keep the underlying message, by default True
             (because Discord storage is free)
         """
-        if not mongodb_collection:
-            mongodb_collection = self.blob_storage_collection
+        collection = self._async_collection(mongodb_collection)
 
-        doc = mongodb_collection.find_one({"_id": source_url})
+        doc = await collection.find_one({"_id": source_url})
 
         if not doc:
             raise ValueError("Blob not found")
 
-        result = mongodb_collection.delete_one({"_id": source_url})
+        result = await collection.delete_one({"_id": source_url})
 
         # Remove the document from the local cache
-        self.uncache_blob(source_url)
+        await self.uncache_blob(source_url)
 
         if result.deleted_count == 0:
             raise ValueError("Blob not found")
@@ -0,0 +1,380 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, AsyncIterable
+
+import orjson
+from aiohttp import FormData
+from aiohttp.abc import AbstractStreamWriter
+from aiohttp.payload import AsyncIterablePayload
+from interactions import File, GuildText
+from pymongo.errors import BulkWriteError
+
+from comrade.core.async_db import AsyncCollection
+
+# Discord allows at most 10 attachments per message
+MAX_ATTACHMENTS_PER_MESSAGE = 10
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+
+class StreamReplayError(RuntimeError):
+    """
+    Raised when a streamed upload is sent a second time (e.g. retried by
+    interactions.py after a 429), since its body was already consumed.
+    """
+
+
+class OneShotPayload(AsyncIterablePayload):
+    """
+    A streamed request body which refuses to be sent twice; a resent
+    stream would otherwise go out silently empty.
+    """
+
+    _sent = False
+
+    async def write_with_length(
+        self, writer: AbstractStreamWriter, content_length: int | None
+    ) -> None:
+        if self._sent:
+            raise StreamReplayError("A streamed upload cannot be resent")
+        self._sent = True
+        await super().write_with_length(writer, content_length)
+
+
+@dataclass
+class PendingBlob:
+    """
+    A blob waiting to be uploaded as part of a batch.
+    """
+
+    data: bytes
+    filename: str
+    collection: AsyncCollection
+    document_data: dict[str, Any]
+    future: asyncio.Future[dict[str, Any]] = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+
+
+class BlobUploadBatcher:
+    """
+    Uploads blobs to a channel in batches.
+
+    Blobs are collected for up to `window` seconds, then sent together
+    as a single multi-attachment message, and their MongoDB documents are
+    written with a single `insert_many` per collection. Each caller still
+    receives its own document.
+
+    Blobs in the same batch with the same `content_hash` (passed in
+    `document_data`) are only uploaded once.
+
+    A batch is sent early once it reaches `max_files` attachments or
+    `max_bytes` total size, or when a caller asks for it to be flushed
+    immediately (e.g. a user is waiting on that blob).
+
+    Attributes
+    ----------
+    channel : GuildText
+        The channel to upload blobs to
+    window : float
+        How long to wait for more blobs before sending a batch, in seconds
+    max_files : int
+        Maximum number of attachments per message
+    max_bytes : int
+        Maximum total size of attachments per message
+    stats : Counter[str]
+        `messages`: number of messages sent
+        `blobs`: number of blobs uploaded
+        `streamed`: number of blobs uploaded with `upload_stream()`
+        `deduplicated`: number of blobs which shared an attachment
+        with an identical blob in the same batch
+    """
+
+    def __init__(
+        self,
+        channel: GuildText,
+        window: float = 0.2,
+        max_files: int = MAX_ATTACHMENTS_PER_MESSAGE,
+        max_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.channel = channel
+        self.window = window
+        self.max_files = min(max_files, MAX_ATTACHMENTS_PER_MESSAGE)
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+
+        self._pending: list[PendingBlob] = []
+        self._pending_bytes = 0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._send_tasks: set[asyncio.Task] = set()
+
+    async def upload(
+        self,
+        data: bytes,
+        filename: str,
+        collection: AsyncCollection,
+        document_data: dict[str, Any] = {},
+        flush_now: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Queue a blob for upload, and wait for its MongoDB document.
+
+        Parameters
+        ----------
+        data : bytes
+            The contents of the blob
+        filename : str
+            The filename to use for the attachment
+        collection : AsyncCollection
+            The MongoDB collection to store the document in
+        document_data : dict, optional
+            Additional fields to store in the MongoDB document,
+            taking precedence over the default ones
+        flush_now : bool, optional
+            Send the batch containing this blob right away,
+            instead of waiting for the batching window to end
+
+        Returns
+        -------
+        dict[str, Any]
+            The MongoDB document that was created,
+            or the existing document if the `_id` was already taken
+        """
+        # Keep each batch under the size limit
+        if self._pending and self._pending_bytes + len(data) > self.max_bytes:
+            self._flush()
+
+        pending = PendingBlob(data, filename, collection, document_data)
+        self._pending.append(pending)
+        self._pending_bytes += len(data)
+
+        if flush_now or len(self._pending) >= self.max_files:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.window, self._flush
+            )
+
+        return await pending.future
+
+    async def upload_stream(
+        self,
+        chunks: AsyncIterable[bytes],
+        filename: str,
+        content_type: str,
+        collection: AsyncCollection,
+        document_data: dict[str, Any] = {},
+    ) -> dict[str, Any]:
+        """
+        Upload a blob straight from a stream of chunks, as its own message,
+        without ever holding the whole blob in memory.
+
+        Streamed blobs skip the batching window, since their
+        size is not known until they are fully sent.
+
+        Parameters
+        ----------
+        chunks : AsyncIterable[bytes]
+            The contents of the blob, e.g. an aiohttp response body
+        filename : str
+            The filename to use for the attachment
+        content_type : str
+            The mimetype of the blob
+        collection : AsyncCollection
+            The MongoDB collection to store the document in
+        document_data : dict, optional
+            Additional fields to store in the MongoDB document,
+            taking precedence over the default ones
+
+        Notes
+        -----
+        The stream can only be consumed once, so the request cannot be
+        retried if Discord rate-limits it or the connection drops. The
+        retry interactions.py makes after a 429 fails with a
+        StreamReplayError (wrapped in a ClientConnectionError) instead
+        of uploading an empty attachment.
+
+        Returns
+        -------
+        dict[str, Any]
+            The MongoDB document that was created,
+            or the existing document if the `_id` was already taken
+        """
+        # interactions.py would read the whole file into memory,
+        # but passes prebuilt multipart forms through untouched
+        form = FormData(quote_fields=False)
+        form.add_field(
+            "files[0]",
+            OneShotPayload(chunks, content_type=content_type),
+            filename=filename,
+        )
+        form.add_field(
+            "payload_json",
+            orjson.dumps(
+                {"attachments": [{"id": 0, "filename": filename}]}
+            ).decode(),
+        )
+
+        msg_data = await self.channel._client.http.create_message(
+            form, self.channel.id
+        )
+
+        self.stats["messages"] += 1
+        self.stats["blobs"] += 1
+        self.stats["streamed"] += 1
+
+        pending = PendingBlob(b"", filename, collection, document_data)
+        document = self._document(
+            pending, msg_data["attachments"][0]["url"], int(msg_data["id"])
+        )
+        await self._store_documents([(pending, document)])
+        return await pending.future
+
+    def _document(
+        self, pending: PendingBlob, blob_url: str, message_id: int
+    ) -> dict[str, Any]:
+        """
+        Build the MongoDB document of an uploaded blob.
+        """
+        # merge the base document with the additional data, with the
+        # additional data taking precedence
+        return {
+            "_id": blob_url,
+            "blob_url": blob_url,
+            "channel_id": self.channel.id,
+            "message_id": message_id,
+            "filename": pending.filename,
+        } | pending.document_data
+
+    def _flush(self):
+        """
+        Start sending all pending blobs as one batch.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        self._pending_bytes = 0
+
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send_batch(batch))
+        # Hold a reference, so the task isn't garbage collected mid-flight
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    async def _send_batch(self, batch: list[PendingBlob]):
+        """
+        Upload a batch of blobs as one message, then store
+        their documents and hand them back to the callers.
+        """
+        # Blobs with the same content (e.g. the same image under two
+        # source URLs) share one attachment
+        files: list[File] = []
+        file_idxs: list[int] = []
+        idx_by_hash: dict[str, int] = {}
+        for pending in batch:
+            content_hash = pending.document_data.get("content_hash")
+            if content_hash is None or content_hash not in idx_by_hash:
+                files.append(
+                    File(BytesIO(pending.data), file_name=pending.filename)
+                )
+                if content_hash is not None:
+                    idx_by_hash[content_hash] = len(files) - 1
+            file_idxs.append(idx_by_hash.get(content_hash, len(files) - 1))
+
+        try:
+            msg = await self.channel.send(files=files)
+
+            if len(msg.attachments) != len(files):
+                raise RuntimeError(
+                    f"Sent {len(files)} attachments, but the message"
+                    f" has {len(msg.attachments)}"
+                )
+
+            self.stats["messages"] += 1
+            self.stats["blobs"] += len(files)
+            self.stats["deduplicated"] += len(batch) - len(files)
+
+            # Attachments are returned in the order the files were sent
+            documents = [
+                self._document(pending, msg.attachments[file_idx].url, msg.id)
+                for pending, file_idx in zip(batch, file_idxs)
+            ]
+
+            # One insert_many per destination collection
+            by_collection: dict[str, list[tuple[PendingBlob, dict]]] = {}
+            for pending, document in zip(batch, documents):
+                by_collection.setdefault(pending.collection.name, []).append(
+                    (pending, document)
+                )
+
+            await asyncio.gather(
+                *(
+                    self._store_documents(entries)
+                    for entries in by_collection.values()
+                )
+            )
+        except Exception as e:
+            error = e
+        else:
+            error = RuntimeError("Blob upload finished without a document")
+
+        # No caller is left waiting forever
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+    async def _store_documents(self, entries: list[tuple[PendingBlob, dict]]):
+        """
+        Insert the documents of a batch into their (shared) collection,
+        resolving each caller's future with its document.
+
+        Documents whose `_id` already exists resolve to the existing document.
+        """
+        collection = entries[0][0].collection
+        documents = [document for _, document in entries]
+        results: list[dict[str, Any] | Exception] = list(documents)
+
+        try:
+            await collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            duplicate_idxs = []
+            for write_error in e.details["writeErrors"]:
+                idx = write_error["index"]
+                if write_error["code"] == DUPLICATE_KEY_ERROR_CODE:
+                    duplicate_idxs.append(idx)
+                else:
+                    results[idx] = RuntimeError(write_error["errmsg"])
+
+            if duplicate_idxs:
+                existing = await collection.find(
+                    {
+                        "_id": {
+                            "$in": [documents[i]["_id"] for i in duplicate_idxs]
+                        }
+                    }
+                )
+                existing_by_id = {doc["_id"]: doc for doc in existing}
+                for idx in duplicate_idxs:
+                    _id = documents[idx]["_id"]
+                    # e.g. deleted again in the meantime
+                    results[idx] = existing_by_id.get(_id) or RuntimeError(
+                        f"Document `{_id}` is a duplicate, but was not found"
+                    )
+        except Exception as e:
+            results = [e] * len(documents)
+
+        for (pending, _), result in zip(entries, results):
+            if pending.future.done():
+                continue
+            if isinstance(result, Exception):
+                pending.future.set_exception(result)
+            else:
+                pending.future.set_result(result)
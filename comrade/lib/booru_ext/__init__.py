@@ -1,8 +1,18 @@
-from .search import autocomplete_query
-from .structures import BOORUS, BooruSession
+from .search import (
+    autocomplete_query,
+    complete_query,
+    fetch_tag_suggestions,
+)
+from .structures import BOORUS, BooruClient, BooruPost, BooruSession
+from .tag_cache import TagCache
 
 __all__ = [
     "BOORUS",
+    "BooruClient",
+    "BooruPost",
     "BooruSession",
+    "TagCache",
     "autocomplete_query",
+    "complete_query",
+    "fetch_tag_suggestions",
 ]
@@ -1,11 +1,15 @@
 from orjson import loads
 
 from comrade.lib.booru_ext.filters import clean_up_autocomplete_tag
-from comrade.lib.booru_ext.structures import BooruType
+from comrade.lib.booru_ext.structures import BooruClient, BooruType
+from comrade.lib.booru_ext.tag_cache import FIND_TAGS_PAGE_SIZE, TagCache
 
 
 async def autocomplete_query(
-    query: str, booru_obj: BooruType, max_suggestions: int = 10
+    query: str,
+    booru_obj: BooruClient | BooruType,
+    max_suggestions: int = 10,
+    tag_cache: TagCache | None = None,
 ) -> list[str]:
     """
     Autocomplete tags for a given booru,
@@ -16,11 +20,14 @@ async def autocomplete_query(
     query : str
         The query to autocomplete.
         e.g. tsushima_yos
-    booru_obj : BooruType
+    booru_obj : BooruClient | BooruType
         The booru to autocomplete for.
         e.g. BooruType.DANBOORU
     max_suggestions : int, optional
         The maximum number of suggestions to return, by default 10
+    tag_cache : TagCache | None, optional
+        The booru's tag cache; suggestions are taken from it if possible,
+        and otherwise added to it once fetched
 
     Returns
     -------
@@ -36,24 +43,75 @@ async def autocomplete_query(
     """
 
     # Autocomplete only on the most recent tag
-    # Break the query into a list of tags
+    most_recent_tag = query.split()[-1]
 
-    query_tags = query.split()
-    most_recent_tag = query_tags[-1]
+    if (
+        tag_cache is not None
+        and (cached := tag_cache.get(most_recent_tag, max_suggestions))
+        is not None
+    ):
+        tag_suggestions = cached
+    else:
+        tag_suggestions = await fetch_tag_suggestions(
+            most_recent_tag, booru_obj, tag_cache
+        )
 
-    tag_suggestions = loads(await booru_obj.find_tags(most_recent_tag))
+    return complete_query(query, tag_suggestions[:max_suggestions])
+
+
+async def fetch_tag_suggestions(
+    tag: str,
+    booru_obj: BooruClient | BooruType,
+    tag_cache: TagCache | None = None,
+) -> list[str]:
+    """
+    Fetch the tags a booru suggests for a partial tag,
+    adding them to its tag cache, if given.
+
+    Parameters
+    ----------
+    tag : str
+        The partial tag.
+        e.g. tsushima_yos
+    booru_obj : BooruClient | BooruType
+        The booru to ask; it must support tag searching
+    tag_cache : TagCache | None, optional
+        The booru's tag cache
+
+    Returns
+    -------
+    list[str]
+        The cleaned up tags, most popular first
+    """
+    tag_suggestions = loads(await booru_obj.find_tags(tag))
 
     # Clean up the tag suggestions, and remove duplicates if any
     cleaned_tag_suggestions = list(
         dict.fromkeys(map(clean_up_autocomplete_tag, tag_suggestions))
     )
-    truncated_tag_suggestions = cleaned_tag_suggestions[:max_suggestions]
 
-    if len(truncated_tag_suggestions) == 0:
+    if tag_cache is not None:
+        tag_cache.put(
+            tag,
+            cleaned_tag_suggestions,
+            complete=len(tag_suggestions) < FIND_TAGS_PAGE_SIZE,
+        )
+
+    return cleaned_tag_suggestions
+
+
+def complete_query(query: str, tag_suggestions: list[str]) -> list[str]:
+    """
+    Construct the possible queries, replacing the most recent tag
+    of a query with each of the suggestions for it.
+
+    e.g. "1girl tsushima_yos", ["tsushima_yoshiko"]
+    -> ["1girl tsushima_yoshiko"]
+    """
+    if len(tag_suggestions) == 0:
         # Send back whatever the query was
         return [query]
 
-    # Otherwise, construct a bunch of possible queries
-    base = query_tags[:-1]
+    base = query.split()[:-1]
 
-    return [f"{' '.join(base + [tag])}" for tag in truncated_tag_suggestions]
+    return [f"{' '.join(base + [tag])}" for tag in tag_suggestions]
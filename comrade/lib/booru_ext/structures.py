@@ -1,12 +1,21 @@
-from dataclasses import dataclass
-from typing import Type
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Type
 
 import booru
 from interactions import Embed
 from orjson import loads
 
+from comrade.core.configuration import (
+    BOORU_CONCURRENCY,
+    BOORU_RATE_BURST,
+    BOORU_RATE_LIMIT,
+    BOORU_READ_AHEAD,
+)
 from comrade.lib.booru_ext.const import OPTIONAL_EMBED_FIELDS
 from comrade.lib.booru_ext.filters import clean_up_post_tag
+from comrade.lib.booru_ext.tag_cache import TagCache
+from comrade.lib.concurrency import RateLimiter
 from comrade.lib.discord_utils import SafeLengthEmbed
 from comrade.lib.text_utils import escape_md
 
@@ -24,14 +33,128 @@ BOORUS: dict[str, Type[BooruType]] = {
 }
 
 
+class BooruClient:
+    """
+    Long-lived client for one booru, shared by every command,
+    which keeps requests to the booru within its rate limits.
+
+    At most `concurrency` requests are in flight at once, and they
+    are spaced by a token bucket (`rate` per second, up to `burst`
+    back to back), so that bursts of autocomplete traffic
+    don't get the bot throttled or banned.
+
+    Attributes
+    ----------
+    booru_class : Type[BooruType]
+        The booru library's class for the booru
+    booru : BooruType
+        Instance of it, used for tag lookups
+    rate_limiter : RateLimiter
+        Spaces out requests to the booru
+    semaphore : asyncio.Semaphore
+        Caps the number of requests in flight
+    tag_cache : TagCache
+        Tag suggestions seen so far, for autocomplete
+    """
+
+    def __init__(
+        self,
+        booru_class: Type[BooruType],
+        rate: float = BOORU_RATE_LIMIT,
+        burst: int = BOORU_RATE_BURST,
+        concurrency: int = BOORU_CONCURRENCY,
+    ):
+        self.booru_class = booru_class
+        self.booru = booru_class()
+        self.rate_limiter = RateLimiter(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tag_cache = TagCache()
+
+    @property
+    def name(self) -> str:
+        return self.booru_class.__name__
+
+    @property
+    def supports_tag_search(self) -> bool:
+        return hasattr(self.booru, "find_tags")
+
+    async def search(self, query: str, **kwargs) -> str:
+        """
+        Search for posts; see the booru library's `search` methods.
+        """
+        async with self.semaphore:
+            await self.rate_limiter.acquire()
+            # The library keeps each search's parameters on the instance,
+            # so concurrent searches can't share one
+            return await self.booru_class().search(query, **kwargs)
+
+    async def find_tags(self, query: str) -> str:
+        """
+        Find tags starting with `query`; see the booru library's
+        `find_tags` methods.
+        """
+        async with self.semaphore:
+            await self.rate_limiter.acquire()
+            return await self.booru.find_tags(query)
+
+
+@dataclass(slots=True)
+class BooruPost:
+    """
+    The parts of a booru post shown in its embed.
+
+    Search results are reduced to these as soon as they are loaded,
+    since sessions hold a page of posts each, for as long as they live.
+
+    Attributes
+    ----------
+    file_url : str | None
+        URL of the image
+    tags : str
+        Tags of the post, separated by spaces
+    id : int | None
+        ID of the post on the booru
+    score : int | None
+        Score of the post
+    result_count : int | None
+        Number of results of the search (only some boorus report it)
+    """
+
+    file_url: str | None
+    tags: str
+    id: int | None = None
+    score: int | None = None
+    result_count: int | None = None
+
+    @classmethod
+    def from_json(cls, post: dict[str, Any]) -> "BooruPost":
+        """
+        Reduce a post returned by the booru library's `search` methods.
+
+        For Danbooru, make sure to read "tag_string" instead of "tags".
+        """
+        tags = post.get("tags", post.get("tag_string", []))
+        return cls(
+            file_url=post.get("file_url"),
+            tags=" ".join(tags),
+            id=post.get("id"),
+            score=post.get("score"),
+            result_count=post.get("result_count"),
+        )
+
+
 @dataclass
 class BooruSession:
     """
     Per-channel session storage for booru commands.
 
+    Once the reader gets within `read_ahead` posts of the end of the
+    current page, the next page is loaded in the background, so that
+    moving on to it doesn't wait on the booru.
+
     Attributes
     ----------
-    booru : BooruType
+    booru : BooruClient | BooruType
         The booru to use for the session.
     query : str
         The query to use for the session.
@@ -41,41 +164,87 @@ class BooruSession:
         The ID of the page the session is on.
     post_id : int
         The ID of the post the session is on within the page.
-    _posts : list[dict[str, str]]
+    read_ahead : int
+        How many posts from the end of the page the next page
+        starts loading; 0 to only load it once needed.
+    _posts : list[BooruPost]
         Storage location for current page of posts.
+    _limit_count : int
+        Number of posts requested per page.
+    _next_page : asyncio.Task | None
+        Loads the posts of the next page in the background, if started.
+    _lock : asyncio.Lock
+        Serializes moving through the posts.
     """
 
-    booru: BooruType
+    booru: BooruClient | BooruType
     query: str
     sort_random: bool = True
     page_id: int = 1
     post_id: int = 0
-    _posts: list[dict[str, str]] = None
+    read_ahead: int = BOORU_READ_AHEAD
+    _posts: list[BooruPost] = None
+    _limit_count: int = 100
+    _next_page: asyncio.Task | None = field(default=None, repr=False)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
 
     async def advance_post(self) -> bool:
         """
         Advance the post ID by one, if possible, and load the new post.
         """
-        if self.post_id + 1 >= len(self._posts):
-            self.post_id = 0
-            return await self.advance_pid()
+        async with self._lock:
+            if self.post_id + 1 >= len(self._posts):
+                return await self.advance_pid()
 
-        self.post_id += 1
-        return True
+            self.post_id += 1
+            if len(self._posts) - self.post_id <= self.read_ahead:
+                self._start_read_ahead()
+            return True
 
     async def advance_pid(self) -> bool:
         """
-        Advance the page ID by one, if possible, and load the new page.
+        Advance the page ID by one, if possible, and load the new page,
+        using the page read ahead if there is one.
 
         Returns False if there are no more pages.
         """
+        next_page, self._next_page = self._next_page, None
+        if next_page is not None:
+            posts = await next_page
+        else:
+            posts = await self.fetch_posts(self.page_id + 1, self._limit_count)
+
+        if posts is None:
+            return False
+
+        # Swap pages all at once, without yielding to the event loop
         self.page_id += 1
-        return await self.init_posts(self.page_id)
+        self.post_id = 0
+        self._posts = posts
+        return True
 
     async def init_posts(self, page_id: int, limit_count: int = 100) -> bool:
         """
         Initialize the session, returning False if the query is invalid.
         """
+        posts = await self.fetch_posts(page_id, limit_count)
+        if posts is None:
+            return False
+
+        if self._next_page is not None:
+            self._next_page.cancel()
+            self._next_page = None
+
+        self._posts = posts
+        self._limit_count = limit_count
+        return True
+
+    async def fetch_posts(
+        self, page_id: int, limit_count: int
+    ) -> list[BooruPost] | None:
+        """
+        Fetch a page of posts, or None if there are no (more) results.
+        """
         try:
             posts_raw = await self.booru.search(
                 self.query,
@@ -85,33 +254,46 @@ class BooruSession:
             )
         except KeyError as e:
             if "0" in str(e):
-                return False
+                return None
             raise e
         except Exception as e:
             if "no results" in str(e):
-                return False
+                return None
             raise e
 
-        # Parse the JSON response
-        self._posts = loads(posts_raw)
+        # Parse the JSON response, keeping only what the embeds need
+        return list(map(BooruPost.from_json, loads(posts_raw)))
 
-        return True
+    def _start_read_ahead(self):
+        """
+        Start loading the next page in the background, if not already,
+        and unless this page is shorter than the limit (so the last one).
+        """
+        if self._next_page is not None or len(self._posts) < self._limit_count:
+            return
+
+        self._next_page = asyncio.create_task(
+            self.fetch_posts(self.page_id + 1, self._limit_count)
+        )
+        # Sessions may be abandoned before the page is needed
+        self._next_page.add_done_callback(
+            lambda task: task.cancelled() or task.exception()
+        )
+
+    @property
+    def site_name(self) -> str:
+        if isinstance(self.booru, BooruClient):
+            return self.booru.name
+        return self.booru.__class__.__name__
 
     @property
     def post_tags(self) -> str:
         """
         The tags of the current post.
-
-        For Danbooru, make sure to index "tag_string" instead of "tags".
         """
-        try:
-            return ", ".join(
-                map(clean_up_post_tag, self._posts[self.post_id]["tags"])
-            )
-        except KeyError:
-            return ", ".join(
-                map(clean_up_post_tag, self._posts[self.post_id]["tag_string"])
-            )
+        return ", ".join(
+            map(clean_up_post_tag, self._posts[self.post_id].tags.split())
+        )
 
     @property
     def formatted_embed(self) -> Embed:
@@ -123,15 +305,16 @@ class BooruSession:
         Embed
             The embed created from the post data.
         """
-        post_data = self._posts[self.post_id]
+        post = self._posts[self.post_id]
 
         footer_text = (
-            f"Site: {self.booru.__class__.__name__} | Page {self.page_id} "
+            f"Site: {self.site_name} | Page {self.page_id} "
             f"| Post {self.post_id + 1} | Type 'next' to advance"
         )
 
         embed = SafeLengthEmbed(title=escape_md(self.query))
-        embed.set_image(url=post_data["file_url"])
+        if post.file_url:
+            embed.set_image(url=post.file_url)
         embed.set_footer(text=footer_text)
 
         embed.add_field(
@@ -143,11 +326,7 @@ class BooruSession:
         # Try to add additional fields to the embed, depending on the booru
 
         for field_name, field_key in OPTIONAL_EMBED_FIELDS.items():
-            try:
-                embed.add_field(
-                    name=field_name, value=post_data[field_key], inline=True
-                )
-            except KeyError:
-                pass
+            if (value := getattr(post, field_key)) is not None:
+                embed.add_field(name=field_name, value=value, inline=True)
 
         return embed
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from collections import Counter
+
+from comrade.core.configuration import BOORU_TAG_CACHE_SIZE, BOORU_TAG_CACHE_TTL
+from comrade.lib.caching import TTLCache
+
+# Fewest tags a booru returns from find_tags when more tags match;
+# shorter responses list every tag matching the prefix
+FIND_TAGS_PAGE_SIZE = 10
+
+
+class TagCache:
+    """
+    Cache of tag suggestions for one booru, filled from
+    the responses of its find_tags method.
+
+    Entries are keyed by the prefix that was looked up. A prefix is
+    answered from the entry for itself, or else from the entry for its
+    longest cached prefix; e.g. once "tsushima_" has been fetched,
+    "tsushima_y" is answered by filtering the tags cached for "tsushima_".
+
+    Boorus return their most popular matching tags first, and only a
+    page of them, so filtering is only correct if the page lists every
+    matching tag, or already contains enough tags matching the longer
+    prefix (they are then also its most popular ones).
+
+    Attributes
+    ----------
+    memory : TTLCache[str, tuple[list[str], bool]]
+        prefix -> (tags, whether they are all the tags with that prefix)
+    stats : Counter[str]
+        `hit`: lookups answered by the entry for the same prefix
+        `extended`: lookups answered by the entry for a shorter prefix
+        `miss`: lookups which have to be fetched from the booru
+    """
+
+    def __init__(
+        self,
+        max_size: int = BOORU_TAG_CACHE_SIZE,
+        ttl: float = BOORU_TAG_CACHE_TTL,
+    ):
+        self.memory = TTLCache(max_size, ttl)
+        self.stats = Counter()
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+    @property
+    def hit_rate(self) -> float | None:
+        """
+        Fraction of lookups answered without the booru, if there were any.
+        """
+        hits = self.stats["hit"] + self.stats["extended"]
+        if not (total := hits + self.stats["miss"]):
+            return None
+        return hits / total
+
+    def get(self, prefix: str, max_tags: int) -> list[str] | None:
+        """
+        Get the (at most `max_tags`) most popular tags starting with
+        `prefix`, or None if they have to be fetched from the booru.
+        """
+        prefix = prefix.lower()
+
+        # Walk back to the longest cached prefix
+        for end in range(len(prefix), 0, -1):
+            if (entry := self.memory.get(prefix[:end])) is not None:
+                break
+        else:
+            self.stats["miss"] += 1
+            return None
+
+        tags, complete = entry
+        if end == len(prefix):
+            self.stats["hit"] += 1
+            return tags[:max_tags]
+
+        # Entries for even shorter prefixes can't hold more matching tags
+        matches = [tag for tag in tags if tag.startswith(prefix)]
+        if complete or len(matches) >= max_tags:
+            self.stats["extended"] += 1
+            return matches[:max_tags]
+
+        self.stats["miss"] += 1
+        return None
+
+    def best_effort(self, prefix: str, max_tags: int) -> list[str]:
+        """
+        The most popular tags starting with `prefix` among those cached,
+        for when there is no time to ask the booru; possibly missing
+        some, or empty. Not counted in the stats.
+        """
+        prefix = prefix.lower()
+        for end in range(len(prefix), 0, -1):
+            if (entry := self.memory.get(prefix[:end])) is not None:
+                tags, _ = entry
+                matches = [tag for tag in tags if tag.startswith(prefix)]
+                return matches[:max_tags]
+        return []
+
+    def put(self, prefix: str, tags: list[str], complete: bool):
+        """
+        Add the tags a booru suggested for a prefix.
+
+        Parameters
+        ----------
+        prefix : str
+            The prefix looked up
+        tags : list[str]
+            The (cleaned up) tags suggested, most popular first
+        complete : bool
+            Whether these are all the tags starting with the prefix
+        """
+        self.memory.put(prefix.lower(), (tags, complete))
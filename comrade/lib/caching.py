@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from time import monotonic
+from typing import Callable, Generic, Hashable, TypeVar
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class TTLCache(Generic[_K, _V]):
+    """
+    In-memory LRU cache whose entries expire after a fixed time.
+
+    Holds at most `max_size` entries; once full, the least recently
+    used entry is evicted. Expired entries are dropped when looked up.
+
+    Attributes
+    ----------
+    max_size : int
+        Maximum number of entries
+    ttl : float
+        Seconds after which an entry expires
+    clock : Callable[[], float]
+        Returns the current time in seconds (monotonic by default)
+    stats : Counter[str]
+        `hit`: lookups which found a live entry
+        `miss`: lookups which found nothing
+        `expired`: lookups which found an expired entry (also a miss)
+        `evicted`: entries evicted to make room
+    """
+
+    max_size: int
+    ttl: float
+    clock: Callable[[], float]
+    stats: Counter[str]
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = Counter()
+
+        # key -> (expiry time, value), least recently used first
+        self._entries: OrderedDict[_K, tuple[float, _V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: _K) -> _V | None:
+        """
+        Get the value of a live entry, or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["miss"] += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["miss"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats["hit"] += 1
+        return value
+
+    def put(self, key: _K, value: _V, ttl: float | None = None):
+        """
+        Add or replace an entry.
+
+        Parameters
+        ----------
+        key : _K
+            The key of the entry
+        value : _V
+            The value of the entry
+        ttl : float, optional
+            Seconds until this entry expires, instead of the default
+        """
+        if self.max_size <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def pop(self, key: _K) -> _V | None:
+        """
+        Remove an entry, returning its value (even if expired), or None.
+        """
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,606 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, defaultdict
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import count
+from logging import getLogger
+from time import monotonic
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Container,
+    Generic,
+    Hashable,
+    TypeVar,
+)
+from urllib.parse import urlparse
+
+logger = getLogger(__name__)
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class SingleFlight(Generic[_K, _V]):
+    """
+    Coalesces concurrent calls which share the same key,
+    so that the underlying work is only done once.
+
+    The first caller for a key starts the work as a task;
+    any caller arriving while it is still running awaits
+    the same task instead of starting its own.
+
+    Cancelling a caller does not cancel the shared task while other
+    callers are waiting on it. Cancelling the last one cancels the task
+    too, and its cancellation only completes once the task has stopped,
+    so that e.g. a PrefetchScheduler job holds its host slot until the
+    download it started is really over.
+
+    Attributes
+    ----------
+    in_flight : dict[_K, asyncio.Task[_V]]
+        Tasks which are currently running, by key.
+    waiters : Counter[asyncio.Task[_V]]
+        Number of callers awaiting each running task.
+    stats : Counter[str]
+        `executed`: number of times the work was actually started
+        `coalesced`: number of calls which joined an existing task
+    """
+
+    in_flight: dict[_K, asyncio.Task[_V]]
+    waiters: Counter[asyncio.Task[_V]]
+    stats: Counter[str]
+
+    def __init__(self):
+        self.in_flight = {}
+        self.waiters = Counter()
+        self.stats = Counter()
+
+    async def run(self, key: _K, work: Callable[[], Awaitable[_V]]) -> _V:
+        """
+        Run `work()` unless a call with the same key is already running,
+        in which case its result is awaited instead.
+
+        Parameters
+        ----------
+        key : _K
+            The key identifying the work
+        work : Callable[[], Awaitable[_V]]
+            Zero-argument callable returning the awaitable to run
+
+        Returns
+        -------
+        _V
+            The result of the (possibly shared) work.
+            Exceptions are propagated to every caller.
+        """
+        if (task := self.in_flight.get(key)) is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["executed"] += 1
+            task = asyncio.ensure_future(work())
+            self.in_flight[key] = task
+            task.add_done_callback(partial(self._forget, key))
+
+        self.waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.waiters[task] == 1 and not task.done():
+                # Nobody else wants the result; later callers start afresh
+                self._forget(key, task)
+                task.cancel()
+                await asyncio.wait({task})
+            raise
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+
+    def _forget(self, key: _K, task: asyncio.Task[_V]):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how often something may be done
+    (e.g. requests to an API which bans clients that go too fast).
+
+    The bucket holds up to `burst` tokens, and refills at `rate`
+    tokens per second; each acquisition takes one token, waiting for
+    it if the bucket is empty. Waiters are served in arrival order.
+
+    Attributes
+    ----------
+    rate : float
+        Tokens added per second; 0 or less disables the limit
+    burst : int
+        Maximum number of tokens, i.e. of back-to-back acquisitions
+    clock : Callable[[], float]
+        Returns the current time in seconds (monotonic by default)
+    stats : Counter[str]
+        `acquired`: number of tokens taken
+        `delayed`: number of acquisitions which had to wait
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.stats = Counter()
+
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        """
+        Take a token, waiting until one is available.
+        """
+        if self.rate <= 0:
+            self.stats["acquired"] += 1
+            return
+
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                self.stats["delayed"] += 1
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+
+            self._tokens -= 1
+            self.stats["acquired"] += 1
+
+
+class Superseded(Exception):
+    """
+    Raised by Debouncer.run when a newer call with the same key
+    replaced it before its work finished.
+    """
+
+
+class Debouncer(Generic[_K, _V]):
+    """
+    Runs only the latest of a burst of calls sharing the same key
+    (e.g. the autocomplete requests of one user, one per keystroke).
+
+    Work starts after `delay` seconds. A newer call with the same key
+    cancels the previous call's work, whether it is still waiting to
+    start or already running, so bursts of calls mostly start no work.
+
+    Attributes
+    ----------
+    delay : float
+        Seconds to wait for newer calls before starting the work
+    in_flight : dict[_K, asyncio.Task[_V]]
+        The latest call's work, by key, until it finishes
+    stats : Counter[str]
+        `executed`: number of times the work was actually started
+        `superseded`: number of calls cancelled by a newer one
+        `timed_out`: number of calls which gave up waiting on the work
+    """
+
+    in_flight: dict[_K, asyncio.Task[_V]]
+    stats: Counter[str]
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.in_flight = {}
+        self.stats = Counter()
+
+    async def _run_after_delay(self, work: Callable[[], Awaitable[_V]]) -> _V:
+        await asyncio.sleep(self.delay)
+        self.stats["executed"] += 1
+        return await work()
+
+    def cancel(self, key: _K):
+        """
+        Cancel the work of the latest call with this key, if any;
+        that call raises Superseded.
+        """
+        if (task := self.in_flight.pop(key, None)) is not None:
+            task.cancel()
+            self.stats["superseded"] += 1
+
+    async def run(
+        self,
+        key: _K,
+        work: Callable[[], Awaitable[_V]],
+        timeout: float | None = None,
+    ) -> _V:
+        """
+        Run `work()` after `delay` seconds, unless a newer call
+        with the same key arrives first.
+
+        Parameters
+        ----------
+        key : _K
+            The key identifying the caller
+        work : Callable[[], Awaitable[_V]]
+            Zero-argument callable returning the awaitable to run
+        timeout : float | None, optional
+            Seconds to wait for the result, delay included
+
+        Returns
+        -------
+        _V
+            The result of the work
+
+        Raises
+        ------
+        Superseded
+            If a newer call with the same key cancelled the work
+        asyncio.TimeoutError
+            If the work did not finish within `timeout` seconds;
+            it keeps running in the background until it finishes,
+            or until a newer call cancels it
+        """
+        self.cancel(key)
+
+        task = asyncio.ensure_future(self._run_after_delay(work))
+        self.in_flight[key] = task
+
+        def forget(_):
+            if self.in_flight.get(key) is task:
+                del self.in_flight[key]
+            # Nobody awaits the work after a timeout; retrieve its
+            # exception so that asyncio doesn't log it as unhandled
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(forget)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.CancelledError:
+            # Only the work was cancelled, rather than this caller
+            if task.cancelled() and self.in_flight.get(key) is not task:
+                raise Superseded from None
+            raise
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise
+
+
+@dataclass(order=True)
+class PrefetchJob:
+    """
+    A unit of background work queued in a PrefetchScheduler.
+
+    Jobs are ordered by `priority` (lowest first),
+    then by submission order.
+
+    Attributes
+    ----------
+    priority : float
+        Lower values run first
+    seq : int
+        Submission order, used as a tie-breaker
+    owner : Hashable
+        Who the job belongs to (e.g. a reading session),
+        so that all of their jobs can be cancelled together
+    key : Hashable
+        Identifies the job among the owner's jobs (e.g. a page number)
+    host : str
+        The host contacted by the job, for per-host concurrency limits
+    work : Callable[[], Awaitable[Any]]
+        Zero-argument callable returning the awaitable to run
+    future : asyncio.Future
+        Resolved with the result of the work once the job finishes;
+        cancelled if the job is cancelled
+    """
+
+    priority: float
+    seq: int
+    owner: Hashable = field(compare=False)
+    key: Hashable = field(compare=False)
+    host: str = field(compare=False)
+    work: Callable[[], Awaitable[Any]] = field(compare=False, repr=False)
+    future: asyncio.Future = field(compare=False, repr=False)
+
+
+class PrefetchScheduler:
+    """
+    Runs background jobs from a priority queue on a bounded pool of workers.
+
+    At most `num_workers` jobs run at once overall, and at most
+    `per_host_limit` of them may contact the same host. Workers are
+    started lazily, on the first submission.
+
+    Each job belongs to an owner, and is identified by a key within it;
+    submitting a job which is already queued or running is a no-op.
+    Jobs which are no longer wanted (e.g. because the reader moved on)
+    can be cancelled by owner, whether they are queued or running.
+
+    Attributes
+    ----------
+    num_workers : int
+        Maximum number of jobs running at once
+    per_host_limit : int
+        Maximum number of jobs running at once against the same host
+    stats : Counter[str]
+        `submitted`: number of jobs queued
+        `completed`: number of jobs which finished successfully
+        `failed`: number of jobs which raised an exception
+        `cancelled`: number of jobs cancelled before finishing
+    """
+
+    def __init__(self, num_workers: int = 4, per_host_limit: int = 2):
+        self.num_workers = num_workers
+        self.per_host_limit = per_host_limit
+        self.stats = Counter()
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.PriorityQueue[PrefetchJob] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._host_limits: defaultdict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.per_host_limit)
+        )
+        self._seq = count()
+
+        # (owner, key) -> job, for jobs which are queued or running
+        self._jobs: dict[tuple[Hashable, Hashable], PrefetchJob] = {}
+        self._running: dict[tuple[Hashable, Hashable], asyncio.Task] = {}
+
+    def _ensure_workers(self):
+        """
+        Start the workers on the running event loop,
+        if they aren't already running there.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+
+        # Queues and semaphores are bound to the loop they are used on
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._host_limits.clear()
+        self._jobs.clear()
+        self._running.clear()
+        self._workers = [
+            loop.create_task(self._worker()) for _ in range(self.num_workers)
+        ]
+
+    def submit(
+        self,
+        owner: Hashable,
+        key: Hashable,
+        url: str,
+        work: Callable[[], Awaitable[Any]],
+        priority: float = 0,
+    ) -> PrefetchJob:
+        """
+        Queue a job, unless the owner already has a job
+        with the same key queued or running.
+
+        Parameters
+        ----------
+        owner : Hashable
+            Who the job belongs to
+        key : Hashable
+            Identifies the job among the owner's jobs
+        url : str
+            The URL the job fetches; its host is subject
+            to the per-host concurrency limit
+        work : Callable[[], Awaitable[Any]]
+            Zero-argument callable returning the awaitable to run
+        priority : float, optional
+            Lower values run first, by default 0
+
+        Returns
+        -------
+        PrefetchJob
+            The queued job, or the existing one
+        """
+        self._ensure_workers()
+
+        if (job := self._jobs.get((owner, key))) is not None:
+            return job
+
+        job = PrefetchJob(
+            priority,
+            next(self._seq),
+            owner,
+            key,
+            urlparse(url).hostname or "",
+            work,
+            self._loop.create_future(),
+        )
+        # Failures are logged by the worker; don't warn
+        # if nobody awaits the job
+        job.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        self._jobs[(owner, key)] = job
+        self._queue.put_nowait(job)
+        self.stats["submitted"] += 1
+        return job
+
+    def cancel(self, owner: Hashable, keep: Container[Hashable] = ()) -> int:
+        """
+        Cancel the queued and running jobs of an owner.
+
+        Parameters
+        ----------
+        owner : Hashable
+            Whose jobs to cancel
+        keep : Container[Hashable], optional
+            Keys of jobs which should be left alone
+
+        Returns
+        -------
+        int
+            The number of jobs cancelled
+        """
+        cancelled = 0
+        for job_id, job in list(self._jobs.items()):
+            job_owner, key = job_id
+            if job_owner != owner or key in keep:
+                continue
+
+            del self._jobs[job_id]
+            job.future.cancel()
+            if (task := self._running.pop(job_id, None)) is not None:
+                task.cancel()
+
+            cancelled += 1
+
+        self.stats["cancelled"] += cancelled
+        return cancelled
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+
+            # Cancelled while queued
+            if job.future.done():
+                continue
+
+            async with self._host_limits[job.host]:
+                # Cancelled while waiting for the host
+                if job.future.done():
+                    continue
+
+                await self._run(job)
+
+    async def _run(self, job: PrefetchJob):
+        job_id = (job.owner, job.key)
+        task = asyncio.ensure_future(job.work())
+        self._running[job_id] = task
+
+        try:
+            # wait() doesn't propagate the task's cancellation,
+            # so a cancelled job doesn't take the worker down with it
+            await asyncio.wait({task})
+        finally:
+            if not task.done():
+                task.cancel()
+
+            if self._running.get(job_id) is task:
+                del self._running[job_id]
+            if self._jobs.get(job_id) is job:
+                del self._jobs[job_id]
+
+        if job.future.done() or task.cancelled():
+            return
+
+        if (e := task.exception()) is not None:
+            logger.warning(
+                f"Prefetch job {job.key} of {job.owner} failed: {e!r}"
+            )
+            self.stats["failed"] += 1
+            job.future.set_exception(e)
+        else:
+            self.stats["completed"] += 1
+            job.future.set_result(task.result())
+
+    async def close(self):
+        """
+        Cancel all jobs, and stop the workers.
+        """
+        for owner, _ in list(self._jobs):
+            self.cancel(owner)
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        self._workers = []
+        self._loop = None
+
+
+def _offloaded(fn: Callable[..., _V], *args) -> _V:
+    """
+    Calls `fn(*args)` in a worker of an OffloadPool.
+
+    asyncio can't set a StopIteration (e.g. from a bare `next()`) as
+    the result of a future, which then never resolves, so it is
+    raised as a RuntimeError instead.
+    """
+    try:
+        return fn(*args)
+    except StopIteration as e:
+        raise RuntimeError(f"{fn!r} raised StopIteration") from e
+
+
+class OffloadPool:
+    """
+    Runs blocking, CPU-bound functions (e.g. HTML parsing)
+    off the event loop, so that they don't stall other tasks.
+
+    Depending on `kind`, functions run in:
+    - "thread": a thread pool. Cheap to dispatch, but threads still
+      contend for the GIL, so only parts which release it
+      (e.g. lxml's C parser) truly run in parallel with the loop.
+    - "process": a process pool. Never blocks the loop, but arguments
+      and results are pickled, so functions must be module-level and
+      should exchange plain data.
+    - "inline": directly on the event loop (no pool).
+
+    The pool is created lazily, on first use.
+
+    Attributes
+    ----------
+    kind : str
+        One of "thread", "process" or "inline"
+    max_workers : int
+        Maximum number of threads or processes
+    """
+
+    KINDS = ("thread", "process", "inline")
+
+    def __init__(self, kind: str = "thread", max_workers: int = 2):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown pool kind `{kind}`")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor | None:
+        if self._executor is None and self.kind != "inline":
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="comrade-offload"
+                )
+            else:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+        return self._executor
+
+    async def run(self, fn: Callable[..., _V], *args) -> _V:
+        """
+        Run `fn(*args)` in the pool, and await its result.
+        Exceptions raised by `fn` are propagated, except for
+        StopIteration, which is raised as a RuntimeError.
+        """
+        if self.kind == "inline":
+            return _offloaded(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, _offloaded, fn, *args
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
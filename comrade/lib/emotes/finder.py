@@ -1,11 +1,11 @@
 from Levenshtein import ratio
-from pymongo.collection import Collection
 
+from comrade.core.async_db import AsyncCollection
 from comrade.lib.emotes.structures import EmoteV5
 
 
-def find_emote_v5(
-    parse_str: str, collection: Collection, context_id: int
+async def find_emote_v5(
+    parse_str: str, collection: AsyncCollection, context_id: int
 ) -> EmoteV5:
     """
     Finds an emote, given a string to parse and a mongoDB collection
@@ -15,7 +15,7 @@ def find_emote_v5(
     ----------
     parse_str : str
         The string to parse, stripped of : characters
-    collection : Collection
+    collection : AsyncCollection
         MongoDB collection containig all emote documents (of form EmoteV5)
     context_id : int
         The Discord ID of the context in which the emote was called,
@@ -33,8 +33,8 @@ def find_emote_v5(
         "server": context_id,
     }
 
-    if not (emote_document := collection.find_one(case_sensitive_query)):
-        emote_document = collection.find_one(case_insensitive_query)
+    if not (emote_document := await collection.find_one(case_sensitive_query)):
+        emote_document = await collection.find_one(case_insensitive_query)
 
     try:
         emote = EmoteV5.from_dict(emote_document)
@@ -44,8 +44,8 @@ def find_emote_v5(
     return emote
 
 
-def find_similar_emotes(
-    parse_str: str, collection: Collection, context_id: int
+async def find_similar_emotes(
+    parse_str: str, collection: AsyncCollection, context_id: int
 ) -> list[EmoteV5]:
     """
     Find emotes within 0.6 levenshtein distance of the parse_str
@@ -54,7 +54,7 @@ def find_similar_emotes(
     ----------
     parse_str : str
         The string to parse, stripped of : characters
-    collection : Collection
+    collection : AsyncCollection
         MongoDB collection containig all emote documents (of form EmoteV5)
     context_id : int
         The Discord ID of the context in which the emote was called,
@@ -66,7 +66,7 @@ def find_similar_emotes(
         A list of emotes with a levenshtein ratio of 0.6 or higher
 
     """
-    all_documents = collection.find({"server": context_id})
+    all_documents = await collection.find({"server": context_id})
 
     return [
         EmoteV5.from_dict(doc)
@@ -8,7 +8,6 @@ from comrade.lib.nhentai.regex import (
     IMAGES_URL_REGEX,
     TAGS_REGEX,
 )
-from comrade.lib.nhentai.sources import IMAGE_LINK_BASE
 
 
 def get_gallery_id_from_cover_block(block: bs4.Tag) -> int:
@@ -60,32 +59,30 @@ def get_images_id_from_noscript_block(block: bs4.Tag) -> int:
     return images_id
 
 
-def get_image_url_from_noscript_block(
-    block: bs4.Tag, images_id: int
-) -> str | None:
+def get_image_extension_from_noscript_block(block: bs4.Tag) -> str | None:
     """
-    Constructs an image URL from a <noscript> block.
+    Determines the image file extension of a page from a <noscript> block.
+
+    The format is similar to
+    <noscript><img src="https://t3.nhentai.net/galleries/1019423/1t.jpg" /></noscript>
 
     Parameters
     ----------
     block : bs4.Tag
         The <noscript> block to parse.
-    images_id : int
-        The images ID, previously determined from another <noscript> block.
 
     Returns
     -------
     str
-        The image URL, if it could be determined, or None otherwise.
+        The image extension (e.g. "jpg"), if it could be determined,
+        or None otherwise.
     """
     match = IMAGES_URL_REGEX.search(str(block))
 
     if not match:
         return None
 
-    page_num = match.group(1)
-    img_ext = match.group(2)
-    return f"{IMAGE_LINK_BASE}/{images_id}/{page_num}.{img_ext}"
+    return match.group(2)
 
 
 def get_tags_from_a_blocks(tags_a_blocks: list[bs4.Tag]) -> list[str]:
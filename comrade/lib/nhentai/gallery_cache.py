@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+
+from comrade.core.async_db import AsyncCollection
+from comrade.core.configuration import (
+    NHENTAI_GALLERY_CACHE_SIZE,
+    NHENTAI_GALLERY_CACHE_TTL,
+)
+from comrade.lib.caching import TTLCache
+from comrade.lib.nhentai.structures import NHentaiGallery
+
+logger = getLogger(__name__)
+
+
+class GalleryCache:
+    """
+    Cache of parsed NHentaiGallery objects, keyed by gallery ID.
+
+    1. in-memory tier: a TTLCache holding at most `max_size` galleries
+    2. MongoDB tier: a collection shared by all bot instances (optional),
+       whose documents are removed by a TTL index
+
+    Lookups check memory first, then MongoDB (promoting hits into memory).
+    Writes go to both tiers. Galleries expire `ttl` seconds after being
+    fetched, so that edits on the site are eventually picked up.
+
+    Attributes
+    ----------
+    memory : TTLCache[int, NHentaiGallery]
+        The in-memory tier
+    collection : AsyncCollection | None
+        The MongoDB tier, if enabled
+    """
+
+    def __init__(
+        self,
+        max_size: int = NHENTAI_GALLERY_CACHE_SIZE,
+        ttl: float = NHENTAI_GALLERY_CACHE_TTL,
+        collection: AsyncCollection | None = None,
+    ):
+        self.memory = TTLCache(max_size, ttl)
+        self.collection = collection
+        self._index_attempted = False
+
+    @property
+    def ttl(self) -> float:
+        return self.memory.ttl
+
+    async def get(self, gallery_id: int) -> NHentaiGallery | None:
+        """
+        Get a gallery from the cache (if it exists, and hasn't expired)
+        """
+        if (gallery := self.memory.get(gallery_id)) is not None:
+            return gallery
+
+        if self.collection is None:
+            return None
+
+        doc = await self.collection.find_one(
+            {
+                "_id": gallery_id,
+                # the TTL monitor only runs periodically
+                "cached_at": {"$gt": self._now() - timedelta(seconds=self.ttl)},
+            }
+        )
+        if doc is None:
+            return None
+
+        cached_at: datetime = doc.pop("cached_at")
+        del doc["_id"]
+        try:
+            gallery = NHentaiGallery(**doc)
+        except TypeError:
+            # Cached by an older version, with different fields
+            return None
+
+        # Keep the original expiry time
+        if cached_at.tzinfo is None:
+            cached_at = cached_at.replace(tzinfo=timezone.utc)
+        remaining = self.ttl - (self._now() - cached_at).total_seconds()
+        self.memory.put(gallery_id, gallery, ttl=remaining)
+        return gallery
+
+    async def put(self, gallery: NHentaiGallery):
+        """
+        Add a freshly fetched gallery to the cache.
+        """
+        self.memory.put(gallery.gallery_id, gallery)
+
+        if self.collection is None:
+            return
+
+        try:
+            await self._ensure_index()
+            await self.collection.update_one(
+                {"_id": gallery.gallery_id},
+                {"$set": asdict(gallery) | {"cached_at": self._now()}},
+                upsert=True,
+            )
+        except Exception:
+            # The memory tier still works without MongoDB
+            logger.warning(
+                f"Could not cache gallery {gallery.gallery_id} in MongoDB",
+                exc_info=True,
+            )
+
+    async def _ensure_index(self):
+        """
+        Have MongoDB delete expired galleries by itself.
+
+        Only attempted once, whatever the outcome. If it fails (e.g. the
+        index already exists with the previous TTL, which only `collMod`
+        can change), lookups still skip expired galleries; MongoDB just
+        deletes them on the old schedule.
+        """
+        if self._index_attempted:
+            return
+        self._index_attempted = True
+
+        try:
+            await self.collection.create_index(
+                "cached_at", expireAfterSeconds=int(self.ttl)
+            )
+        except Exception:
+            logger.warning(
+                "Could not create the TTL index of the gallery cache;"
+                " if the TTL changed, update the index with collMod",
+                exc_info=True,
+            )
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
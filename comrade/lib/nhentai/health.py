@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from time import monotonic
+
+from comrade.core.configuration import (
+    NHENTAI_BREAKER_COOLDOWN,
+    NHENTAI_BREAKER_THRESHOLD,
+)
+from comrade.lib.nhentai.proxies import NHentaiSource
+from comrade.lib.nhentai.structures import PageParsingError
+
+# Number of recent requests kept per source
+HEALTH_WINDOW = 100
+
+# Assumed latency of a source with no successful requests yet, in seconds
+DEFAULT_LATENCY = 1.0
+
+
+@dataclass
+class SourceHealth:
+    """
+    Recent request outcomes of one NHentaiSource.
+
+    Attributes
+    ----------
+    outcomes : deque[bool]
+        Whether each recent request reached the site (True), or the source
+        was blocked, timed out or errored (False). Requests for pages which
+        don't exist still count as reaching the site.
+    latencies : deque[float]
+        Latencies of recent requests which reached the site, in seconds
+    errors : Counter[str]
+        Total number of errors, by exception type
+    consecutive_failures : int
+        Number of failures since the last request which reached the site
+    cooldown_until : float
+        Monotonic time until which the circuit breaker is open
+    """
+
+    outcomes: deque[bool] = field(
+        default_factory=lambda: deque(maxlen=HEALTH_WINDOW)
+    )
+    latencies: deque[float] = field(
+        default_factory=lambda: deque(maxlen=HEALTH_WINDOW)
+    )
+    errors: Counter[str] = field(default_factory=Counter)
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+
+    @property
+    def success_rate(self) -> float | None:
+        if not self.outcomes:
+            return None
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def latency_percentile(self, q: float) -> float | None:
+        """
+        The q-th quantile (0 to 1) of recent latencies, if there are any.
+        """
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[round(q * (len(latencies) - 1))]
+
+    def in_cooldown(self, now: float | None = None) -> bool:
+        return (now if now is not None else monotonic()) < self.cooldown_until
+
+    @property
+    def summary(self) -> str:
+        """
+        Human-readable summary, for display in Discord.
+        """
+        if not self.outcomes:
+            return "No requests yet"
+
+        lines = [
+            f"Success: {self.success_rate:.0%} of last {len(self.outcomes)}",
+        ]
+        if self.latencies:
+            lines.append(
+                f"Latency: p50 {self.latency_percentile(0.5):.2f}s,"
+                f" p90 {self.latency_percentile(0.9):.2f}s"
+            )
+        if self.errors:
+            lines.append(
+                "Errors: "
+                + ", ".join(f"{name} ×{n}" for name, n in self.errors.items())
+            )
+        if self.in_cooldown():
+            lines.append(
+                f"Cooling down for {self.cooldown_until - monotonic():.0f}s"
+            )
+        return "\n".join(lines)
+
+
+class SourceHealthTracker:
+    """
+    Tracks the health of NHentai sources, to try healthy sources first.
+
+    A source which fails `failure_threshold` times in a row (blocked by
+    Cloudflare, timing out, etc.) trips its circuit breaker, and is only
+    tried as a last resort for `cooldown` seconds. After that, it is tried
+    again normally; one more failure trips the breaker again, while a
+    success resets it.
+
+    `PageParsingError`s (the page doesn't exist) are counted, but don't
+    count against the source, since it did answer correctly.
+
+    Attributes
+    ----------
+    health : dict[str, SourceHealth]
+        Health of each source, by name
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = NHENTAI_BREAKER_THRESHOLD,
+        cooldown: float = NHENTAI_BREAKER_COOLDOWN,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health: dict[str, SourceHealth] = {}
+
+    def __getitem__(self, source: NHentaiSource) -> SourceHealth:
+        return self.health.setdefault(source.name, SourceHealth())
+
+    def record_success(self, source: NHentaiSource, latency: float):
+        """
+        Record a request which reached the site.
+        """
+        health = self[source]
+        health.outcomes.append(True)
+        health.latencies.append(latency)
+        health.consecutive_failures = 0
+        health.cooldown_until = 0.0
+
+    def record_failure(
+        self, source: NHentaiSource, error: Exception, latency: float
+    ):
+        """
+        Record a failed request, tripping the circuit breaker
+        if the source keeps failing.
+        """
+        health = self[source]
+        health.errors[type(error).__name__] += 1
+
+        # The source works; the page just doesn't exist there
+        if isinstance(error, PageParsingError):
+            self.record_success(source, latency)
+            return
+
+        health.outcomes.append(False)
+        health.consecutive_failures += 1
+        if health.consecutive_failures >= self.failure_threshold:
+            health.cooldown_until = monotonic() + self.cooldown
+
+    def order(self, sources: list[NHentaiSource]) -> list[NHentaiSource]:
+        """
+        Order sources by how likely they are to answer quickly:
+        median latency divided by success rate, lowest first.
+
+        Sources without any data are assumed to be healthy, and sources
+        in cooldown go last. Ties keep the original order.
+        """
+        now = monotonic()
+
+        def expected_cost(source: NHentaiSource) -> tuple[bool, float]:
+            health = self[source]
+            latency = health.latency_percentile(0.5) or DEFAULT_LATENCY
+            success_rate = health.success_rate
+            if success_rate is None:
+                success_rate = 1.0
+            return (
+                health.in_cooldown(now),
+                latency / max(success_rate, 0.01),
+            )
+
+        return sorted(sources, key=expected_cost)
+
+
+SOURCE_HEALTH = SourceHealthTracker()
@@ -0,0 +1,272 @@
+"""
+Fast parser backend for NHentai pages, working directly on lxml trees.
+
+Produces the same results as the BeautifulSoup backend in page_parser,
+but extracts everything in a single walk over the elements of interest,
+and reads attributes directly instead of serializing and regex-searching
+each element (the bulk of the cost on galleries with hundreds of pages).
+"""
+import lxml.html
+
+from comrade.lib.nhentai.regex import (
+    GALLERY_ID_REGEX,
+    IMAGES_ID_REGEX,
+    IMAGES_URL_REGEX,
+    PAGE_NUMBER_REGEX,
+    TAGS_REGEX,
+)
+from comrade.lib.nhentai.structures import (
+    InvalidProxyError,
+    NHentaiGallery,
+    NHentaiSearchResult,
+    PageParsingError,
+    encode_page_extensions,
+)
+
+
+def _raise_for_proxy_tree(tree: lxml.html.HtmlElement, text: str):
+    """
+    Raises an exception if it looks like the tree (whose text content
+    is `text`) represents a page blocked by Cloudflare.
+    """
+    if sum(1 for _ in tree.iter("meta")) < 3:
+        raise InvalidProxyError("Proxy did not return a valid gallery page")
+
+    if "Just a moment" in text:
+        raise InvalidProxyError("Proxy is blocked by Cloudflare")
+
+
+def raise_for_gallery_tree(tree: lxml.html.HtmlElement):
+    """
+    lxml equivalent of page_parser.raise_for_gallery_soup.
+
+    Raises
+    ------
+    InvalidProxyError
+        If the proxy itself is invalid.
+    PageParsingError
+        If the gallery itself is invalid.
+    """
+    text = tree.text_content()
+    _raise_for_proxy_tree(tree, text)
+
+    # Yandex-specific
+    if "Unable to translate page" in text:
+        raise PageParsingError("Gallery does not exist")
+
+    # Gallery-specific -- gallery not found
+    if "404 - Not Found" in (tree.findtext(".//title") or ""):
+        raise PageParsingError("Gallery does not exist")
+
+
+def raise_for_search_tree(tree: lxml.html.HtmlElement):
+    """
+    lxml equivalent of page_parser.raise_for_search_soup.
+
+    Raises
+    ------
+    InvalidProxyError
+        If the proxy itself is invalid.
+    PageParsingError
+        If the search has no results.
+    """
+    text = tree.text_content()
+    _raise_for_proxy_tree(tree, text)
+
+    for result in ("No results found", "0 Results"):
+        if result in text:
+            raise PageParsingError("No results found for search query")
+
+
+def _noscript_sources(noscript: lxml.html.HtmlElement) -> str:
+    """
+    The image URL(s) inside a <noscript> block,
+    e.g. <noscript><img src="https://t3.nhentai.net/galleries/1019423/1t.jpg" /></noscript>
+    """
+    sources = [img.get("src", "") for img in noscript.iter("img")]
+    # Some parsers keep the contents of <noscript> as raw text
+    if noscript.text:
+        sources.append(noscript.text)
+    return " ".join(sources)
+
+
+def parse_gallery_from_tree(
+    tree: lxml.html.HtmlElement, provider: str
+) -> NHentaiGallery:
+    """
+    Returns an NHentaiGallery object from the tree of a gallery page.
+
+    Parameters
+    ----------
+    tree : lxml.html.HtmlElement
+        The parsed gallery page.
+    provider : str
+        The source the page was retrieved from.
+
+    Returns
+    -------
+    NHentaiGallery
+        The gallery.
+    """
+    title: str | None = None
+    gallery_id: int | None = None
+    images_id: int | None = None
+    page_extensions: list[str] = []  # in page order
+    tags: list[str] = []
+
+    for element in tree.iter("h1", "div", "noscript", "a"):
+        match element.tag:
+            case "h1" if title is None:
+                title = element.text_content()
+
+            # e.g. <div id="cover"><a href="/g/185217/1"> -> 185217
+            case "div" if gallery_id is None and element.get("id") == "cover":
+                cover_a = next(element.iter("a"), None)
+                href = "" if cover_a is None else cover_a.get("href", "")
+                search_result = GALLERY_ID_REGEX.search(href)
+                if search_result is None:
+                    raise ValueError(
+                        "Could not determine gallery ID from cover block"
+                    )
+                gallery_id = int(search_result.group(1))
+
+            case "noscript":
+                sources = _noscript_sources(element)
+
+                # The first <noscript> links to the cover
+                if images_id is None:
+                    search_result = IMAGES_ID_REGEX.search(sources)
+                    if search_result is None:
+                        raise ValueError(
+                            "Could not determine images ID from noscript block"
+                        )
+                    images_id = int(search_result.group(1))
+
+                if url_match := IMAGES_URL_REGEX.search(sources):
+                    page_extensions.append(url_match.group(2))
+
+            # e.g. <a href="/tag/sole-female/" class="tag tag-35762">
+            case "a" if "tag" in element.classes:
+                if tag_match := TAGS_REGEX.search(element.get("href", "")):
+                    tags.append(tag_match.group(1).replace("-", " "))
+
+    return NHentaiGallery(
+        gallery_id,
+        title,
+        images_id,
+        encode_page_extensions(page_extensions),
+        tags,
+        provider,
+    )
+
+
+def _pagination_section(
+    tree: lxml.html.HtmlElement,
+) -> lxml.html.HtmlElement | None:
+    return next(
+        (
+            section
+            for section in tree.iter("section")
+            if "pagination" in section.classes
+        ),
+        None,
+    )
+
+
+def _current_page(pagination_section: lxml.html.HtmlElement) -> int:
+    current_page_tag = next(
+        (
+            a
+            for a in pagination_section.iter("a")
+            if {"page", "current"} <= a.classes
+        ),
+        None,
+    )
+    if current_page_tag is None:
+        raise ValueError("Could not find the current page in pagination")
+    return int(current_page_tag.text_content())
+
+
+def parse_search_result_from_tree(
+    tree: lxml.html.HtmlElement,
+) -> NHentaiSearchResult:
+    """
+    Extracts search results from the tree of a valid NHentai search page.
+
+    Parameters
+    ----------
+    tree : lxml.html.HtmlElement
+        The parsed search page.
+
+    Returns
+    -------
+    NHentaiSearchResult
+        The search results.
+    """
+    search_results_div = tree.get_element_by_id("content")
+
+    gallery_ids = []
+    gallery_titles = []
+    # Each <div class="gallery"> represents a single search result
+    for gallery_div in search_results_div.iter("div"):
+        if "gallery" not in gallery_div.classes:
+            continue
+
+        gallery_a = next(gallery_div.iter("a"), None)
+        href = "" if gallery_a is None else gallery_a.get("href", "")
+        search_result = GALLERY_ID_REGEX.search(href)
+        if search_result is None:
+            raise ValueError("Could not determine gallery ID from gallery div")
+
+        title_div = next(
+            (
+                div
+                for div in gallery_div.iter("div")
+                if "caption" in div.classes
+            ),
+            None,
+        )
+        if title_div is None:
+            raise ValueError("Could not find the title of a gallery div")
+
+        gallery_ids.append(int(search_result.group(1)))
+        gallery_titles.append(title_div.text_content())
+
+    if (pagination_section := _pagination_section(tree)) is None:
+        # No pagination, only one page
+        return NHentaiSearchResult(1, gallery_ids, gallery_titles)
+
+    return NHentaiSearchResult(
+        _current_page(pagination_section), gallery_ids, gallery_titles
+    )
+
+
+def parse_maximum_search_pages_from_tree(tree: lxml.html.HtmlElement) -> int:
+    """
+    Determines the maximum number of pages for a search query,
+    from the pagination section of a search page.
+
+    Parameters
+    ----------
+    tree : lxml.html.HtmlElement
+        The parsed search page.
+
+    Returns
+    -------
+    int
+        the maximum number of pages for a search query.
+    """
+    if (pagination_section := _pagination_section(tree)) is None:
+        # No pagination, only one page
+        return 1
+
+    last_page_tag = next(
+        (a for a in pagination_section.iter("a") if "last" in a.classes),
+        None,
+    )
+
+    if last_page_tag is None:
+        # We are already on the last page
+        return _current_page(pagination_section)
+
+    return int(PAGE_NUMBER_REGEX.search(last_page_tag.get("href")).group(1))
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from enum import StrEnum
+from time import time
+from typing import Any
+
+from comrade.lib.nhentai.structures import NHentaiGallery
+
+
+class MirrorStatus(StrEnum):
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"  # finished, but some pages could not be mirrored
+
+
+@dataclass
+class MirrorProgress:
+    """
+    Progress of mirroring every page of a gallery to the relay.
+
+    Stored in MongoDB (one document per gallery, keyed by gallery ID)
+    as the job runs, so that interrupted jobs can be resumed after a
+    restart, and so that galleries which are fully mirrored can be read
+    without fetching anything from the source site.
+
+    Attributes
+    ----------
+    gallery : NHentaiGallery
+        The gallery being mirrored
+    status : MirrorStatus
+        Whether the job is still running
+    mirrored_pages : int
+        Number of pages mirrored so far (including pages that
+        were already mirrored when the job started)
+    failed_pages : list[int]
+        Page numbers which could not be mirrored
+    uploaded_pages : int
+        Number of pages downloaded and uploaded by the job itself
+    elapsed : float
+        Time spent running the job, across restarts, in seconds
+    started_at : float
+        UNIX time at which the job was first started
+    """
+
+    gallery: NHentaiGallery
+    status: MirrorStatus = MirrorStatus.RUNNING
+    mirrored_pages: int = 0
+    failed_pages: list[int] = field(default_factory=list)
+    uploaded_pages: int = 0
+    elapsed: float = 0.0
+    started_at: float = field(default_factory=time)
+
+    @property
+    def gallery_id(self) -> int:
+        return self.gallery.gallery_id
+
+    @property
+    def total_pages(self) -> int:
+        return len(self.gallery)
+
+    @property
+    def finished(self) -> bool:
+        return self.status != MirrorStatus.RUNNING
+
+    @property
+    def throughput(self) -> float:
+        """
+        Pages uploaded per second of running time.
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.uploaded_pages / self.elapsed
+
+    @property
+    def summary(self) -> str:
+        percent = 100 * self.mirrored_pages / max(self.total_pages, 1)
+        summary = (
+            f"{self.status}: {self.mirrored_pages}/{self.total_pages} pages"
+            f" ({percent:.0f}%), {self.throughput:.1f} pages/s"
+        )
+        if self.failed_pages:
+            summary += f", {len(self.failed_pages)} failed"
+        return summary
+
+    def to_document(self) -> dict[str, Any]:
+        return {"_id": self.gallery_id} | asdict(self)
+
+    @classmethod
+    def from_document(cls, doc: dict[str, Any]) -> MirrorProgress | None:
+        """
+        Restore saved progress, or None if the document was written
+        by a version of the bot with different fields.
+        """
+        fields = {k: v for k, v in doc.items() if k != "_id"}
+        try:
+            fields["gallery"] = NHentaiGallery(**fields["gallery"])
+            fields["status"] = MirrorStatus(fields["status"])
+            return cls(**fields)
+        except (KeyError, TypeError, ValueError):
+            return None
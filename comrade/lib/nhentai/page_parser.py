@@ -1,35 +1,37 @@
-import re
-from functools import partial
-
 import bs4
 
+from comrade.core.configuration import NHENTAI_PARSER
+from comrade.lib.nhentai import lxml_parser
 from comrade.lib.nhentai.element_parser import (
     get_gallery_id_and_title_from_gallery_div,
     get_gallery_id_from_cover_block,
-    get_image_url_from_noscript_block,
+    get_image_extension_from_noscript_block,
     get_images_id_from_noscript_block,
     get_tags_from_a_blocks,
 )
 from comrade.lib.nhentai.structures import (
     InvalidProxyError,
     NHentaiGallery,
+    NHentaiSearchPage,
     NHentaiSearchResult,
     NHentaiWebPage,
     PageParsingError,
+    encode_page_extensions,
 )
+from comrade.lib.nhentai.regex import PAGE_NUMBER_REGEX
 
 
-def _raise_for_proxy_soup(soup: bs4.BeautifulSoup):
+def _raise_for_proxy_soup(soup: bs4.BeautifulSoup, text: str):
     """
-    Raises an exception if it looks like the soup
-    represents a page blocked by Cloudflare.
+    Raises an exception if it looks like the soup (whose text
+    is `text`) represents a page blocked by Cloudflare.
     """
     meta_tags = soup.find_all("meta")
 
     if len(meta_tags) < 3:
         raise InvalidProxyError("Proxy did not return a valid gallery page")
 
-    if "Just a moment" in soup.text:
+    if "Just a moment" in text:
         raise InvalidProxyError("Proxy is blocked by Cloudflare")
 
 
@@ -61,10 +63,12 @@ def raise_for_gallery_soup(soup: bs4.BeautifulSoup):
     PageParsingError
         If the gallery itself is invalid.
     """
-    _raise_for_proxy_soup(soup)
+    # soup.text joins every string in the page, so only do it once
+    text = soup.text
+    _raise_for_proxy_soup(soup, text)
 
     # Yandex-specific
-    if "Unable to translate page" in soup.text:
+    if "Unable to translate page" in text:
         raise PageParsingError("Gallery does not exist")
 
     # Gallery-specific -- gallery not found
@@ -81,16 +85,53 @@ def raise_for_search_soup(soup: bs4.BeautifulSoup) -> bool:
     1. the proxy itself is invalid e.g. blocked by Cloudflare
     2. the search itself is invalid e.g. no results found
     """
-    _raise_for_proxy_soup(soup)
+    text = soup.text
+    _raise_for_proxy_soup(soup, text)
 
     negative_results = ["No results found", "0 Results"]
 
     for result in negative_results:
-        if result in soup.text:
+        if result in text:
             raise PageParsingError("No results found for search query")
 
 
-def parse_gallery_from_page(page: NHentaiWebPage) -> NHentaiGallery:
+def raise_for_gallery_page(page: NHentaiWebPage, parser: str = NHENTAI_PARSER):
+    """
+    Checks that a page is a valid gallery page; see raise_for_gallery_soup.
+
+    Parameters
+    ----------
+    page : NHentaiWebPage
+        The page to check.
+    parser : str, optional
+        Parser backend to use, either "lxml" or "bs4".
+    """
+    if parser == "lxml":
+        lxml_parser.raise_for_gallery_tree(page.tree)
+    else:
+        raise_for_gallery_soup(page.soup)
+
+
+def raise_for_search_page(page: NHentaiWebPage, parser: str = NHENTAI_PARSER):
+    """
+    Checks that a page is a valid search page; see raise_for_search_soup.
+
+    Parameters
+    ----------
+    page : NHentaiWebPage
+        The page to check.
+    parser : str, optional
+        Parser backend to use, either "lxml" or "bs4".
+    """
+    if parser == "lxml":
+        lxml_parser.raise_for_search_tree(page.tree)
+    else:
+        raise_for_search_soup(page.soup)
+
+
+def parse_gallery_from_page(
+    page: NHentaiWebPage, parser: str = NHENTAI_PARSER
+) -> NHentaiGallery:
     """
     Returns an NHentaiGallery object from the given page.
 
@@ -98,12 +139,17 @@ def parse_gallery_from_page(page: NHentaiWebPage) -> NHentaiGallery:
     ----------
     page : NHentaiWebPage
         The page to extract the gallery from.
+    parser : str, optional
+        Parser backend to use, either "lxml" or "bs4".
 
     Returns
     -------
     NHentaiGallery
         The gallery.
     """
+    if parser == "lxml":
+        return lxml_parser.parse_gallery_from_tree(page.tree, page.provider)
+
     soup = page.soup
 
     title = soup.find("h1").text
@@ -117,13 +163,12 @@ def parse_gallery_from_page(page: NHentaiWebPage) -> NHentaiGallery:
     # then extract the image ID from the link
     images_id = get_images_id_from_noscript_block(soup.find("noscript"))
 
-    # Construct image URLs from other <noscript> tags
-    partial_get_image_url = partial(
-        get_image_url_from_noscript_block, images_id=images_id
+    # Find the image extension of each page from other <noscript> tags
+    # (the page thumbnails, in order), possibly containing None
+    mapped_extensions = map(
+        get_image_extension_from_noscript_block, soup.find_all("noscript")
     )
-    # map to function, possibly containins None
-    mapped_urls = map(partial_get_image_url, soup.find_all("noscript"))
-    image_urls = list(filter(None, mapped_urls))
+    page_extensions = encode_page_extensions(filter(None, mapped_extensions))
 
     # Find tags, based on <a> tags with class "tag"
     tag_a_blocks = soup.find_all("a", class_="tag")
@@ -133,13 +178,15 @@ def parse_gallery_from_page(page: NHentaiWebPage) -> NHentaiGallery:
         gallery_id,
         title,
         images_id,
-        image_urls,
+        page_extensions,
         tags,
         page.provider,
     )
 
 
-def parse_search_result_from_page(page: NHentaiWebPage) -> NHentaiSearchResult:
+def parse_search_result_from_page(
+    page: NHentaiWebPage, parser: str = NHENTAI_PARSER
+) -> NHentaiSearchResult:
     """
     Extracts search results from a valid NHentai search page.
 
@@ -147,12 +194,17 @@ def parse_search_result_from_page(page: NHentaiWebPage) -> NHentaiSearchResult:
     ----------
     page : NHentaiWebPage
         The page to extract the search results from.
+    parser : str, optional
+        Parser backend to use, either "lxml" or "bs4".
 
     Returns
     -------
     NHentaiSearchResult
         The search results.
     """
+    if parser == "lxml":
+        return lxml_parser.parse_search_result_from_tree(page.tree)
+
     soup = page.soup
 
     # Find the search results container
@@ -184,7 +236,9 @@ def parse_search_result_from_page(page: NHentaiWebPage) -> NHentaiSearchResult:
     return NHentaiSearchResult(current_page, gallery_ids, gallery_titles)
 
 
-def parse_maximum_search_pages(page: NHentaiWebPage) -> int:
+def parse_maximum_search_pages(
+    page: NHentaiWebPage, parser: str = NHENTAI_PARSER
+) -> int:
     """
     Determines the maximum number of pages for a search query.
 
@@ -192,6 +246,8 @@ def parse_maximum_search_pages(page: NHentaiWebPage) -> int:
     ----------
     page : NHentaiWebPage
         The page to extract the maximum number of pages from.
+    parser : str, optional
+        Parser backend to use, either "lxml" or "bs4".
 
     Returns
     -------
@@ -201,6 +257,8 @@ def parse_maximum_search_pages(page: NHentaiWebPage) -> int:
     Uses inspection of the pagination section of the page
     to determine the maximum number of pages.
     """
+    if parser == "lxml":
+        return lxml_parser.parse_maximum_search_pages_from_tree(page.tree)
 
     soup = page.soup
     # Try to find the pagination section
@@ -224,5 +282,67 @@ def parse_maximum_search_pages(page: NHentaiWebPage) -> int:
 
     # Otherwise, we can extract the maximum page number from the last page tag
     # (using the "href" attribute)
-    pattern = re.compile(r"page=(\d+)")
-    return int(pattern.search(last_page_tag["href"]).group(1))
+    return int(PAGE_NUMBER_REGEX.search(last_page_tag["href"]).group(1))
+
+
+def gallery_from_html(
+    provider: str, html: str, parser: str = NHENTAI_PARSER
+) -> NHentaiGallery:
+    """
+    Validates and parses a gallery page, straight from its HTML.
+
+    Only takes and returns plain data, so that it can run in a
+    worker thread or process (see search.PARSE_POOL).
+
+    Parameters
+    ----------
+    provider : str
+        Name of the source the page was retrieved from.
+    html : str
+        The HTML content of the page.
+    parser : str, optional
+        Parser backend to use, either "lxml" or "bs4".
+
+    Raises
+    ------
+    InvalidProxyError
+        If the proxy itself is invalid.
+    PageParsingError
+        If the gallery itself is invalid.
+    """
+    page = NHentaiWebPage(provider, html)
+    raise_for_gallery_page(page, parser)
+    return parse_gallery_from_page(page, parser)
+
+
+def search_page_from_html(
+    provider: str, html: str, parser: str = NHENTAI_PARSER
+) -> NHentaiSearchPage:
+    """
+    Validates and parses a search page, straight from its HTML.
+
+    Only takes and returns plain data, so that it can run in a
+    worker thread or process (see search.PARSE_POOL).
+
+    Parameters
+    ----------
+    provider : str
+        Name of the source the page was retrieved from.
+    html : str
+        The HTML content of the page.
+    parser : str, optional
+        Parser backend to use, either "lxml" or "bs4".
+
+    Raises
+    ------
+    InvalidProxyError
+        If the proxy itself is invalid.
+    PageParsingError
+        If the search itself is invalid (e.g. no results).
+    """
+    page = NHentaiWebPage(provider, html)
+    raise_for_search_page(page, parser)
+    return NHentaiSearchPage(
+        parse_search_result_from_page(page, parser),
+        parse_maximum_search_pages(page, parser),
+    )
@@ -3,6 +3,7 @@ from urllib.parse import quote, quote_plus
 
 from aiohttp import ClientSession
 
+from comrade.core.http_cache import HTTPCache, get_text
 from comrade.lib.nhentai.structures import NHentaiSortOrder
 
 
@@ -10,9 +11,13 @@ from comrade.lib.nhentai.structures import NHentaiSortOrder
 class NHentaiSource:
     name: str
     url: str
+    timeout: float | None = None  # seconds; None uses NHENTAI_SOURCE_TIMEOUT
 
     async def retrieve_gallery_page(
-        self, session: ClientSession, gallery_num: int
+        self,
+        session: ClientSession,
+        gallery_num: int,
+        cache: HTTPCache | None = None,
     ) -> str:
         """
         Gets the HTML content of an NHentai gallery's main page,
@@ -24,14 +29,16 @@ class NHentaiSource:
             The aiohttp ClientSession to use for the request.
         gallery_num : int
             The gallery number of the Nhentai gallery. (e.g. 185217)
+        cache : HTTPCache | None, optional
+            Where to cache the page, if anywhere
 
         Returns
         -------
         str
             The HTML content of the page.
         """
-        async with session.get(f"{self.url}/g/{gallery_num}") as response:
-            return await response.text()
+        url = f"{self.url}/g/{gallery_num}"
+        return (await get_text(session, url, cache)).text
 
     def _get_search_url(
         self, query: str, pagenum: int, sort_order: NHentaiSortOrder
@@ -70,6 +77,7 @@ class NHentaiSource:
         query: str,
         pagenum: int,
         sort_order: NHentaiSortOrder,
+        cache: HTTPCache | None = None,
     ) -> str:
         """
         Gets the HTML content of an NHentai search page,
@@ -85,6 +93,8 @@ class NHentaiSource:
             The page number to go to
         sort_order : NHentaiSortOrder
             The sort order to use for the search results.
+        cache : HTTPCache | None, optional
+            Where to cache the page, if anywhere
 
         Returns
         -------
@@ -92,8 +102,7 @@ class NHentaiSource:
             The HTML content of the page.
         """
         search_url = self._get_search_url(query, pagenum, sort_order)
-        async with session.get(search_url) as response:
-            return await response.text()
+        return (await get_text(session, search_url, cache)).text
 
 
 @dataclass
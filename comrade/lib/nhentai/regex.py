@@ -20,3 +20,8 @@ IMAGES_URL_REGEX = re.compile(r"/\d+/(\d+)(?:t|\.)\.(jpg|png|gif)")
 # Regex for extracting tags from tag list (<a> tags inside <div> with class "tag-container")
 # e.g. <a href="/tag/sole-female/" class="tag tag-35762"> -> (sole-female)
 TAGS_REGEX = re.compile(r"/tag/([\w-]+)/")
+
+
+# Regex for extracting the page number from a search page link
+# e.g. <a href="/search/?q=english&page=1234" class="last"> -> 1234
+PAGE_NUMBER_REGEX = re.compile(r"page=(\d+)")
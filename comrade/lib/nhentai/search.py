@@ -1,32 +1,182 @@
+import asyncio
 from logging import getLogger
+from time import monotonic
+from typing import Awaitable, Callable, TypeVar
 
 import aiohttp
-import bs4
 
+from comrade.core.configuration import (
+    NHENTAI_HEDGE_DELAY,
+    NHENTAI_PARSE_POOL,
+    NHENTAI_PARSE_WORKERS,
+    NHENTAI_SOURCE_TIMEOUT,
+)
+from comrade.core.http_cache import HTTPCache
+from comrade.lib.concurrency import OffloadPool
+from comrade.lib.nhentai.health import SOURCE_HEALTH, SourceHealthTracker
 from comrade.lib.nhentai.page_parser import (
-    raise_for_gallery_soup,
-    raise_for_search_soup,
+    gallery_from_html,
+    search_page_from_html,
 )
-from comrade.lib.nhentai.proxies import NHentaiWebProxy
+from comrade.lib.nhentai.proxies import NHentaiSource, NHentaiWebProxy
 from comrade.lib.nhentai.sources import ORDERED_SOURCES
 from comrade.lib.nhentai.structures import (
     InvalidProxyError,
+    NHentaiGallery,
+    NHentaiSearchPage,
     NHentaiSortOrder,
-    NHentaiWebPage,
     PageParsingError,
 )
 
 logger = getLogger(__name__)
 
+_T = TypeVar("_T")
+
+# Pages are parsed and validated here, off the event loop
+PARSE_POOL = OffloadPool(NHENTAI_PARSE_POOL, NHENTAI_PARSE_WORKERS)
+
+
+async def race_sources(
+    sources: list[NHentaiSource],
+    fetch: Callable[[NHentaiSource], Awaitable[str]],
+    parse: Callable[[str, str], _T],
+    hedge_delay: float = NHENTAI_HEDGE_DELAY,
+    health: SourceHealthTracker = SOURCE_HEALTH,
+) -> _T:
+    """
+    Fetches a page from several sources using hedged requests.
+
+    Sources are first reordered by their recent health, so that the
+    fastest working source is preferred, and failing sources are left as
+    a last resort.
+
+    The preferred source is tried first; if it hasn't answered within
+    `hedge_delay` seconds, the next source is started as well, and so on.
+    A source which fails is replaced by the next one right away.
+    The first valid page wins, and the remaining requests are cancelled.
+
+    Parameters
+    ----------
+    sources : list[NHentaiSource]
+        The sources to try, in order of preference
+    fetch : Callable[[NHentaiSource], Awaitable[str]]
+        Retrieves the HTML of the page from a source
+    parse : Callable[[str, str], _T]
+        Validates and parses the page, given the source name and the HTML.
+        Raises InvalidProxyError or PageParsingError if the page is invalid;
+        any other error is treated as an InvalidProxyError.
+        Runs in PARSE_POOL, so it must be picklable (module-level) when
+        using a process pool.
+    hedge_delay : float, optional
+        Seconds to wait for a source before also starting the next one.
+        0 starts all sources at once; a negative value disables hedging,
+        so that sources are only tried one after another.
+    health : SourceHealthTracker, optional
+        Orders the sources, and records the outcome of each request
+
+    Returns
+    -------
+    _T
+        The parsed page from the first source to return a valid page
+
+    Raises
+    ------
+    InvalidProxyError
+        If every source failed, and none reported that the page is invalid.
+    PageParsingError
+        If every source failed, and at least one reported
+        that the page itself is invalid.
+    """
+
+    async def attempt(source: NHentaiSource) -> _T:
+        timeout = source.timeout or NHENTAI_SOURCE_TIMEOUT
+        start = monotonic()
+        try:
+            try:
+                html = await asyncio.wait_for(fetch(source), timeout)
+            except asyncio.TimeoutError:
+                raise InvalidProxyError(f"Timed out after {timeout}s")
+            except aiohttp.ClientError as e:
+                raise InvalidProxyError(f"Request failed: {e!r}")
+
+            try:
+                parsed = await PARSE_POOL.run(parse, source.name, html)
+            except (InvalidProxyError, PageParsingError):
+                raise
+            except Exception as e:
+                # A page the parser chokes on is this source's failure
+                raise InvalidProxyError(f"Could not parse page: {e!r}")
+        except (InvalidProxyError, PageParsingError) as e:
+            health.record_failure(source, e, monotonic() - start)
+            raise
+
+        # Requests cancelled because another source won are not recorded
+        health.record_success(source, monotonic() - start)
+        return parsed
+
+    sources = health.order(sources)
+
+    source_idxs = iter(range(len(sources)))
+    running: dict[asyncio.Task, int] = {}
+    errors: list[Exception] = []
+
+    def start_next_source():
+        if (idx := next(source_idxs, None)) is not None:
+            running[asyncio.create_task(attempt(sources[idx]))] = idx
 
-async def get_gallery_page(
+    start_next_source()
+
+    try:
+        while running:
+            done, _ = await asyncio.wait(
+                running,
+                timeout=hedge_delay if hedge_delay >= 0 else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            # The sources we're waiting on are slow; hedge with the next one
+            if not done:
+                start_next_source()
+                continue
+
+            pages = []
+            # Process in order of preference, in case several finished
+            for task in sorted(done, key=running.get):
+                source = sources[running.pop(task)]
+                try:
+                    pages.append(task.result())
+                except (InvalidProxyError, PageParsingError) as e:
+                    logger.warning(f"Proxy {source.name} failed: {e}")
+                    errors.append(e)
+                    start_next_source()
+                else:
+                    logger.debug(f"Proxy {source.name} succeeded")
+
+            if pages:
+                return pages[0]
+    finally:
+        for task in running:
+            task.cancel()
+
+    if not errors:
+        raise InvalidProxyError("No sources to try")
+
+    # A source saying the page doesn't exist is more
+    # informative than another source being blocked
+    raise next(
+        (e for e in errors if isinstance(e, PageParsingError)), errors[-1]
+    )
+
+
+async def get_gallery(
     gallery_num: int,
     http_session: aiohttp.ClientSession,
-) -> NHentaiWebPage:
+    http_cache: HTTPCache | None = None,
+) -> NHentaiGallery:
     """
-    Gets the HTML content of an NHentai gallery's main page.
+    Gets and parses an NHentai gallery's main page.
 
-    Cycles through the proxies in ORDERED_PROXIES until one works.
+    Races the proxies in ORDERED_SOURCES; see race_sources().
 
     Parameters
     ----------
@@ -34,12 +184,13 @@ async def get_gallery_page(
         The gallery number of the Nhentai gallery. (e.g. 185217)
     http_session : aiohttp.ClientSession
         The aiohttp ClientSession to use for the request.
+    http_cache : HTTPCache | None, optional
+        Where to cache the page, if anywhere
 
     Returns
     -------
-    NHentaiWebPage
-        NamedTuple containing the proxy used to access the page, and the BeautifulSoup
-        object representing the HTML content of the page.
+    NHentaiGallery
+        The gallery, including the proxy used to access it.
 
     Raises
     ------
@@ -48,42 +199,29 @@ async def get_gallery_page(
     PageParsingError
         If the gallery itself is invalid.
     """
-    exception_frame: Exception = None
-
     logger.info(f"Retrieving gallery page for {gallery_num}")
 
-    for proxy in ORDERED_SOURCES:
-        html = await proxy.retrieve_gallery_page(http_session, gallery_num)
-
-        soup = bs4.BeautifulSoup(
-            html, "lxml"
-        )  # lxml is faster than html.parser
-
-        try:
-            raise_for_gallery_soup(soup)
-        except (InvalidProxyError, PageParsingError) as e:
-            exception_frame = e
-
-            logger.warning(f"Proxy {proxy.name} failed: {e}")
-            continue
-        else:
-            logger.debug(f"Proxy {proxy.name} succeeded")
-            return NHentaiWebPage(proxy.name, soup)
-
-    raise exception_frame
+    return await race_sources(
+        ORDERED_SOURCES,
+        lambda proxy: proxy.retrieve_gallery_page(
+            http_session, gallery_num, http_cache
+        ),
+        gallery_from_html,
+    )
 
 
-async def get_search_page(
+async def get_search_results(
     search_query: str,
     pagenum: int,
     http_session: aiohttp.ClientSession,
     sort_order: NHentaiSortOrder,
-) -> NHentaiWebPage:
+    http_cache: HTTPCache | None = None,
+) -> NHentaiSearchPage:
     """
-    Gets the HTML content of the NHentai search page, given
+    Gets and parses a page of NHentai search results, given
     a search query.
 
-    Cycles through the proxies in ORDERED_PROXIES until one works.
+    Races the proxies in ORDERED_SOURCES; see race_sources().
 
     Parameters
     ----------
@@ -96,41 +234,31 @@ async def get_search_page(
         The aiohttp ClientSession to use for the request.
     sort_order : NHentaiSortOrder
         The sort order to use for the search page
+    http_cache : HTTPCache | None, optional
+        Where to cache the page, if anywhere
 
     Returns
     -------
-    NHentaiWebPage
-        NamedTuple containing the proxy used to access the page, and the BeautifulSoup
-        object representing the HTML content of the page.
+    NHentaiSearchPage
+        The search results on the page,
+        and the number of result pages for the query.
 
     Raises
     ------
-
+    InvalidProxyError
+        If the proxy itself is invalid.
+    PageParsingError
+        If the search page itself is invalid (e.g. no results).
     """
-    exception_frame: Exception = None
-
-    for proxy in ORDERED_SOURCES:
-        # Use only instances of NHentaiProxy
-        if not isinstance(proxy, NHentaiWebProxy):
-            continue
-
-        html = await proxy.retrieve_search_page(
-            http_session, search_query, pagenum, sort_order
-        )
-
-        soup = bs4.BeautifulSoup(
-            html, "lxml"
-        )  # lxml is faster than html.parser
-
-        try:
-            raise_for_search_soup(soup)
-        except (InvalidProxyError, PageParsingError) as e:
-            exception_frame = e
-
-            logger.warning(f"Proxy {proxy.name} failed: {e}")
-            continue
-        else:
-            logger.debug(f"Proxy {proxy.name} succeeded")
-            return NHentaiWebPage(proxy.name, soup)
+    # Use only instances of NHentaiProxy
+    proxies = [
+        proxy for proxy in ORDERED_SOURCES if isinstance(proxy, NHentaiWebProxy)
+    ]
 
-    raise exception_frame
+    return await race_sources(
+        proxies,
+        lambda proxy: proxy.retrieve_search_page(
+            http_session, search_query, pagenum, sort_order, http_cache
+        ),
+        search_page_from_html,
+    )
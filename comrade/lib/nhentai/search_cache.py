@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from comrade.core.configuration import NHENTAI_SEARCH_CACHE_SIZE
+from comrade.lib.caching import TTLCache
+from comrade.lib.nhentai.structures import (
+    NHentaiSearchPage,
+    NHentaiSortOrder,
+)
+
+# How long search results stay fresh, in seconds, by sort order;
+# recent uploads change constantly, all-time popularity barely at all
+SEARCH_CACHE_TTLS: dict[NHentaiSortOrder, float] = {
+    NHentaiSortOrder.RECENT: 60,
+    NHentaiSortOrder.POPULAR_TODAY: 10 * 60,
+    NHentaiSortOrder.POPULAR_WEEK: 60 * 60,
+    NHentaiSortOrder.POPULAR_ALL_TIME: 6 * 60 * 60,
+}
+
+SearchKey = tuple[str, int, NHentaiSortOrder]
+
+
+class SearchCache:
+    """
+    Cache of parsed search result pages, shared by all search sessions.
+
+    Pages are keyed by (query, page number, sort order), and expire
+    after a time depending on the sort order (see SEARCH_CACHE_TTLS).
+    Queries are normalized, so that e.g. "English " and "english"
+    share an entry.
+
+    Attributes
+    ----------
+    memory : TTLCache[SearchKey, NHentaiSearchPage]
+        The cached pages
+    ttls : dict[NHentaiSortOrder, float]
+        Time to live of pages, by sort order
+    """
+
+    def __init__(
+        self,
+        max_size: int = NHENTAI_SEARCH_CACHE_SIZE,
+        ttls: dict[NHentaiSortOrder, float] = SEARCH_CACHE_TTLS,
+    ):
+        self.ttls = ttls
+        self.memory = TTLCache(max_size, min(ttls.values()))
+
+    @staticmethod
+    def key(
+        query: str, page_num: int, sort_order: NHentaiSortOrder
+    ) -> SearchKey:
+        return " ".join(query.lower().split()), page_num, sort_order
+
+    def get(
+        self, query: str, page_num: int, sort_order: NHentaiSortOrder
+    ) -> NHentaiSearchPage | None:
+        """
+        Get a search page from the cache (if it exists, and hasn't expired)
+        """
+        return self.memory.get(self.key(query, page_num, sort_order))
+
+    def put(
+        self,
+        query: str,
+        page_num: int,
+        sort_order: NHentaiSortOrder,
+        page: NHentaiSearchPage,
+    ):
+        """
+        Add a freshly fetched search page to the cache.
+        """
+        self.memory.put(
+            self.key(query, page_num, sort_order),
+            page,
+            ttl=self.ttls[sort_order],
+        )
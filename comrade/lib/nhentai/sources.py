@@ -21,5 +21,3 @@ ORDERED_SOURCES: list[NHentaiSource] = [
     # ),
     # NHentaiSource("nhentai.net", "https://nhentai.net"),
 ]
-
-IMAGE_LINK_BASE = "https://i3.nhentai.net/galleries"
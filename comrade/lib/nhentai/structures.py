@@ -1,36 +1,109 @@
-from dataclasses import dataclass
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
 from enum import StrEnum
-from functools import cached_property
+from functools import cached_property, partial
+from itertools import count
+from time import monotonic
 from typing import NamedTuple
 
+import lxml.etree
+import lxml.html
 from bs4 import BeautifulSoup
 from interactions import Embed
 
 from comrade.lib.nhentai.text_filters import filter_title_text
 
+# Page turn timing, for adaptive prefetching
+MAX_TURN_INTERVAL = 300  # seconds
+TURN_INTERVAL_SMOOTHING = 0.3  # weight of the latest interval
+
+IMAGE_LINK_BASE = "https://i3.nhentai.net/galleries"
+COVER_LINK_BASE = "https://t.nhentai.net/galleries"
+
+# Image file extensions of gallery pages,
+# indexed by the codes stored in NHentaiGallery.page_extensions
+PAGE_EXTENSIONS = ("jpg", "png", "gif")
+_PAGE_EXTENSION_CODES = {ext: code for code, ext in enumerate(PAGE_EXTENSIONS)}
+
+# Session IDs, unlike id(), are never reused within a process
+_session_ids = count()
+
+
+def encode_page_extensions(extensions: Iterable[str]) -> bytes:
+    """
+    Encodes the image file extensions of a gallery's pages
+    (e.g. ["jpg", "jpg", "png"]) into NHentaiGallery.page_extensions.
+    """
+    return bytes(_PAGE_EXTENSION_CODES[ext] for ext in extensions)
+
+
+@dataclass
+class NHentaiWebPage:
+    """
+    HTML of a page retrieved from an NHentai source.
+
+    The page is only parsed when first needed, by whichever
+    parser backend is in use (see page_parser).
+
+    Attributes
+    ----------
+    provider : str
+        Name of the source the page was retrieved from
+    html : str
+        The HTML content of the page
+    """
 
-class NHentaiWebPage(NamedTuple):
     provider: str
-    soup: BeautifulSoup
+    html: str
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        return BeautifulSoup(self.html, "lxml")
+
+    @cached_property
+    def tree(self) -> lxml.html.HtmlElement:
+        try:
+            return lxml.html.document_fromstring(self.html)
+        except lxml.etree.ParserError:
+            # e.g. empty response; fails validation like any other bad page
+            return lxml.html.document_fromstring("<html></html>")
 
 
 @dataclass
 class NHentaiGallery:
+    """
+    A parsed NHentai gallery.
+
+    Page image URLs all look like IMAGE_LINK_BASE/{images_id}/{page}.{ext},
+    so only the extension of each page is stored (one byte per page), and
+    URLs are built when accessed, e.g. gallery[0] is the URL of page 1.
+    """
+
     gallery_id: int  # 6-digit gallery number
     title: str  # title of the gallery
     images_id: int  # separate from gallery_id, used for image requests
-    image_list: list[str]  # list of image URLs corresponding to each page
+    page_extensions: bytes  # extension code of each page, see PAGE_EXTENSIONS
     tags: list[str]  # list of tags
     provider: str  # provider used to find the gallery
 
     def __len__(self):
-        return len(self.image_list)
+        return len(self.page_extensions)
 
-    def __getitem__(self, idx):
-        return self.image_list[idx]
+    def __getitem__(self, idx: int | slice) -> str | list[str]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
 
-    def __iter__(self):
-        return iter(self.image_list)
+        if idx < 0:
+            idx += len(self)
+        # Indices below -len(self) are still negative here, and would
+        # wrap around in page_extensions instead of raising
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Page index {idx} out of range")
+        image_extension = PAGE_EXTENSIONS[self.page_extensions[idx]]
+        return f"{IMAGE_LINK_BASE}/{self.images_id}/{idx + 1}.{image_extension}"
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[idx] for idx in range(len(self)))
 
     @property
     def url(self) -> str:
@@ -38,8 +111,8 @@ class NHentaiGallery:
 
     @property
     def cover_url(self) -> str:
-        image_extension = self.image_list[0].split(".")[-1]
-        return f"https://t.nhentai.net/galleries/{self.images_id}/cover.{image_extension}"
+        image_extension = PAGE_EXTENSIONS[self.page_extensions[0]]
+        return f"{COVER_LINK_BASE}/{self.images_id}/cover.{image_extension}"
 
     @cached_property
     def short_title(self) -> str:
@@ -70,7 +143,6 @@ class NHentaiGallery:
 
 @dataclass
 class NHentaiGallerySession:
-
     """
     Per-channel session storage for nhentai commands,
     provided initialization from gallery number.
@@ -81,10 +153,42 @@ class NHentaiGallerySession:
         The gallery to use for the session.
     page_number : int
         The page number the session is on.
+    last_turn_time : float | None
+        Monotonic time at which the reader last turned a page.
+    turn_interval : float | None
+        Smoothed time between page turns, in seconds;
+        None until two turns have been recorded.
+    session_id : int
+        Unique ID of the session, e.g. to own its prefetch jobs.
     """
 
     gallery: NHentaiGallery
     current_page_number: int = 0
+    last_turn_time: float | None = None
+    turn_interval: float | None = None
+    session_id: int = field(default_factory=partial(next, _session_ids))
+
+    def record_page_turn(self, now: float | None = None):
+        """
+        Record that the reader turned a page, updating the
+        exponentially weighted average time between page turns.
+
+        Long breaks are capped at MAX_TURN_INTERVAL seconds,
+        so that stepping away doesn't skew the estimate for long.
+        """
+        if now is None:
+            now = monotonic()
+
+        if self.last_turn_time is not None:
+            interval = min(now - self.last_turn_time, MAX_TURN_INTERVAL)
+            if self.turn_interval is None:
+                self.turn_interval = interval
+            else:
+                self.turn_interval += TURN_INTERVAL_SMOOTHING * (
+                    interval - self.turn_interval
+                )
+
+        self.last_turn_time = now
 
     def is_valid_page_number(self, page: int) -> bool:
         """
@@ -218,6 +322,16 @@ class NHentaiSearchResult:
         )
 
 
+class NHentaiSearchPage(NamedTuple):
+    """
+    A parsed page of search results,
+    with the number of result pages for the query.
+    """
+
+    result: NHentaiSearchResult
+    maximum_pages: int
+
+
 class NHentaiSortOrder(StrEnum):
     RECENT = ""
     POPULAR_TODAY = "&sort=popular-today"
@@ -249,12 +363,15 @@ class NHentaiSearchSession:
         The maximum number of pages available in the query
     sort_order : NHentaiSortOrder
         The sort order of the search results.
+    session_id : int
+        Unique ID of the session, e.g. to own its prefetch jobs.
     """
 
     query: str
     results_pages: dict[int, NHentaiSearchResult]
     maximum_pages: int
     sort_order: NHentaiSortOrder
+    session_id: int = field(default_factory=partial(next, _session_ids))
 
 
 class InvalidProxyError(Exception):
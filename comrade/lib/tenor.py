@@ -1,9 +1,13 @@
 import aiohttp
 import bs4
 
+from comrade.core.http_cache import HTTPCache, get_text
+
 
 async def tenor_link_to_gif(
-    link: str, http_session: aiohttp.ClientSession
+    link: str,
+    http_session: aiohttp.ClientSession,
+    http_cache: HTTPCache | None = None,
 ) -> str:
     """
     Converts a Tenor link to a GIF link.
@@ -14,6 +18,8 @@ async def tenor_link_to_gif(
         The Tenor link to convert.
     http_session : aiohttp.ClientSession
         The aiohttp ClientSession to use for the request.
+    http_cache : HTTPCache | None, optional
+        Where to cache the page, if anywhere
 
     Returns
     -------
@@ -24,8 +30,7 @@ async def tenor_link_to_gif(
     if not link.startswith("https://tenor.com/view/"):
         raise ValueError("Link is not a Tenor link")
 
-    async with http_session.get(link) as response:
-        html = await response.text()
+    html = (await get_text(http_session, link, http_cache)).text
 
     soup = bs4.BeautifulSoup(html, "lxml")
 
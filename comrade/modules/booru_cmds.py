@@ -1,3 +1,6 @@
+import asyncio
+from logging import getLogger
+
 from interactions import (
     AutocompleteContext,
     Button,
@@ -17,17 +20,36 @@ from interactions.api.events import MessageCreate
 from interactions.ext.prefixed_commands import PrefixedContext
 
 from comrade.core.comrade_client import Comrade
+from comrade.core.configuration import (
+    BOORU_AUTOCOMPLETE_DEADLINE,
+    BOORU_AUTOCOMPLETE_DEBOUNCE,
+)
 from comrade.lib.booru_ext import (
     BOORUS,
+    BooruClient,
     BooruSession,
-    autocomplete_query,
+    complete_query,
+    fetch_tag_suggestions,
 )
+from comrade.lib.concurrency import Debouncer, Superseded
 from comrade.lib.discord_utils import ContextDict
 
+logger = getLogger(__name__)
+
+MAX_AUTOCOMPLETE_SUGGESTIONS = 10
+
 
 class Booru(Extension):
     bot: Comrade
     booru_sessions: ContextDict[BooruSession] = ContextDict()
+    # booru name -> client shared by every command, within rate limits
+    booru_clients: dict[str, BooruClient] = {
+        name: BooruClient(booru_class) for name, booru_class in BOORUS.items()
+    }
+    # user ID -> their latest tag lookup; older keystrokes are abandoned
+    autocomplete_debouncer: Debouncer[int, list[str]] = Debouncer(
+        BOORU_AUTOCOMPLETE_DEBOUNCE
+    )
 
     @slash_command(description="Gets a random image from a booru", nsfw=True)
     @slash_option(
@@ -67,14 +89,14 @@ class Booru(Extension):
         tags : str
             The tags to search for.
         """
-        booru_obj = BOORUS[booru_name](self.bot.http_session)
+        booru_client = self.booru_clients[booru_name]
 
         # Temporary workaround: sort override
         # If "order:" or "sort:" are in the tags, override the sort_random to be False
         if "order:" in tags or "sort:" in tags:
             sort_random = False
 
-        booru_session = BooruSession(booru_obj, tags, sort_random)
+        booru_session = BooruSession(booru_client, tags, sort_random)
 
         # Try to initialize the posts list
         if not await booru_session.init_posts(0):
@@ -96,22 +118,65 @@ class Booru(Extension):
         the booru's search bar.
 
         This is done by calling the booru's find_tags method, which returns a
-        list of tags that match the user's input.
+        list of tags that match the user's input. Its responses are cached,
+        so that Discord's 3 second deadline is met while the user keeps
+        typing, even when the booru is slow.
+
+        Only the latest keystroke of each user is looked up, once they
+        pause typing; lookups for older keystrokes are cancelled. Lookups
+        which can't make the deadline are answered from the cache, and
+        left to finish in the background, filling the cache.
         """
-        booru_obj = BOORUS[ctx.kwargs["booru_name"]](self.bot.http_session)
+        booru_client = self.booru_clients[ctx.kwargs["booru_name"]]
 
         query: str = ctx.kwargs["tags"]
 
-        if not hasattr(booru_obj, "find_tags"):
+        if not booru_client.supports_tag_search:
             return await ctx.send(
                 ["(This booru does not support tag autocomplete)"]
             )
-        elif not query:
+        elif not query.strip():
             return await ctx.send(["(Start typing to get tag suggestions)"])
 
-        query_autocompletes = await autocomplete_query(query, booru_obj)
+        # Autocomplete only on the most recent tag
+        most_recent_tag = query.split()[-1]
+        tag_cache = booru_client.tag_cache
+        user_id = ctx.author.id
 
-        await ctx.send(query_autocompletes)
+        tag_suggestions = tag_cache.get(
+            most_recent_tag, MAX_AUTOCOMPLETE_SUGGESTIONS
+        )
+        if tag_suggestions is not None:
+            # Answered locally; whatever the user typed before is moot
+            self.autocomplete_debouncer.cancel(user_id)
+        else:
+            try:
+                tag_suggestions = await self.autocomplete_debouncer.run(
+                    user_id,
+                    lambda: fetch_tag_suggestions(
+                        most_recent_tag, booru_client, tag_cache
+                    ),
+                    timeout=BOORU_AUTOCOMPLETE_DEADLINE,
+                )
+            except Superseded:
+                # Discord only shows the response to the latest keystroke
+                return
+            except Exception as e:
+                # Too slow (the lookup goes on in the background),
+                # or the booru failed: answer from the cache either way
+                if not isinstance(e, asyncio.TimeoutError):
+                    logger.warning(
+                        f"Tag lookup for {most_recent_tag!r} failed: {e!r}"
+                    )
+                tag_suggestions = tag_cache.best_effort(
+                    most_recent_tag, MAX_AUTOCOMPLETE_SUGGESTIONS
+                )
+
+        await ctx.send(
+            complete_query(
+                query, tag_suggestions[:MAX_AUTOCOMPLETE_SUGGESTIONS]
+            )
+        )
 
     async def handle_booru_next(
         self, ctx: PrefixedContext | ComponentContext, session: BooruSession
@@ -46,15 +46,15 @@ class EmoteSystem(Extension):
             # remove : :, as well as any spaces around the emote name
             parse_str = msg.content.strip(": ").lower()
             try:
-                emote = find_emote_v5(
+                emote = await find_emote_v5(
                     parse_str,
-                    self.bot.db.Emotes,
+                    self.bot.async_db.Emotes,
                     message_event.message.guild.id,
                 )
             except ValueError:
-                similar_emotes = find_similar_emotes(
+                similar_emotes = await find_similar_emotes(
                     parse_str,
-                    self.bot.db.Emotes,
+                    self.bot.async_db.Emotes,
                     message_event.message.guild.id,
                 )
                 embed = Embed(title="Emote not found.")
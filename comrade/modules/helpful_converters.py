@@ -19,7 +19,7 @@ class HelpfulConverters(Extension):
         """
         try:
             url = await tenor_link_to_gif(
-                ctx.target.content, self.bot.http_session
+                ctx.target.content, self.bot.http_session, self.bot.http_cache
             )
             embed = Embed(
                 title="Converted to a GIF URL!", description=f"`{url}`"
@@ -4,9 +4,18 @@ from interactions import (
 )
 
 from comrade.core.comrade_client import Comrade
+from comrade.core.configuration import (
+    NHENTAI_PREFETCH_PER_HOST,
+    NHENTAI_PREFETCH_WORKERS,
+)
+from comrade.lib.concurrency import PrefetchScheduler, SingleFlight
 from comrade.lib.discord_utils import ContextDict
+from comrade.lib.nhentai.gallery_cache import GalleryCache
+from comrade.lib.nhentai.search_cache import SearchCache, SearchKey
 from comrade.lib.nhentai.structures import (
+    NHentaiGallery,
     NHentaiGallerySession,
+    NHentaiSearchPage,
     NHentaiSearchSession,
 )
 
@@ -16,6 +25,19 @@ class NHBase:
     gallery_sessions: ContextDict[NHentaiGallerySession] = ContextDict()
     search_sessions: ContextDict[NHentaiSearchSession] = ContextDict()
 
+    # shared by all sessions, so that prefetching is globally bounded
+    prefetch_scheduler: PrefetchScheduler = PrefetchScheduler(
+        NHENTAI_PREFETCH_WORKERS, NHENTAI_PREFETCH_PER_HOST
+    )
+
+    # parsed galleries, shared across channels
+    gallery_cache: GalleryCache = GalleryCache()
+    gallery_fetches: SingleFlight[int, NHentaiGallery] = SingleFlight()
+
+    # parsed search result pages, shared across channels
+    search_cache: SearchCache = SearchCache()
+    search_fetches: SingleFlight[SearchKey, NHentaiSearchPage] = SingleFlight()
+
     def next_page_button(self, disabled: bool = False):
         """
         Button used to advance pages in an nhentai gallery.
@@ -1,7 +1,7 @@
+from functools import partial
 from logging import getLogger
 
-from aiohttp import ClientResponseError
-
+from comrade.lib.concurrency import PrefetchJob
 from comrade.lib.nhentai.structures import (
     NHentaiGallerySession,
 )
@@ -12,15 +12,20 @@ logger = getLogger(__name__)
 
 
 class NHCacher(NHBase):
-    async def preemptive_cache(
+    async def schedule_prefetch(
         self,
         session: NHentaiGallerySession,
         lookback: int = 0,
         lookahead: int = 0,
-    ) -> tuple[list[int], list[int]]:
+    ) -> tuple[dict[int, PrefetchJob], list[int]]:
         """
-        Preemptively caches the next few/previous pages of
-        the gallery session.
+        Queues the next few/previous pages of the gallery session
+        for caching on the prefetch scheduler, without waiting for them.
+
+        Pages closer to the current page are cached first, and pages ahead
+        of the reader take precedence over pages behind them at the same
+        distance. Jobs of this session for pages outside the new window are
+        cancelled, since the reader has moved on.
 
         Parameters
         ----------
@@ -31,55 +36,68 @@ class NHCacher(NHBase):
         lookahead: int
             The number of pages to cache after the current page
 
-        Notes
-        -----
-        Fails silently if the pages are already cached,
-        or if the page is not found.
-
         Returns
         -------
-        list[int]
-            List of page numbers that were newly cached.
+        dict[int, PrefetchJob]
+            Jobs caching each page which isn't cached yet, by page number.
         list[int]
             List of page numbers that were already cached.
 
         """
         curr_page_num = session.current_page_number
 
-        nums_cached = []
-        nums_loaded = []
-
-        pages_to_cache = range(
-            curr_page_num - lookback, curr_page_num + 1 + lookahead
+        pages_to_cache = [
+            page_num
+            for page_num in range(
+                curr_page_num - lookback, curr_page_num + 1 + lookahead
+            )
+            if session.is_valid_page_number(page_num)
+            and page_num != curr_page_num
+        ]
+
+        # Pages the reader has moved away from are no longer worth caching
+        self.prefetch_scheduler.cancel(session.session_id, keep=pages_to_cache)
+
+        # check which pages are already cached, all at once
+        blob_urls = await self.bot.relay.find_blobs_by_urls(
+            session.page_url(page_num) for page_num in pages_to_cache
         )
 
-        for page_num in pages_to_cache:
-            if (
-                not session.is_valid_page_number(page_num)
-                or page_num == curr_page_num
-            ):
-                continue
+        jobs = {}
+        nums_loaded = []
 
+        for page_num in pages_to_cache:
             page_url = session.page_url(page_num)
-            page_filename = session.page_filename(page_num)
 
-            # check if the page is already cached
-            if await self.bot.relay.find_blob_by_url(page_url):
+            if blob_urls[page_url] is not None:
                 nums_loaded.append(page_num)
                 continue
 
-            # otherwise, cache it
-            try:
-                await self.bot.relay.create_blob_from_url(
-                    source_url=page_url, filename=page_filename
-                )
-
-                nums_cached.append(page_num)
-            except ClientResponseError:
-                logger.warning(
-                    f"Could not cache {page_url}"
-                    f"for gallery {session.gallery.gallery_id}"
-                )
-                pass
-
-        return nums_cached, nums_loaded
+            distance = page_num - curr_page_num
+            priority = distance if distance > 0 else -distance + 0.5
+
+            jobs[page_num] = self.prefetch_scheduler.submit(
+                session.session_id,
+                page_num,
+                page_url,
+                partial(
+                    self.bot.relay.create_blob_from_url,
+                    source_url=page_url,
+                    filename=session.page_filename(page_num),
+                ),
+                priority,
+            )
+
+        return jobs, nums_loaded
+
+    def cancel_prefetch(self, session: NHentaiGallerySession) -> int:
+        """
+        Cancels all pending prefetching for a gallery session,
+        e.g. when the session ends.
+
+        Returns
+        -------
+        int
+            The number of jobs cancelled
+        """
+        return self.prefetch_scheduler.cancel(session.session_id)
@@ -1,8 +1,16 @@
 from interactions import Extension
 
 from .gallery_cmds import NHGalleryHandler
+from .health_cmds import NHHealthHandler
+from .mirror_cmds import NHMirrorHandler
 from .search_cmds import NHSearchHandler
 
 
-class NHentai(Extension, NHSearchHandler, NHGalleryHandler):
+class NHentai(
+    Extension,
+    NHSearchHandler,
+    NHGalleryHandler,
+    NHMirrorHandler,
+    NHHealthHandler,
+):
     pass
@@ -1,15 +1,13 @@
-import asyncio
-
 from interactions import (
     SlashContext,
 )
 
-from comrade.lib.nhentai.page_parser import (
-    parse_gallery_from_page,
-)
-from comrade.lib.nhentai.search import get_gallery_page
+from comrade.core.configuration import NHENTAI_GALLERY_CACHE_MONGO
+from comrade.lib.nhentai.mirror import MirrorProgress, MirrorStatus
+from comrade.lib.nhentai.search import get_gallery
 from comrade.lib.nhentai.structures import (
     InvalidProxyError,
+    NHentaiGallery,
     NHentaiGallerySession,
     PageParsingError,
 )
@@ -18,6 +16,53 @@ from .cacher import NHCacher
 
 
 class NHGalleryInit(NHCacher):
+    async def fetch_gallery(self, gallery_id: int) -> NHentaiGallery:
+        """
+        Get a gallery from the gallery cache, or fetch and parse it.
+
+        Galleries fully mirrored by `/nhentai mirror` are read from their
+        mirror job, without fetching anything from the source site.
+
+        Concurrent requests for the same gallery share a single fetch.
+
+        Parameters
+        ----------
+        gallery_id: int
+            The gallery ID, aka the 6 digits
+
+        Raises
+        ------
+        InvalidProxyError
+            If no source returned a valid response.
+        PageParsingError
+            If the gallery does not exist.
+        """
+        if (
+            NHENTAI_GALLERY_CACHE_MONGO
+            and self.gallery_cache.collection is None
+        ):
+            self.gallery_cache.collection = self.bot.async_db.nhentaiGalleries
+
+        if (gallery := await self.gallery_cache.get(gallery_id)) is not None:
+            return gallery
+
+        async def fetch() -> NHentaiGallery:
+            mirror_doc = await self.bot.async_db.nhentaiMirrors.find_one(
+                {"_id": gallery_id, "status": MirrorStatus.DONE}
+            )
+            if mirror_doc is not None and (
+                progress := MirrorProgress.from_document(mirror_doc)
+            ):
+                gallery = progress.gallery
+            else:
+                gallery = await get_gallery(
+                    gallery_id, self.bot.http_session, self.bot.http_cache
+                )
+            await self.gallery_cache.put(gallery)
+            return gallery
+
+        return await self.gallery_fetches.run(gallery_id, fetch)
+
     async def init_gallery_session(
         self,
         ctx: SlashContext,
@@ -34,7 +79,7 @@ class NHGalleryInit(NHCacher):
             The gallery ID, aka the 6 digits
         """
         try:
-            page = await get_gallery_page(gallery_id, self.bot.http_session)
+            nh_gallery = await self.fetch_gallery(gallery_id)
         except InvalidProxyError:
             return await ctx.send(
                 "No NHentai proxies returned a valid response (bot was defeated by anti-bot mechanisms)"
@@ -42,11 +87,16 @@ class NHGalleryInit(NHCacher):
         except PageParsingError:
             return await ctx.send(f"Gallery `{gallery_id}` was not found.")
 
-        nh_gallery = parse_gallery_from_page(page)
+        # The previous session in this context (if any) is being replaced
+        if old_session := self.gallery_sessions.get(ctx):
+            self.cancel_prefetch(old_session)
 
         session = NHentaiGallerySession(nh_gallery)
         self.gallery_sessions[ctx] = session
 
+        # Time to the first page turn counts towards the reading pace
+        session.record_page_turn()
+
         await ctx.send(
             embed=nh_gallery.start_embed,
             content="Type `np` (or click the buttons) to"
@@ -57,5 +107,6 @@ class NHGalleryInit(NHCacher):
             ],
         )
 
-        # preemptively cache the next few pages (nonblocking)
-        asyncio.create_task(self.preemptive_cache(session, lookahead=3))
+        # queue the next few pages for caching; only the lookup of which
+        # pages are already cached is awaited, after the reply is sent
+        await self.schedule_prefetch(session, lookahead=3)
@@ -0,0 +1,32 @@
+from interactions import Embed, SlashContext, slash_command
+
+from comrade.core.configuration import ACCENT_COLOUR
+from comrade.lib.nhentai.health import SOURCE_HEALTH
+from comrade.lib.nhentai.sources import ORDERED_SOURCES
+
+from .base import NHBase
+
+
+class NHHealthHandler(NHBase):
+    @slash_command(
+        name="nhentai",
+        description="NHentai viewer",
+        sub_cmd_name="health",
+        sub_cmd_description="Show how well each NHentai source is working",
+        nsfw=True,
+    )
+    async def nhentai_health(self, ctx: SlashContext):
+        embed = Embed(
+            title="NHentai Source Health",
+            description="Sources are listed in the order they are tried",
+            color=ACCENT_COLOUR,
+        )
+
+        for source in SOURCE_HEALTH.order(ORDERED_SOURCES):
+            embed.add_field(
+                name=source.name,
+                value=SOURCE_HEALTH[source].summary,
+                inline=False,
+            )
+
+        await ctx.send(embed=embed)
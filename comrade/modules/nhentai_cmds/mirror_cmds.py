@@ -0,0 +1,287 @@
+import asyncio
+from functools import partial
+from logging import getLogger
+from time import perf_counter
+
+from interactions import (
+    Embed,
+    OptionType,
+    SlashContext,
+    check,
+    is_owner,
+    listen,
+    slash_command,
+    slash_option,
+)
+
+from comrade.core.async_db import AsyncCollection
+from comrade.core.configuration import (
+    ACCENT_COLOUR,
+    NHENTAI_MIRROR_CONCURRENCY,
+    NHENTAI_MIRROR_SAVE_INTERVAL,
+)
+from comrade.lib.nhentai.mirror import MirrorProgress, MirrorStatus
+from comrade.lib.nhentai.structures import (
+    InvalidProxyError,
+    NHentaiGallerySession,
+    PageParsingError,
+)
+
+from .gallery_init import NHGalleryInit
+
+logger = getLogger(__name__)
+
+
+class NHMirrorHandler(NHGalleryInit):
+    # gallery ID -> progress of the mirror job running for that gallery
+    mirror_jobs: dict[int, MirrorProgress] = {}
+
+    # keeps running jobs from being garbage collected
+    mirror_tasks: set[asyncio.Task] = set()
+
+    # on_ready fires again on every reconnect
+    mirror_jobs_resumed: bool = False
+
+    @property
+    def mirror_collection(self) -> AsyncCollection:
+        return self.bot.async_db.nhentaiMirrors
+
+    async def save_mirror_progress(self, progress: MirrorProgress):
+        await self.mirror_collection.update_one(
+            {"_id": progress.gallery_id},
+            {"$set": progress.to_document()},
+            upsert=True,
+        )
+
+    def start_mirror(self, progress: MirrorProgress) -> bool:
+        """
+        Start mirroring a gallery in the background.
+
+        Returns False if the gallery is already being mirrored.
+        """
+        if progress.gallery_id in self.mirror_jobs:
+            return False
+
+        self.mirror_jobs[progress.gallery_id] = progress
+        task = asyncio.create_task(self.mirror_gallery(progress))
+        self.mirror_tasks.add(task)
+        task.add_done_callback(partial(self.mirror_done, progress))
+        return True
+
+    def mirror_done(self, progress: MirrorProgress, task: asyncio.Task):
+        """
+        Done callback of a mirror job's task. A job which crashed
+        is logged, and marked as failed so that it isn't left
+        running in MongoDB.
+        """
+        self.mirror_tasks.discard(task)
+        if task.cancelled() or (e := task.exception()) is None:
+            return
+
+        logger.error(
+            f"Mirror job for gallery {progress.gallery_id} crashed",
+            exc_info=e,
+        )
+        progress.status = MirrorStatus.FAILED
+        save = asyncio.create_task(self.save_mirror_progress(progress))
+        self.mirror_tasks.add(save)
+        save.add_done_callback(self.mirror_tasks.discard)
+
+    async def mirror_gallery(self, progress: MirrorProgress) -> MirrorProgress:
+        """
+        Mirrors every page of a gallery to the relay, which isn't
+        mirrored already, saving progress to MongoDB as it goes.
+
+        At most NHENTAI_MIRROR_CONCURRENCY pages are downloaded at once.
+        Uploads are not urgent, so the relay batches them into
+        multi-attachment messages (see BlobUploadBatcher), and they
+        never delay pages that readers are waiting on.
+
+        Parameters
+        ----------
+        progress: MirrorProgress
+            The job to run; either a new one,
+            or one that was interrupted by a restart
+
+        Returns
+        -------
+        MirrorProgress
+            The progress of the job, once finished
+        """
+        session = NHentaiGallerySession(progress.gallery)
+        page_urls = {
+            page_num: session.page_url(page_num)
+            for page_num in range(1, progress.total_pages + 1)
+        }
+
+        try:
+            # Pages mirrored before a restart (or by readers) are skipped
+            blob_urls = await self.bot.relay.find_blobs_by_urls(
+                page_urls.values()
+            )
+            pending = [
+                page_num
+                for page_num, page_url in page_urls.items()
+                if blob_urls[page_url] is None
+            ]
+
+            progress.status = MirrorStatus.RUNNING
+            progress.mirrored_pages = progress.total_pages - len(pending)
+            progress.failed_pages = []
+            await self.save_mirror_progress(progress)
+
+            semaphore = asyncio.Semaphore(NHENTAI_MIRROR_CONCURRENCY)
+            elapsed_before = progress.elapsed
+            resumed_at = last_save = perf_counter()
+
+            async def mirror_page(page_num: int):
+                nonlocal last_save
+
+                async with semaphore:
+                    try:
+                        await self.bot.relay.create_blob_from_url(
+                            page_urls[page_num],
+                            filename=session.page_filename(page_num),
+                        )
+                    except Exception:
+                        logger.warning(
+                            f"Could not mirror page {page_num}"
+                            f" of gallery {progress.gallery_id}",
+                            exc_info=True,
+                        )
+                        progress.failed_pages.append(page_num)
+                        return
+
+                progress.mirrored_pages += 1
+                progress.uploaded_pages += 1
+
+                now = perf_counter()
+                progress.elapsed = elapsed_before + now - resumed_at
+                if now - last_save >= NHENTAI_MIRROR_SAVE_INTERVAL:
+                    last_save = now
+                    await self.save_mirror_progress(progress)
+
+            await asyncio.gather(
+                *(mirror_page(page_num) for page_num in pending)
+            )
+
+            progress.elapsed = elapsed_before + perf_counter() - resumed_at
+            progress.failed_pages.sort()
+            progress.status = (
+                MirrorStatus.FAILED
+                if progress.failed_pages
+                else MirrorStatus.DONE
+            )
+            await self.save_mirror_progress(progress)
+
+            logger.info(
+                f"Mirrored gallery {progress.gallery_id}: {progress.summary}"
+            )
+            return progress
+        finally:
+            self.mirror_jobs.pop(progress.gallery_id, None)
+
+    @listen("on_ready")
+    async def resume_mirror_jobs(self):
+        """
+        Resume mirror jobs that were interrupted by a restart,
+        once the relay is ready.
+        """
+        if self.mirror_jobs_resumed:
+            return
+        self.mirror_jobs_resumed = True
+
+        await self.bot.relay_ready.wait()
+        docs = await self.mirror_collection.find(
+            {"status": MirrorStatus.RUNNING}
+        )
+
+        resumed = sum(
+            self.start_mirror(progress)
+            for doc in docs
+            # Jobs saved by an older version can't be resumed
+            if (progress := MirrorProgress.from_document(doc)) is not None
+        )
+        if resumed:
+            logger.info(f"Resumed {resumed} nhentai mirror jobs.")
+
+    @slash_command(
+        name="nhentai",
+        description="NHentai viewer",
+        sub_cmd_name="mirror",
+        sub_cmd_description="Mirror every page of a gallery in the background",
+        nsfw=True,
+    )
+    @slash_option(
+        name="gallery_id",
+        description="Gallery number, aka the 6 digits",
+        required=True,
+        opt_type=OptionType.INTEGER,
+    )
+    @check(is_owner())
+    async def nhentai_mirror(self, ctx: SlashContext, gallery_id: int):
+        """
+        Mirror every page of a gallery to the relay, so that
+        reading it never has to wait on the source site.
+
+        Parameters
+        ----------
+        gallery_id: int
+            The gallery ID, aka the 6 digits
+        """
+        if progress := self.mirror_jobs.get(gallery_id):
+            return await ctx.send(
+                f"Gallery `{gallery_id}` is already being mirrored"
+                f" ({progress.summary})."
+            )
+
+        try:
+            gallery = await self.fetch_gallery(gallery_id)
+        except InvalidProxyError:
+            return await ctx.send(
+                "No NHentai proxies returned a valid response (bot was defeated by anti-bot mechanisms)"
+            )
+        except PageParsingError:
+            return await ctx.send(f"Gallery `{gallery_id}` was not found.")
+
+        self.start_mirror(MirrorProgress(gallery))
+
+        await ctx.send(
+            f"Mirroring {len(gallery)} pages of gallery `{gallery_id}`"
+            " in the background; use `/nhentai mirrors` to check progress."
+        )
+
+    @slash_command(
+        name="nhentai",
+        description="NHentai viewer",
+        sub_cmd_name="mirrors",
+        sub_cmd_description="Show the progress of recent mirror jobs",
+        nsfw=True,
+    )
+    async def nhentai_mirrors(self, ctx: SlashContext):
+        docs = await self.mirror_collection.find(
+            {}, sort=[("started_at", -1)], limit=10
+        )
+
+        embed = Embed(
+            title="NHentai Mirror Jobs",
+            description="Most recently started first",
+            color=ACCENT_COLOUR,
+        )
+
+        for doc in docs:
+            if (progress := MirrorProgress.from_document(doc)) is None:
+                continue
+            # Saved progress lags behind running jobs
+            progress = self.mirror_jobs.get(progress.gallery_id, progress)
+
+            embed.add_field(
+                name=f"{progress.gallery_id}: {progress.gallery.short_title}",
+                value=progress.summary,
+                inline=False,
+            )
+
+        if not docs:
+            embed.description = "No galleries have been mirrored yet."
+
+        await ctx.send(embed=embed)
@@ -1,6 +1,6 @@
-import asyncio
 from collections import deque
 from enum import Enum
+from math import ceil
 from time import perf_counter
 
 from interactions import (
@@ -9,6 +9,7 @@ from interactions import (
 )
 from interactions.ext.prefixed_commands import PrefixedContext
 
+from comrade.core.configuration import NHENTAI_PREFETCH_MAX_DEPTH
 from comrade.lib.nhentai.structures import (
     NHentaiGallerySession,
 )
@@ -28,10 +29,56 @@ class PrefetchStrategy(Enum):
     BOTH = "both"
 
 
+# Prefetch depth used before a reader's pace is known
+DEFAULT_PREFETCH_DEPTH = 2
+
+# Assumed time to upload an uncached page, before any are measured
+DEFAULT_UPLOAD_LATENCY = 2.0
+
+
 class NHPageHandler(NHGalleryInit):
     # store the last 100 page response times
     page_response_times: deque[float] = deque(maxlen=100)
 
+    def upload_latency(self) -> float:
+        """
+        Estimated time to serve a page which isn't cached yet, in seconds.
+
+        Most pages are served from the cache, so the 90th percentile
+        of recent page response times is used as the estimate.
+        """
+        if not self.page_response_times:
+            return DEFAULT_UPLOAD_LATENCY
+
+        times = sorted(self.page_response_times)
+        return times[int(0.9 * (len(times) - 1))]
+
+    def prefetch_depth(self, session: NHentaiGallerySession) -> int:
+        """
+        Number of pages to prefetch in the reading direction,
+        adapted to how fast the reader turns pages.
+
+        Enough pages are prefetched that each one has time to upload
+        before the reader reaches it: fast readers get deeper prefetching,
+        while slow readers only get the next page, to avoid wasted uploads.
+
+        Parameters
+        ----------
+        session: NHentaiGallerySession
+            The gallery session
+
+        Returns
+        -------
+        int
+            Between 1 and NHENTAI_PREFETCH_MAX_DEPTH
+        """
+        if session.turn_interval is None:
+            return DEFAULT_PREFETCH_DEPTH
+
+        # Pages the reader gets through while one page uploads
+        depth = ceil(self.upload_latency() / max(session.turn_interval, 0.1))
+        return max(1, min(depth, NHENTAI_PREFETCH_MAX_DEPTH))
+
     async def send_current_gallery_page(
         self,
         ctx: PrefixedContext | ComponentContext,
@@ -63,6 +110,7 @@ class NHPageHandler(NHGalleryInit):
             doc = await self.bot.relay.create_blob_from_url(
                 session.current_page_url,
                 filename=session.current_page_filename,
+                urgent=True,
             )
             blob_url = doc["blob_url"]
 
@@ -81,14 +129,16 @@ class NHPageHandler(NHGalleryInit):
         end_time = perf_counter()
         self.page_response_times.append(end_time - start_time)
 
-        # Cache images
+        # Queue images for caching; only the lookup of which pages
+        # are already cached is awaited, after the reply is sent
+        depth = self.prefetch_depth(session)
         if prefetch_strategy == PrefetchStrategy.LOOKAHEAD:
-            asyncio.create_task(self.preemptive_cache(session, lookahead=2))
+            await self.schedule_prefetch(session, lookahead=depth)
         elif prefetch_strategy == PrefetchStrategy.LOOKBACK:
-            asyncio.create_task(self.preemptive_cache(session, lookback=2))
+            await self.schedule_prefetch(session, lookback=depth)
         elif prefetch_strategy == PrefetchStrategy.BOTH:
-            asyncio.create_task(
-                self.preemptive_cache(session, lookback=2, lookahead=2)
+            await self.schedule_prefetch(
+                session, lookback=depth, lookahead=depth
             )
 
     async def handle_nhentai_change_page(
@@ -118,9 +168,11 @@ class NHPageHandler(NHGalleryInit):
             # Check if there are more pages
             if not session.advance_page():
                 await ctx.send("You have reached the end of this work.")
+                self.cancel_prefetch(session)
                 del self.gallery_sessions[ctx]
                 return
 
+            session.record_page_turn()
             await self.send_current_gallery_page(
                 ctx, session, prefetch_strategy=PrefetchStrategy.LOOKAHEAD
             )
@@ -129,6 +181,7 @@ class NHPageHandler(NHGalleryInit):
                 await ctx.send("You are at the beginning of this work.")
                 return
 
+            session.record_page_turn()
             await self.send_current_gallery_page(
                 ctx, session, prefetch_strategy=PrefetchStrategy.LOOKBACK
             )
@@ -1,4 +1,5 @@
 import re
+from functools import cached_property, partial
 from typing import Awaitable, Callable
 
 from interactions import (
@@ -6,23 +7,25 @@ from interactions import (
     ActionRow,
     ComponentContext,
     OptionType,
+    Permissions,
     SlashCommandChoice,
     SlashContext,
     StringSelectMenu,
     StringSelectOption,
     component_callback,
     slash_command,
+    slash_default_member_permission,
     slash_option,
 )
 
+from comrade.core.configuration import NHENTAI_SEARCH_PREFETCH_COUNT
 from comrade.lib.discord_utils import DynamicPaginator, context_id
-from comrade.lib.nhentai.page_parser import (
-    parse_maximum_search_pages,
-    parse_search_result_from_page,
-)
-from comrade.lib.nhentai.search import get_search_page
+from comrade.lib.nhentai.search import get_search_results
 from comrade.lib.nhentai.structures import (
     InvalidProxyError,
+    NHentaiGallerySession,
+    NHentaiSearchPage,
+    NHentaiSearchResult,
     NHentaiSearchSession,
     NHentaiSortOrder,
     PageParsingError,
@@ -31,8 +34,142 @@ from comrade.lib.text_utils import text_safe_length
 
 from .gallery_init import NHGalleryInit
 
+# Search prefetches are queued behind page prefetches for readers
+SEARCH_PREFETCH_PRIORITY = 1000
+
 
 class NHSearchHandler(NHGalleryInit):
+    @cached_property
+    def search_prefetch_settings(self) -> dict[int, bool]:
+        """
+        guild ID -> whether search results are prefetched in that guild
+        """
+        return {}
+
+    async def fetch_search_page(
+        self,
+        query: str,
+        page_num: int,
+        sort_order: NHentaiSortOrder,
+    ) -> NHentaiSearchPage:
+        """
+        Get a search results page from the search cache,
+        or fetch and parse it.
+
+        Concurrent requests for the same page share a single fetch.
+
+        Parameters
+        ----------
+        query: str
+            The search query
+        page_num: int
+            The page of search results, starting from 1
+        sort_order: NHentaiSortOrder
+            The sort order of the search results
+
+        Raises
+        ------
+        InvalidProxyError
+            If no source returned a valid response.
+        PageParsingError
+            If the search has no results.
+        """
+        if (
+            cached := self.search_cache.get(query, page_num, sort_order)
+        ) is not None:
+            return cached
+
+        async def fetch() -> NHentaiSearchPage:
+            page = await get_search_results(
+                query,
+                page_num,
+                self.bot.http_session,
+                sort_order,
+                self.bot.http_cache,
+            )
+            self.search_cache.put(query, page_num, sort_order, page)
+            return page
+
+        return await self.search_fetches.run(
+            self.search_cache.key(query, page_num, sort_order), fetch
+        )
+
+    async def search_prefetch_enabled(self, guild_id: int | None) -> bool:
+        """
+        Whether search results should be prefetched in a guild
+        (always, in DMs), as set by `/nhentai prefetch`.
+        """
+        if NHENTAI_SEARCH_PREFETCH_COUNT <= 0:
+            return False
+        if guild_id is None:
+            return True
+
+        if (enabled := self.search_prefetch_settings.get(guild_id)) is None:
+            doc = await self.bot.async_db.nhentaiSettings.find_one(
+                {"_id": guild_id}
+            )
+            enabled = doc is None or doc.get("search_prefetch", True)
+            self.search_prefetch_settings[guild_id] = enabled
+
+        return enabled
+
+    async def prefetch_gallery_start(self, gallery_id: int):
+        """
+        Fetch a gallery, and mirror its first page, so that
+        opening it (and turning to the first page) is instant.
+        """
+        gallery = await self.fetch_gallery(gallery_id)
+
+        session = NHentaiGallerySession(gallery)
+        if await self.bot.relay.find_blob_by_url(session.page_url(1)) is None:
+            await self.bot.relay.create_blob_from_url(
+                session.page_url(1), filename=session.page_filename(1)
+            )
+
+    def schedule_search_prefetch(
+        self,
+        search_session: NHentaiSearchSession,
+        search_result: NHentaiSearchResult,
+    ) -> int:
+        """
+        Queues the top NHENTAI_SEARCH_PREFETCH_COUNT results of a search
+        page on the prefetch scheduler, without waiting for them.
+
+        Jobs run at a lower priority than prefetching pages for readers.
+        They are counted against the host of the gallery pages
+        (nhentai.net), so at most NHENTAI_PREFETCH_PER_HOST of them
+        run at once. Jobs for results on other pages of the same
+        search are cancelled, since the user has moved on.
+
+        Parameters
+        ----------
+        search_session: NHentaiSearchSession
+            The search session
+        search_result: NHentaiSearchResult
+            The page of results being shown
+
+        Returns
+        -------
+        int
+            The number of galleries queued
+        """
+        gallery_ids = search_result.gallery_ids[:NHENTAI_SEARCH_PREFETCH_COUNT]
+        self.prefetch_scheduler.cancel(
+            search_session.session_id, keep=gallery_ids
+        )
+
+        for rank, gallery_id in enumerate(gallery_ids):
+            self.prefetch_scheduler.submit(
+                search_session.session_id,
+                gallery_id,
+                f"https://nhentai.net/g/{gallery_id}/",
+                partial(self.prefetch_gallery_start, gallery_id),
+                # Users usually pick one of the top results
+                SEARCH_PREFETCH_PRIORITY + rank,
+            )
+
+        return len(gallery_ids)
+
     @slash_command(
         name="nhentai",
         description="NHentai viewer",
@@ -65,8 +202,8 @@ class NHSearchHandler(NHGalleryInit):
         await ctx.defer()  # manually defer, to avoid auto-defer causing issues
 
         try:
-            page = await get_search_page(
-                query, 1, self.bot.http_session, sort_order
+            nh_search_result, maximum_num_pages = await self.fetch_search_page(
+                query, 1, sort_order
             )
         except InvalidProxyError:
             return await ctx.send(
@@ -75,10 +212,6 @@ class NHSearchHandler(NHGalleryInit):
         except PageParsingError:
             return await ctx.send(f"No results found for query `{query}`.")
 
-        nh_search_result = parse_search_result_from_page(page)
-
-        maximum_num_pages = parse_maximum_search_pages(page)
-
         nh_search_session = NHentaiSearchSession(
             query,
             {1: nh_search_result},
@@ -86,10 +219,16 @@ class NHSearchHandler(NHGalleryInit):
             sort_order,
         )
 
+        # The previous session in this context (if any) is being replaced
+        if old_session := self.search_sessions.get(ctx):
+            self.prefetch_scheduler.cancel(old_session.session_id)
+
         self.search_sessions[ctx] = nh_search_session
 
         callback = self.selector_menu_callback(
-            nh_search_session, context_id(ctx)
+            nh_search_session,
+            context_id(ctx),
+            prefetch=await self.search_prefetch_enabled(ctx.guild_id),
         )
 
         paginator = DynamicPaginator(
@@ -98,6 +237,46 @@ class NHSearchHandler(NHGalleryInit):
 
         await paginator.send(ctx)
 
+    @slash_command(
+        name="nhentai",
+        description="NHentai viewer",
+        sub_cmd_name="prefetch",
+        sub_cmd_description="Turn prefetching of search results on or off in this server",
+        nsfw=True,
+        dm_permission=False,
+    )
+    @slash_option(
+        name="enabled",
+        description="Whether to prefetch the top results of searches",
+        required=True,
+        opt_type=OptionType.BOOLEAN,
+    )
+    @slash_default_member_permission(Permissions.MANAGE_GUILD)
+    async def nhentai_prefetch(self, ctx: SlashContext, enabled: bool):
+        """
+        Turn prefetching of search results on or off in a guild.
+
+        Parameters
+        ----------
+        enabled: bool
+            Whether to prefetch the top results of searches
+        """
+        await self.bot.async_db.nhentaiSettings.update_one(
+            {"_id": ctx.guild_id},
+            {"$set": {"search_prefetch": enabled}},
+            upsert=True,
+        )
+        self.search_prefetch_settings[ctx.guild_id] = enabled
+
+        await ctx.send(
+            (
+                "Search results will be prefetched in this server."
+                if enabled
+                else "Search results will no longer be prefetched in this server."
+            ),
+            ephemeral=True,
+        )
+
     @component_callback(re.compile(r"nhentai_search:(\d+)"))
     async def nhentai_search_callback(self, ctx: ComponentContext):
         """
@@ -114,6 +293,7 @@ class NHSearchHandler(NHGalleryInit):
         self,
         search_session: NHentaiSearchSession,
         context_id: int,
+        prefetch: bool = False,
     ) -> Callable[[int], Awaitable[tuple[list[ActionRow], str]]]:
         """
         Returns a callback used inside the DynamicPaginator
@@ -127,6 +307,9 @@ class NHSearchHandler(NHGalleryInit):
         context_id: int
             The channel ID of the search session (either guild or DM)
 
+        prefetch: bool
+            Whether to prefetch the top results of each page shown
+
         Returns
         -------
         Callable[[int], Awaitable[tuple[list[ActionRow], str]]]
@@ -139,18 +322,17 @@ class NHSearchHandler(NHGalleryInit):
             """
             Gets the components and content for the search menu.
 
-            Assumes that the page has not been requested before.
+            Pages requested recently (by any session) come from the cache.
             """
             # Get the page
-            page = await get_search_page(
-                search_session.query,
-                page_num,
-                self.bot.http_session,
-                search_session.sort_order,
+            nh_search_result, _ = await self.fetch_search_page(
+                search_session.query, page_num, search_session.sort_order
             )
-            nh_search_result = parse_search_result_from_page(page)
             search_session.results_pages[page_num] = nh_search_result
 
+            if prefetch:
+                self.schedule_search_prefetch(search_session, nh_search_result)
+
             # Create components
             # Each entry in the selector menu will look like:
             # 1. (123456) Title
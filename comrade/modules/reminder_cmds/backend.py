@@ -28,7 +28,7 @@ class RemindersBackend:
     bot: Comrade
     reminder_tasks: dict[ObjectId, Task] = {}  # reminder ID -> task
 
-    def clean_up_reminder(self, reminder: Reminder):
+    async def clean_up_reminder(self, reminder: Reminder):
         """
         Clean up a reminder after it has been sent, or
         requested to be deleted.
@@ -40,7 +40,7 @@ class RemindersBackend:
             del self.reminder_tasks[reminder._id]
 
         # Clean up the reminder from the database
-        deletion_result = self.bot.db.remindersV7.delete_one(
+        deletion_result = await self.bot.async_db.remindersV7.delete_one(
             {"_id": reminder._id}
         )
 
@@ -89,7 +89,7 @@ class RemindersBackend:
                     f"could not find channel/user with ID {reminder.context_id}."
                     " Deleting reminder."
                 )
-                self.clean_up_reminder(reminder)
+                await self.clean_up_reminder(reminder)
                 return
 
             if reminder.guild_id:
@@ -108,7 +108,7 @@ class RemindersBackend:
                     f"could not find author with ID {reminder.author_id}."
                     " Deleting reminder."
                 )
-                self.clean_up_reminder(reminder)
+                await self.clean_up_reminder(reminder)
                 return
 
             embed = SafeLengthEmbed(
@@ -130,7 +130,7 @@ class RemindersBackend:
                 content=content, embed=embed, reply_to=reminder.reply_id
             )
             logger.info(f"Sent reminder {reminder._id}.")
-            self.clean_up_reminder(reminder)
+            await self.clean_up_reminder(reminder)
 
         return send_reminder_task
 
@@ -201,7 +201,9 @@ class RemindersBackend:
             await ctx.send(str(e), ephemeral=True)
             return None
 
-        insertion_result = self.bot.db.remindersV7.insert_one(asdict(reminder))
+        insertion_result = await self.bot.async_db.remindersV7.insert_one(
+            asdict(reminder)
+        )
         if not insertion_result.acknowledged:
             logger.error("Failed to insert reminder into MongoDB.")
         else:
@@ -216,7 +218,7 @@ class RemindersBackend:
         Pull all existing reminders from the database
         and schedule them as tasks.
         """
-        reminder_dicts = list(self.bot.db.remindersV7.find())
+        reminder_dicts = await self.bot.async_db.remindersV7.find()
 
         logger.info(
             f"Need to start {len(reminder_dicts)} reminders from MongoDB."
@@ -126,7 +126,7 @@ class InterfaceCmds(RemindersBackend):
 
         # patch in the jump url and update in the db (evil hack, needs a better API)
         reminder.jump_url = msg.jump_url
-        self.bot.db.remindersV7.update_one(
+        await self.bot.async_db.remindersV7.update_one(
             {"_id": reminder._id}, {"$set": {"jump_url": msg.jump_url}}
         )
         await self.start_reminder(reminder)
@@ -144,7 +144,9 @@ class InterfaceCmds(RemindersBackend):
         _id = ObjectId(ctx.custom_id.split(":")[1])
 
         # find the reminder
-        reminder_doc = self.bot.db.remindersV7.find_one({"_id": _id})
+        reminder_doc = await self.bot.async_db.remindersV7.find_one(
+            {"_id": _id}
+        )
 
         # if the reminder doesn't exist, send an error
         if reminder_doc is None:
@@ -165,7 +167,7 @@ class InterfaceCmds(RemindersBackend):
             return
 
         # delete the reminder
-        self.clean_up_reminder(reminder)
+        await self.clean_up_reminder(reminder)
 
         # send a confirmation
         await ctx.send("Reminder deleted.", ephemeral=True)
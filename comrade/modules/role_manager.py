@@ -47,7 +47,7 @@ class RoleManager(Extension):
         (this is done to search for the role in the database)
         """
         try:
-            insertion_result = self.bot.db.roles.insert_one(
+            insertion_result = await self.bot.async_db.roles.insert_one(
                 {
                     "_id": role.id,
                     "guild_id": ctx.guild.id,
@@ -90,7 +90,9 @@ class RoleManager(Extension):
         If the role is not in the database, this command will notifiy the user.
         """
 
-        deletion_result = self.bot.db.roles.delete_one({"_id": role.id})
+        deletion_result = await self.bot.async_db.roles.delete_one(
+            {"_id": role.id}
+        )
 
         if deletion_result.acknowledged and deletion_result.deleted_count == 1:
             await ctx.send(
@@ -119,7 +121,9 @@ class RoleManager(Extension):
         Used if a role is deleted from the server, but not from the database.
         """
         # Get all roles in the database
-        db_roles = self.bot.db.roles.find({"guild_id": ctx.guild.id})
+        db_roles = await self.bot.async_db.roles.find(
+            {"guild_id": ctx.guild.id}
+        )
         db_role_ids = set([db_role["_id"] for db_role in db_roles])
 
         # Get all roles in the server
@@ -134,7 +138,7 @@ class RoleManager(Extension):
             return
 
         # Delete the removed roles from the database
-        deletion_result = self.bot.db.roles.delete_many(
+        deletion_result = await self.bot.async_db.roles.delete_many(
             {"_id": {"$in": list(removed_roles)}}
         )
         await ctx.send(
@@ -142,11 +146,13 @@ class RoleManager(Extension):
             ephemeral=True,
         )
 
-    def role_menu(self, ctx: BaseContext) -> StringSelectMenu:
+    async def role_menu(self, ctx: BaseContext) -> StringSelectMenu:
         """
         Gets all joinable roles in a guild in the menu
         """
-        joinable_roles = self.bot.db.roles.find({"guild_id": ctx.guild.id})
+        joinable_roles = await self.bot.async_db.roles.find(
+            {"guild_id": ctx.guild.id}
+        )
 
         roles = [ctx.guild.get_role(role["_id"]) for role in joinable_roles]
 
@@ -175,7 +181,9 @@ class RoleManager(Extension):
         List all joinable roles in a guild
         """
 
-        joinable_roles = self.bot.db.roles.find({"guild_id": ctx.guild.id})
+        joinable_roles = await self.bot.async_db.roles.find(
+            {"guild_id": ctx.guild.id}
+        )
 
         roles = [ctx.guild.get_role(role["_id"]) for role in joinable_roles]
 
@@ -194,7 +202,7 @@ class RoleManager(Extension):
             text="Use the menu below to join/leave roles",
         )
 
-        menu = self.role_menu(ctx)
+        menu = await self.role_menu(ctx)
 
         await ctx.send(embed=embed, ephemeral=True, components=[menu])
 
@@ -214,7 +222,7 @@ class RoleManager(Extension):
             )
 
         # Ensure the role is joinable
-        if self.bot.db.roles.find_one({"_id": role.id}) is None:
+        if await self.bot.async_db.roles.find_one({"_id": role.id}) is None:
             # This should never happen
             await ctx.send(
                 f"{role.mention} is not joinable/leaveable",
@@ -231,7 +239,9 @@ class RoleManager(Extension):
             result = f"Added {role.mention}"
 
         # Update the role menu, now that the user has joined/leaved a role
-        await ctx.edit_origin(components=self.role_menu(ctx), content=result)
+        await ctx.edit_origin(
+            components=await self.role_menu(ctx), content=result
+        )
 
 
 def setup(bot: Comrade):
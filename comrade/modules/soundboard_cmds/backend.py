@@ -13,7 +13,9 @@ from comrade.lib.sound_system import SoundboardAudio, download_video_to_mp3
 class SoundboardBackend:
     bot: Comrade
 
-    def get_soundboard_audio(self, object_id: str) -> SoundboardAudio | None:
+    async def get_soundboard_audio(
+        self, object_id: str
+    ) -> SoundboardAudio | None:
         """
         Get a soundboard audio by its _id.
 
@@ -27,15 +29,15 @@ class SoundboardBackend:
         SoundboardAudio
             The soundboard audio, or None if it doesn't exist.
         """
-        collection = self.bot.db.soundboardSounds
+        collection = self.bot.async_db.soundboardSounds
 
-        doc = collection.find_one({"_id": ObjectId(object_id)})
+        doc = await collection.find_one({"_id": ObjectId(object_id)})
 
         if doc is None:
             return None
         return SoundboardAudio.from_dict(doc)
 
-    def get_all_soundboard_audio_in_guild(
+    async def get_all_soundboard_audio_in_guild(
         self, guild_id: int
     ) -> list[SoundboardAudio] | None:
         """
@@ -51,15 +53,17 @@ class SoundboardBackend:
         list[SoundboardAudio]
             A list of all soundboard audio in the guild, or None if there are none.
         """
-        collection = self.bot.db.soundboardSounds
+        collection = self.bot.async_db.soundboardSounds
 
-        cursor = collection.find({"guild_id": guild_id})
+        docs = await collection.find({"guild_id": guild_id})
 
-        if cursor is None:
+        if docs is None:
             return None
-        return list(map(SoundboardAudio.from_dict, cursor))
+        return list(map(SoundboardAudio.from_dict, docs))
 
-    def delete_soundboard_audio(self, ctx: BaseContext, name: str) -> None:
+    async def delete_soundboard_audio(
+        self, ctx: BaseContext, name: str
+    ) -> None:
         """
         Delete a named soundboard audio from a given server, assuming the author is the
         creator of the sound.
@@ -71,9 +75,9 @@ class SoundboardBackend:
         name : str
             The name of the sound
         """
-        collection = self.bot.db.soundboardSounds
+        collection = self.bot.async_db.soundboardSounds
 
-        result = collection.delete_one(
+        result = await collection.delete_one(
             {"guild_id": ctx.guild_id, "name": name, "author_id": ctx.author_id}
         )
 
@@ -82,7 +86,7 @@ class SoundboardBackend:
 
             # check if it exists
             if (
-                doc := collection.find_one(
+                doc := await collection.find_one(
                     {"guild_id": ctx.guild_id, "name": name}
                 )
             ) is None:
@@ -116,8 +120,10 @@ class SoundboardBackend:
         SoundboardAudio
             The created SoundboardAudio instance
         """
+        collection = self.bot.async_db.soundboardSounds
+
         # sanity check: make sure the name is not already taken
-        if self.bot.db.soundboardSounds.find_one({"name": name}) is not None:
+        if await collection.find_one({"name": name}) is not None:
             raise ValueError("Name is already taken")
 
         # triage URL based on domain
@@ -134,7 +140,7 @@ class SoundboardBackend:
 
             # clone the blob to relay
             doc = await self.bot.relay.create_blob_from_bytes(
-                mp3_file, filename=f"{name}.mp3"
+                mp3_file, filename=f"{name}.mp3", urgent=True
             )
         # any other domain
         else:
@@ -147,7 +153,7 @@ class SoundboardBackend:
                 raise ValueError("Mime type is not audio")
 
             # clone the blob to relay
-            doc = await self.bot.relay.create_blob_from_url(url)
+            doc = await self.bot.relay.create_blob_from_url(url, urgent=True)
 
         # we want the blob url
         blob_url = doc["blob_url"]
@@ -157,8 +163,7 @@ class SoundboardBackend:
             name, ctx.guild_id, ctx.author_id, blob_url, emoji
         )
 
-        collection = self.bot.db.soundboardSounds
-        collection.insert_one(asdict(audio))
+        await collection.insert_one(asdict(audio))
 
         return audio
 
@@ -170,7 +175,7 @@ class SoundboardBackend:
         Assumes that there is at least one soundboard audio in the guild.
         """
         # get all soundboard audio in the guild
-        all_audio = self.get_all_soundboard_audio_in_guild(ctx.guild_id)
+        all_audio = await self.get_all_soundboard_audio_in_guild(ctx.guild_id)
 
         # chunk audio into groups of 20
         audio_chunks = [
@@ -79,7 +79,7 @@ class Soundboard(Extension, SoundboardBackend):
     )
     async def soundboard_remove_sound(self, ctx: SlashContext, name: str):
         try:
-            self.delete_soundboard_audio(ctx, name)
+            await self.delete_soundboard_audio(ctx, name)
             await ctx.send(f"Soundboard audio `{name}` removed.")
         except ValueError as e:
             await ctx.send(f"Could not remove sound `{name}`: {e}")
@@ -96,7 +96,7 @@ class Soundboard(Extension, SoundboardBackend):
             # This should never happen, but just in case
             await ctx.send("This command can only be used in a server.")
 
-        audios = self.get_all_soundboard_audio_in_guild(ctx.guild_id)
+        audios = await self.get_all_soundboard_audio_in_guild(ctx.guild_id)
 
         if audios is None:
             await ctx.send("No soundboard audio found.")
@@ -140,7 +140,7 @@ class Soundboard(Extension, SoundboardBackend):
     async def soundboard_button_callback(self, ctx: ComponentContext):
         audio_id = ctx.custom_id.split(":")[1]
 
-        audio = self.get_soundboard_audio(audio_id)
+        audio = await self.get_soundboard_audio(audio_id)
 
         if audio is None:
             await ctx.send(
@@ -1,4 +1,4 @@
-from io import StringIO
+from io import BytesIO, StringIO
 from logging import getLogger
 from platform import python_version
 
@@ -61,6 +61,34 @@ class Telemetry(Extension):
 
         await ctx.send(embed=embed)
 
+    @slash_command(description="Gets statistics of the bot's HTTP requests")
+    async def httpstats(self, ctx: SlashContext):
+        embed = Embed(
+            title="HTTP Requests",
+            description="Busiest hosts since the last restart;"
+            " all hosts are in the attached file",
+            color=ACCENT_COLOUR,
+        )
+
+        cache = self.bot.http_cache
+        for host, metrics in self.bot.http_metrics.busiest(10):
+            summary = metrics.summary
+            if cache is not None and (ratio := cache.hit_ratio(host)):
+                summary += f"\nCache hit ratio: {ratio:.0%}"
+            embed.add_field(name=host, value=summary, inline=False)
+
+        if cache is not None and (ratio := cache.hit_ratio()) is not None:
+            embed.set_footer(
+                text=f"Cache: {ratio:.0%} hit ratio, {len(cache.store)}"
+                f" responses, {cache.store.size / 2**20:.1f} MiB"
+            )
+
+        metrics_file = File(
+            BytesIO(self.bot.http_metrics.export()),
+            file_name="http_metrics.json",
+        )
+        await ctx.send(embed=embed, file=metrics_file)
+
     @slash_command(
         description="Gets the log for the bot",
     )
@@ -0,0 +1,127 @@
+"""
+Benchmark: memory used by active booru sessions.
+
+Builds `--sessions` BooruSessions, each holding a page of 100 posts
+decoded from a gelbooru-like search response (every field the API
+returns, and ~40 tags per post), and reports the memory allocated
+(tracemalloc) for posts reduced to BooruPost records against the
+previous representation (the full decoded JSON dict of each post).
+
+Usage:
+    python scripts/benchmarks/booru_session_memory.py
+    python scripts/benchmarks/booru_session_memory.py --sessions 2000
+"""
+import random
+import tracemalloc
+from argparse import ArgumentParser
+
+import orjson
+
+from comrade.lib.booru_ext import BooruPost, BooruSession
+
+POSTS_PER_PAGE = 100
+TAGS_PER_POST = 40
+
+# A vocabulary of tags, as common tags are shared between posts
+TAG_POOL = [f"tag_{i}_{'x' * (i % 17)}" for i in range(5000)]
+
+
+def gelbooru_post(post_id: int) -> dict:
+    md5 = f"{random.getrandbits(128):032x}"
+    directory = f"{md5[:2]}/{md5[2:4]}"
+    return {
+        "id": post_id,
+        "created_at": "Sat Jul 01 04:08:43 -0500 2023",
+        "score": random.randint(0, 500),
+        "width": 2480,
+        "height": 3508,
+        "md5": md5,
+        "directory": directory,
+        "image": f"{md5}.png",
+        "rating": "general",
+        "source": f"https://twitter.com/someone/status/{post_id}",
+        "change": 1688202523,
+        "owner": "danbooru",
+        "creator_id": 6498,
+        "parent_id": 0,
+        "sample": 1,
+        "preview_height": 250,
+        "preview_width": 176,
+        "tags": random.sample(TAG_POOL, TAGS_PER_POST),
+        "title": "",
+        "has_notes": "false",
+        "has_comments": "false",
+        "file_url": f"https://img3.gelbooru.com/images/{directory}/{md5}.png",
+        "preview_url": f"https://img3.gelbooru.com/thumbnails/{directory}/"
+        f"thumbnail_{md5}.jpg",
+        "sample_url": f"https://img3.gelbooru.com/samples/{directory}/"
+        f"sample_{md5}.jpg",
+        "sample_height": 1200,
+        "sample_width": 850,
+        "status": "active",
+        "post_locked": 0,
+        "has_children": "false",
+        "post_url": "https://gelbooru.com/index.php?page=post&s=view"
+        f"&id={post_id}",
+    }
+
+
+def search_responses(num_sessions: int) -> list[bytes]:
+    """
+    One page of search results per session, as the booru library
+    returns them (JSON text).
+    """
+    return [
+        orjson.dumps(
+            [
+                gelbooru_post(n * POSTS_PER_PAGE + i)
+                for i in range(POSTS_PER_PAGE)
+            ]
+        )
+        for n in range(num_sessions)
+    ]
+
+
+def measure(responses: list[bytes], compact: bool) -> int:
+    """
+    Bytes allocated to hold a session per search response.
+    """
+    tracemalloc.start()
+    sessions = []
+    for raw in responses:
+        session = BooruSession(None, "1girl")
+        posts = orjson.loads(raw)
+        session._posts = (
+            list(map(BooruPost.from_json, posts)) if compact else posts
+        )
+        del posts
+        sessions.append(session)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(sessions) == len(responses)
+    return allocated
+
+
+def main(num_sessions: int):
+    random.seed(0)
+    responses = search_responses(num_sessions)
+    print(f"{num_sessions} sessions of {POSTS_PER_PAGE} posts\n")
+
+    full = measure(responses, compact=False)
+    compact = measure(responses, compact=True)
+
+    for name, allocated in (("json dict", full), ("compact", compact)):
+        print(
+            f"{name:9s}: {allocated / 2**20:7.2f} MiB"
+            f"  ({allocated / num_sessions / 1024:6.1f} KiB per session)"
+        )
+    print(f"\n{full / compact:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=500)
+    args = parser.parse_args()
+
+    main(args.sessions)
@@ -0,0 +1,118 @@
+"""
+Benchmark: event loop lag under concurrent MongoDB traffic.
+
+Runs the same burst of concurrent `find_one` calls twice:
+1. calling pymongo directly from coroutines (the old behaviour)
+2. through comrade.core.async_db (a bounded thread pool)
+
+and reports the event loop lag observed during each run.
+
+By default, a simulated collection is used, where each query blocks
+its thread for `--latency` milliseconds (a stand-in for a slow round trip),
+so the benchmark can run without a database. Pass `--uri` to run the same
+queries against a real MongoDB deployment instead.
+
+Usage:
+    python scripts/benchmarks/db_event_loop_lag.py
+    python scripts/benchmarks/db_event_loop_lag.py --uri mongodb://localhost
+"""
+import asyncio
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from loop_lag import LoopLagMonitor
+from pymongo import MongoClient
+
+from comrade.core.async_db import AsyncCollection
+
+
+def simulated_collection(latency: float) -> SimpleNamespace:
+    def find_one(query: dict) -> dict:
+        time.sleep(latency)
+        return {"_id": query["_id"]}
+
+    return SimpleNamespace(name="simulated", find_one=find_one)
+
+
+async def run_blocking(collection, num_tasks: int, queries_per_task: int):
+    async def worker(worker_id: int):
+        for i in range(queries_per_task):
+            collection.find_one({"_id": f"{worker_id}:{i}"})
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker(n) for n in range(num_tasks)))
+
+
+async def run_async(
+    collection: AsyncCollection, num_tasks: int, queries_per_task: int
+):
+    async def worker(worker_id: int):
+        for i in range(queries_per_task):
+            await collection.find_one({"_id": f"{worker_id}:{i}"})
+
+    await asyncio.gather(*(worker(n) for n in range(num_tasks)))
+
+
+async def main(
+    uri: str | None,
+    latency_ms: float,
+    num_tasks: int,
+    queries_per_task: int,
+    max_workers: int,
+):
+    if uri:
+        client = MongoClient(uri)
+        collection = client[client.list_database_names()[0]].blobStorage
+        print(f"Using real collection {collection.full_name}")
+    else:
+        collection = simulated_collection(latency_ms / 1000)
+        print(f"Using simulated collection ({latency_ms} ms per query)")
+
+    print(
+        f"{num_tasks} concurrent tasks x {queries_per_task} queries each, "
+        f"{max_workers} executor threads\n"
+    )
+
+    async with LoopLagMonitor() as idle:
+        await asyncio.sleep(0.5)
+    print(f"idle loop        : {idle.summary()}")
+
+    start = time.perf_counter()
+    async with LoopLagMonitor() as blocking:
+        await run_blocking(collection, num_tasks, queries_per_task)
+    blocking_time = time.perf_counter() - start
+    print(f"blocking pymongo : {blocking.summary()}  ({blocking_time:.2f} s)")
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    async_collection = AsyncCollection(collection, executor)
+
+    start = time.perf_counter()
+    async with LoopLagMonitor() as nonblocking:
+        await run_async(async_collection, num_tasks, queries_per_task)
+    async_time = time.perf_counter() - start
+    print(f"AsyncCollection  : {nonblocking.summary()}  ({async_time:.2f} s)")
+
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--uri", default=None, help="MongoDB URI to benchmark against"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=20,
+        help="Simulated round trip time in milliseconds",
+    )
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    asyncio.run(
+        main(args.uri, args.latency, args.tasks, args.queries, args.workers)
+    )
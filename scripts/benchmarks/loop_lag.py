@@ -0,0 +1,60 @@
+"""
+Helper used by the benchmark scripts in this folder to measure
+event loop lag, i.e. how late a task that asks to wake up every
+`interval` seconds actually wakes up.
+
+A healthy loop has lag close to zero; any blocking call made from
+a coroutine shows up directly as a lag spike of the same length.
+"""
+import asyncio
+from statistics import quantiles
+from time import perf_counter
+
+
+class LoopLagMonitor:
+    """
+    Async context manager which samples event loop lag
+    for as long as it is active.
+
+    Usage:
+        async with LoopLagMonitor() as monitor:
+            await do_work()
+        print(monitor.summary())
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task = None
+
+    async def _sample(self):
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(perf_counter() - start - self.interval)
+
+    async def __aenter__(self) -> "LoopLagMonitor":
+        self._task = asyncio.create_task(self._sample())
+        # let the sampler start before the workload does
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self) -> str:
+        if len(self.samples) < 2:
+            return "not enough samples (the loop was blocked the whole time)"
+
+        percentiles = quantiles(self.samples, n=100, method="inclusive")
+        p50, p99 = percentiles[49], percentiles[98]
+        return (
+            f"samples={len(self.samples):5d}  "
+            f"p50={p50 * 1000:7.2f} ms  "
+            f"p99={p99 * 1000:7.2f} ms  "
+            f"max={max(self.samples) * 1000:7.2f} ms"
+        )
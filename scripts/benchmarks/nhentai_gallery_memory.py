@@ -0,0 +1,96 @@
+"""
+Benchmark: memory used by cached nhentai galleries.
+
+Fills a GalleryCache with `--galleries` copies of the saved gallery
+fixture (tests/lib/fixtures, 250 pages), each with its own gallery and
+images IDs as real galleries would have, and reports the memory allocated
+(tracemalloc) for the compact page index (one extension code per page)
+against the previous representation (one full URL string per page).
+
+Usage:
+    python scripts/benchmarks/nhentai_gallery_memory.py
+    python scripts/benchmarks/nhentai_gallery_memory.py --galleries 5000
+"""
+import asyncio
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from comrade.lib.nhentai.gallery_cache import GalleryCache
+from comrade.lib.nhentai.page_parser import gallery_from_html
+from comrade.lib.nhentai.structures import NHentaiGallery
+
+FIXTURES = Path(__file__).parents[2] / "tests" / "lib" / "fixtures"
+
+
+@dataclass
+class URLListGallery:
+    # NHentaiGallery as it was, with a list of page URLs
+    gallery_id: int
+    title: str
+    images_id: int
+    image_list: list[str]
+    tags: list[str]
+    provider: str
+
+
+def compact_gallery(template: NHentaiGallery, n: int) -> NHentaiGallery:
+    return replace(
+        template,
+        gallery_id=template.gallery_id + n,
+        images_id=template.images_id + n,
+        # Parsed per gallery, so not shared between galleries
+        page_extensions=bytes(template.page_extensions),
+    )
+
+
+def url_list_gallery(template: NHentaiGallery, n: int) -> URLListGallery:
+    gallery = compact_gallery(template, n)
+    return URLListGallery(
+        gallery.gallery_id,
+        gallery.title,
+        gallery.images_id,
+        list(gallery),
+        gallery.tags,
+        gallery.provider,
+    )
+
+
+async def measure(build, template: NHentaiGallery, num_galleries: int) -> int:
+    """
+    Bytes allocated to hold `num_galleries` galleries in a GalleryCache.
+    """
+    tracemalloc.start()
+    cache = GalleryCache(max_size=num_galleries)
+    for n in range(num_galleries):
+        await cache.put(build(template, n))
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(cache.memory) == num_galleries
+    return allocated
+
+
+async def main(num_galleries: int):
+    html = (FIXTURES / "nhentai_gallery.html").read_text()
+    template = gallery_from_html("benchmark", html)
+    print(f"{num_galleries} cached galleries of {len(template)} pages\n")
+
+    url_list = await measure(url_list_gallery, template, num_galleries)
+    compact = await measure(compact_gallery, template, num_galleries)
+
+    for name, allocated in (("url list", url_list), ("compact", compact)):
+        print(
+            f"{name:8s}: {allocated / 2**20:7.2f} MiB"
+            f"  ({allocated / num_galleries / 1024:6.1f} KiB per gallery)"
+        )
+    print(f"\n{url_list / compact:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--galleries", type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.galleries))
@@ -0,0 +1,96 @@
+"""
+Benchmark: event loop lag while nhentai pages are parsed.
+
+Fetches the saved gallery fixture (tests/lib/fixtures) through
+race_sources() many times, with a fake source answering one page every
+`--spacing` milliseconds (like several users browsing at once), and reports the event loop lag observed for each combination
+of parser backend ("bs4", "lxml") and parse pool ("inline" parses on the
+event loop, as before; "thread" and "process" parse off the loop).
+
+Usage:
+    python scripts/benchmarks/nhentai_parse_lag.py
+    python scripts/benchmarks/nhentai_parse_lag.py --pages 64 --spacing 5
+"""
+import asyncio
+import time
+from argparse import ArgumentParser
+from functools import partial
+from pathlib import Path
+
+from loop_lag import LoopLagMonitor
+
+from comrade.lib.concurrency import OffloadPool
+from comrade.lib.nhentai import search as nh_search
+from comrade.lib.nhentai.health import SourceHealthTracker
+from comrade.lib.nhentai.page_parser import gallery_from_html
+from comrade.lib.nhentai.proxies import NHentaiSource
+
+FIXTURES = Path(__file__).parents[2] / "tests" / "lib" / "fixtures"
+
+
+async def parse_pages(html: str, parser: str, num_pages: int, spacing: float):
+    source = NHentaiSource("fixture", "")
+
+    def fetch_after(delay: float):
+        async def fetch(_: NHentaiSource) -> str:
+            await asyncio.sleep(delay)
+            return html
+
+        return fetch
+
+    await asyncio.gather(
+        *(
+            nh_search.race_sources(
+                [source],
+                fetch_after(n * spacing),
+                partial(gallery_from_html, parser=parser),
+                health=SourceHealthTracker(),
+            )
+            for n in range(num_pages)
+        )
+    )
+
+
+async def main(num_pages: int, spacing_ms: float, workers: int):
+    html = (FIXTURES / "nhentai_gallery.html").read_text()
+    print(
+        f"{num_pages} gallery pages, one every {spacing_ms} ms,"
+        f" {workers} pool workers\n"
+    )
+
+    async with LoopLagMonitor() as idle:
+        await asyncio.sleep(0.5)
+    print(f"{'idle loop':16s}: {idle.summary()}")
+
+    for parser in ("bs4", "lxml"):
+        for kind in OffloadPool.KINDS[::-1]:
+            nh_search.PARSE_POOL = pool = OffloadPool(kind, workers)
+
+            # Start the workers before measuring
+            await parse_pages(html, parser, workers, 0)
+
+            start = time.perf_counter()
+            async with LoopLagMonitor() as monitor:
+                await parse_pages(html, parser, num_pages, spacing_ms / 1000)
+            elapsed = time.perf_counter() - start
+
+            print(
+                f"{parser:4s} {kind:11s}: {monitor.summary()}"
+                f"  ({elapsed:.2f} s)"
+            )
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=32)
+    parser.add_argument(
+        "--spacing",
+        type=float,
+        default=20,
+        help="Milliseconds between pages arriving",
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.pages, args.spacing, args.workers))
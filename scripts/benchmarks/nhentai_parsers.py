@@ -0,0 +1,87 @@
+"""
+Benchmark: nhentai page parsing, BeautifulSoup backend vs lxml backend.
+
+Parses the saved fixture pages in tests/lib/fixtures with both parser
+backends in comrade.lib.nhentai.page_parser (validation + extraction,
+starting from the raw HTML each time, as race_sources() does), and
+reports the time per page.
+
+Usage:
+    python scripts/benchmarks/nhentai_parsers.py
+    python scripts/benchmarks/nhentai_parsers.py --repeat 200
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from comrade.lib.nhentai.page_parser import (
+    parse_gallery_from_page,
+    parse_maximum_search_pages,
+    parse_search_result_from_page,
+    raise_for_gallery_page,
+    raise_for_search_page,
+)
+from comrade.lib.nhentai.structures import NHentaiWebPage
+
+FIXTURES = Path(__file__).parents[2] / "tests" / "lib" / "fixtures"
+
+
+def parse_gallery(html: str, parser: str):
+    page = NHentaiWebPage("benchmark", html)
+    raise_for_gallery_page(page, parser)
+    return parse_gallery_from_page(page, parser)
+
+
+def parse_search(html: str, parser: str):
+    page = NHentaiWebPage("benchmark", html)
+    raise_for_search_page(page, parser)
+    return (
+        parse_search_result_from_page(page, parser),
+        parse_maximum_search_pages(page, parser),
+    )
+
+
+def time_per_call(fn, html: str, parser: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn(html, parser)
+        samples.append(perf_counter() - start)
+    return median(samples)
+
+
+def main(repeat: int):
+    cases = (
+        ("gallery (250 pages)", parse_gallery, "nhentai_gallery.html"),
+        ("search (first page)", parse_search, "nhentai_search.html"),
+        ("search (last page)", parse_search, "nhentai_search_last.html"),
+    )
+
+    for name, fn, fixture in cases:
+        html = (FIXTURES / fixture).read_text()
+
+        # Both backends must agree before their speed is compared
+        assert fn(html, "lxml") == fn(html, "bs4"), f"{name}: results differ"
+
+        bs4_time = time_per_call(fn, html, "bs4", repeat)
+        lxml_time = time_per_call(fn, html, "lxml", repeat)
+        print(
+            f"{name:20s}  "
+            f"bs4={bs4_time * 1000:7.2f} ms  "
+            f"lxml={lxml_time * 1000:7.2f} ms  "
+            f"speedup={bs4_time / lxml_time:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=50,
+        help="Number of times each page is parsed by each backend.",
+    )
+    args = parser.parse_args()
+
+    main(args.repeat)
@@ -0,0 +1,164 @@
+"""
+Script used to backfill `content_hash` on existing relay blob documents,
+so that new uploads can be deduplicated against them.
+
+Each blob without a hash is downloaded from its `blob_url`, hashed
+with SHA-256, and the hash is written back. Blobs sharing an attachment
+are only downloaded once. Safe to re-run; documents which already
+have a hash are skipped.
+
+Attachments whose URL has expired (Discord CDN links are signed, and
+answer 403 or 404 once the signature runs out) are skipped and counted,
+rather than reported one by one; they are left without a hash.
+
+Usage:
+    python scripts/migration/blob_hash_backfill.py
+    python scripts/migration/blob_hash_backfill.py --real --collection blobStorage
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from collections import defaultdict
+from hashlib import sha256
+
+import aiohttp
+from decouple import config
+from pymongo import MongoClient, UpdateMany
+
+# MongoDB URIs
+PROD_MONOGDB_URI: str = config("MIGRATION_PROD_MONGODB_URI")
+TEST_MONGODB_URI: str = config("MIGRATION_TEST_MONGODB_URI")
+
+
+# Statuses the Discord CDN answers with for expired attachment URLs
+EXPIRED_STATUSES = (403, 404)
+
+
+async def hash_blob(
+    http_session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    blob_url: str,
+    expired: list[str],
+) -> str | None:
+    """
+    Download a blob and return its SHA-256 hex digest,
+    or None if it could not be downloaded.
+
+    URLs which have expired are added to `expired`.
+    """
+    async with semaphore:
+        try:
+            async with http_session.get(blob_url) as resp:
+                if resp.status in EXPIRED_STATUSES:
+                    expired.append(blob_url)
+                    return None
+                resp.raise_for_status()
+                hasher = sha256()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    hasher.update(chunk)
+                return hasher.hexdigest()
+        except aiohttp.ClientError as e:
+            print(f"Could not download {blob_url}: {e}")
+            return None
+
+
+async def main(
+    run_real: bool = False,
+    collection_name: str = "blobStorage",
+    concurrency: int = 8,
+    batch_size: int = 500,
+):
+    if run_real:
+        print("***** RUNNING ON REAL DATABASE *****")
+        input("Press enter to continue...")
+        print("Proceeding with migration")
+        client = MongoClient(PROD_MONOGDB_URI)
+    else:
+        client = MongoClient(TEST_MONGODB_URI)
+
+    db = client[client.list_database_names()[0]]
+    collection = db[collection_name]
+
+    collection.create_index("content_hash")
+
+    # Group documents by attachment, since several source URLs
+    # may already share one
+    ids_by_blob_url: dict[str, list[str]] = defaultdict(list)
+    for doc in collection.find(
+        {"content_hash": {"$exists": False}}, {"blob_url": 1}
+    ):
+        ids_by_blob_url[doc["blob_url"]].append(doc["_id"])
+
+    print(
+        f"{sum(map(len, ids_by_blob_url.values()))} documents"
+        f" ({len(ids_by_blob_url)} attachments) to backfill"
+    )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    blob_urls = list(ids_by_blob_url)
+    expired: list[str] = []
+    num_updated = 0
+
+    async with aiohttp.ClientSession() as http_session:
+        for start in range(0, len(blob_urls), batch_size):
+            batch = blob_urls[start : start + batch_size]
+            hashes = await asyncio.gather(
+                *(
+                    hash_blob(http_session, semaphore, url, expired)
+                    for url in batch
+                )
+            )
+
+            requests = [
+                UpdateMany(
+                    {"_id": {"$in": ids_by_blob_url[blob_url]}},
+                    {"$set": {"content_hash": content_hash}},
+                )
+                for blob_url, content_hash in zip(batch, hashes)
+                if content_hash is not None
+            ]
+            if requests:
+                result = collection.bulk_write(requests, ordered=False)
+                num_updated += result.modified_count
+
+            print(
+                f"Processed {start + len(batch)}/{len(blob_urls)} attachments,"
+                f" {num_updated} documents updated,"
+                f" {len(expired)} attachments expired"
+            )
+
+    if expired:
+        print(
+            f"Skipped {len(expired)} attachments"
+            f" ({sum(len(ids_by_blob_url[url]) for url in expired)} documents)"
+            f" whose URL expired ({'/'.join(map(str, EXPIRED_STATUSES))})"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--real",
+        action="store_true",
+        help="Whether to run the migration on the real database.",
+    )
+    parser.add_argument(
+        "--collection",
+        default="blobStorage",
+        help="The blob collection to backfill.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of blobs downloaded at once.",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(
+        main(
+            run_real=args.real,
+            collection_name=args.collection,
+            concurrency=args.concurrency,
+        )
+    )
@@ -2,13 +2,13 @@ import asyncio
 from contextlib import suppress
 
 import aiohttp
-import orjson
 import pytest
 from interactions import Client, Guild, GuildText
 
 from comrade.bot import main
 from comrade.core.comrade_client import Comrade
 from comrade.core.configuration import TEST_GUILD_ID
+from comrade.core.http_client import create_http_session
 
 
 # Test config options
@@ -44,7 +44,7 @@ def pytest_collection_modifyitems(config, items):
 # reusable aiohttp client fixture
 @pytest.fixture(scope="session")
 async def http_session() -> aiohttp.ClientSession:
-    client = aiohttp.ClientSession(json_serialize=orjson.dumps)
+    client = create_http_session()
     yield client
     await client.close()
 
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from comrade.core.async_db import AsyncCollection
+
+
+@pytest.fixture(scope="module")
+def executor() -> ThreadPoolExecutor:
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown()
+
+
+def blocking_collection(latency: float = 0) -> SimpleNamespace:
+    """
+    Stand-in for a pymongo Collection which blocks
+    the calling thread for `latency` seconds per call,
+    and records which thread served each call.
+    """
+    served_by = []
+
+    def find_one(query: dict) -> dict:
+        served_by.append(threading.get_ident())
+        time.sleep(latency)
+        return {"_id": query["_id"]}
+
+    def find(query: dict):
+        served_by.append(threading.get_ident())
+        return iter([{"_id": 1}, {"_id": 2}])
+
+    return SimpleNamespace(
+        name="fake", find_one=find_one, find=find, served_by=served_by
+    )
+
+
+async def test_calls_run_off_loop(executor: ThreadPoolExecutor):
+    collection = blocking_collection()
+    async_collection = AsyncCollection(collection, executor)
+
+    assert await async_collection.find_one({"_id": 5}) == {"_id": 5}
+    assert await async_collection.find({}) == [{"_id": 1}, {"_id": 2}]
+
+    assert threading.get_ident() not in collection.served_by
+
+
+async def test_loop_stays_responsive(executor: ThreadPoolExecutor):
+    """
+    Four concurrent 100 ms queries should not stop
+    the loop from ticking every 10 ms.
+    """
+    async_collection = AsyncCollection(blocking_collection(0.1), executor)
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.gather(
+        *(async_collection.find_one({"_id": i}) for i in range(4))
+    )
+    ticker_task.cancel()
+
+    assert ticks >= 5
@@ -0,0 +1,180 @@
+from collections import Counter
+from pathlib import Path
+
+import pytest
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from comrade.core.http_cache import (
+    CacheEntry,
+    HTTPCache,
+    HTTPDiskCache,
+    get_text,
+    parse_host_ttls,
+)
+
+
+@pytest.fixture
+async def cacheable_server():
+    """
+    Local server with endpoints exercising each caching behaviour.
+    """
+    calls = Counter()
+
+    async def fresh(request: web.Request) -> web.Response:
+        calls["fresh"] += 1
+        return web.Response(
+            text="fresh", headers={"Cache-Control": "max-age=60"}
+        )
+
+    async def etag(request: web.Request) -> web.Response:
+        calls["etag"] += 1
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.Response(
+            text="etag", headers={"ETag": '"v1"', "Cache-Control": "no-cache"}
+        )
+
+    async def missing(request: web.Request) -> web.Response:
+        calls["missing"] += 1
+        return web.Response(
+            status=404, text="gone", headers={"Cache-Control": "max-age=60"}
+        )
+
+    async def no_store(request: web.Request) -> web.Response:
+        calls["no_store"] += 1
+        return web.Response(
+            text="secret", headers={"Cache-Control": "no-store, max-age=60"}
+        )
+
+    app = web.Application()
+    app.router.add_get("/fresh", fresh)
+    app.router.add_get("/etag", etag)
+    app.router.add_get("/no_store", no_store)
+    app.router.add_get("/missing", missing)
+
+    server = TestServer(app)
+    await server.start_server()
+    server.calls = calls
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+def disk_cache(tmp_path: Path):
+    cache = HTTPDiskCache(tmp_path / "http.sqlite3", max_bytes=1024)
+    yield cache
+    cache.close()
+
+
+async def test_fresh_hit(cacheable_server: TestServer, disk_cache):
+    cache = HTTPCache(disk_cache, host_ttls={})
+    url = cacheable_server.make_url("/fresh")
+
+    async with ClientSession() as session:
+        for _ in range(3):
+            assert await cache.get_text(session, url) == (200, "fresh")
+
+    assert cacheable_server.calls["fresh"] == 1
+    assert cache.stats[cacheable_server.host] == {
+        "miss": 1,
+        "stored": 1,
+        "hit": 2,
+    }
+    assert cache.hit_ratio() == 2 / 3
+
+
+async def test_revalidation(cacheable_server: TestServer, disk_cache):
+    cache = HTTPCache(disk_cache, host_ttls={})
+    url = cacheable_server.make_url("/etag")
+
+    async with ClientSession() as session:
+        assert await cache.get_text(session, url) == (200, "etag")
+        assert await cache.get_text(session, url) == (200, "etag")
+
+    assert cacheable_server.calls["etag"] == 2
+    assert cache.stats[cacheable_server.host]["revalidated"] == 1
+
+
+async def test_no_store(cacheable_server: TestServer, disk_cache):
+    cache = HTTPCache(disk_cache, host_ttls={})
+    url = cacheable_server.make_url("/no_store")
+
+    async with ClientSession() as session:
+        assert await cache.get_text(session, url) == (200, "secret")
+        assert await cache.get_text(session, url) == (200, "secret")
+
+    assert cacheable_server.calls["no_store"] == 2
+    assert len(disk_cache) == 0
+
+
+async def test_host_ttl_override(cacheable_server: TestServer, disk_cache):
+    # Responses which must be revalidated are kept anyway
+    cache = HTTPCache(disk_cache, host_ttls={cacheable_server.host: 60})
+    url = cacheable_server.make_url("/etag")
+
+    async with ClientSession() as session:
+        assert await cache.get_text(session, url) == (200, "etag")
+        assert await cache.get_text(session, url) == (200, "etag")
+
+    assert cacheable_server.calls["etag"] == 1
+
+
+async def test_errors_not_stored(cacheable_server: TestServer, disk_cache):
+    cache = HTTPCache(disk_cache, host_ttls={cacheable_server.host: 60})
+    url = cacheable_server.make_url("/missing")
+
+    async with ClientSession() as session:
+        for _ in range(2):
+            status, _ = await cache.get_text(session, url)
+            assert status == 404
+
+    assert cacheable_server.calls["missing"] == 2
+    assert len(disk_cache) == 0
+
+
+async def test_get_text_without_cache(cacheable_server: TestServer):
+    async with ClientSession() as session:
+        url = cacheable_server.make_url("/fresh")
+        assert await get_text(session, url) == (200, "fresh")
+        assert await get_text(session, url) == (200, "fresh")
+
+    assert cacheable_server.calls["fresh"] == 2
+
+
+def test_lru_eviction(disk_cache: HTTPDiskCache):
+    for name in "abc":
+        disk_cache.put(name, CacheEntry(200, [], b"x" * 300, 0))
+
+    # "a" is used again, so "b" is the least recently used
+    disk_cache.get("a")
+    disk_cache.put("d", CacheEntry(200, [], b"x" * 300, 0))
+
+    assert disk_cache.get("b") is None
+    assert disk_cache.get("a") is not None
+    assert len(disk_cache) == 3
+    assert disk_cache.size == 900
+
+    # Overwriting an entry replaces its size
+    disk_cache.put("a", CacheEntry(200, [], b"x" * 100, 0))
+    assert len(disk_cache) == 3
+    assert disk_cache.size == 700
+
+
+def test_totals_persist(tmp_path: Path):
+    path = tmp_path / "http.sqlite3"
+    cache = HTTPDiskCache(path)
+    cache.put("a", CacheEntry(200, [], b"x" * 300, 0))
+    cache.put("b", CacheEntry(200, [], b"x" * 200, 0))
+    cache.close()
+
+    reopened = HTTPDiskCache(path)
+    assert (len(reopened), reopened.size) == (2, 500)
+    reopened.close()
+
+
+def test_parse_host_ttls():
+    assert parse_host_ttls(" i3.nhentai.net=604800, Tenor.com=86400,") == {
+        "i3.nhentai.net": 604800,
+        "tenor.com": 86400,
+    }
@@ -0,0 +1,137 @@
+from collections import Counter
+
+import pytest
+from aiohttp import ClientConnectionError, ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from comrade.core.http_client import (
+    HostMetrics,
+    HTTPMetrics,
+    RetryMiddleware,
+    create_http_session,
+)
+
+
+@pytest.fixture
+async def flaky_server():
+    """
+    Local server whose /flaky endpoint fails twice before succeeding,
+    whichever method is used, and whose /busy endpoint always asks
+    to retry an hour later.
+    """
+    calls = Counter()
+
+    async def flaky(request: web.Request) -> web.Response:
+        calls[request.method] += 1
+        if calls[request.method] <= 2:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.Response(text="ok")
+
+    async def busy(request: web.Request) -> web.Response:
+        calls["busy"] += 1
+        return web.Response(status=429, headers={"Retry-After": "3600"})
+
+    app = web.Application()
+    app.router.add_route("*", "/flaky", flaky)
+    app.router.add_get("/busy", busy)
+
+    server = TestServer(app)
+    await server.start_server()
+    server.calls = calls
+    yield server
+    await server.close()
+
+
+def retrying_session(metrics: HTTPMetrics, retries: int) -> ClientSession:
+    return ClientSession(
+        middlewares=[
+            RetryMiddleware(retries=retries, backoff=0, metrics=metrics),
+            metrics,
+        ]
+    )
+
+
+async def test_retry_idempotent_get(flaky_server: TestServer):
+    metrics = HTTPMetrics()
+
+    async with retrying_session(metrics, retries=2) as session:
+        async with session.get(flaky_server.make_url("/flaky")) as response:
+            assert response.status == 200
+            assert await response.text() == "ok"
+
+    host = metrics.hosts[flaky_server.host]
+    assert host.requests == 3
+    assert host.retries == 2
+    assert host.statuses == {503: 2, 200: 1}
+    assert host.error_count == 2
+    assert host.responses == 3
+
+
+async def test_retry_gives_up(flaky_server: TestServer):
+    metrics = HTTPMetrics()
+
+    async with retrying_session(metrics, retries=1) as session:
+        async with session.get(flaky_server.make_url("/flaky")) as response:
+            assert response.status == 503
+
+    assert metrics.hosts[flaky_server.host].requests == 2
+
+
+async def test_no_retry_long_retry_after(flaky_server: TestServer):
+    metrics = HTTPMetrics()
+
+    # Waiting an hour isn't worth it; the caller gets the 429 right away
+    async with retrying_session(metrics, retries=2) as session:
+        async with session.get(flaky_server.make_url("/busy")) as response:
+            assert response.status == 429
+
+    assert flaky_server.calls["busy"] == 1
+    assert metrics.hosts[flaky_server.host].retries == 0
+
+
+async def test_no_retry_post(flaky_server: TestServer):
+    metrics = HTTPMetrics()
+
+    async with retrying_session(metrics, retries=2) as session:
+        async with session.post(flaky_server.make_url("/flaky")) as response:
+            assert response.status == 503
+
+    assert flaky_server.calls["POST"] == 1
+    assert metrics.hosts[flaky_server.host].retries == 0
+
+
+async def test_connection_errors_recorded():
+    metrics = HTTPMetrics()
+
+    # Nothing listens on port 1
+    async with retrying_session(metrics, retries=1) as session:
+        with pytest.raises(ClientConnectionError):
+            await session.get("http://127.0.0.1:1/")
+
+    host = metrics.hosts["127.0.0.1"]
+    assert host.requests == 2
+    assert host.retries == 1
+    assert sum(host.errors.values()) == 2
+    assert host.responses == 0
+
+
+def test_latency_histogram():
+    metrics = HostMetrics()
+    for latency in [0.01] * 90 + [0.3] * 9 + [20.0]:
+        metrics.observe(latency)
+
+    assert metrics.responses == 100
+    assert metrics.latency_percentile(0.5) == 0.05
+    assert metrics.latency_percentile(0.95) == 0.5
+    assert metrics.latency_percentile(1.0) == float("inf")
+
+
+async def test_create_http_session(flaky_server: TestServer):
+    metrics = HTTPMetrics()
+
+    async with create_http_session(metrics) as session:
+        async with session.get(flaky_server.make_url("/flaky")) as response:
+            assert response.status == 200
+
+    assert metrics.hosts[flaky_server.host].retries == 2
+    assert b'"requests": 3' in metrics.export()
@@ -53,6 +53,13 @@ async def test_relay_init(
     check_url = await relay.find_blob_by_url(source_url)
     assert check_url == mirrored_doc["blob_url"]
 
+    # Test bulk lookup
+    missing_url = "https://example.com/missing.png"
+    assert await relay.find_blobs_by_urls([source_url, missing_url]) == {
+        source_url: check_url,
+        missing_url: None,
+    }
+
     await asyncio.sleep(1)  # Wait for the message to be sent
 
     # Ensure the message exists
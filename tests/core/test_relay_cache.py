@@ -0,0 +1,185 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from comrade.core.relay_system import Relay
+from comrade.core.relay_system.cache_mixin import RelayCacheMixin
+from comrade.core.relay_system.disk_cache import BlobDiskCache
+
+
+def blob(n: int) -> dict:
+    # snowflakes: n seconds apart
+    message_id = 1100000000000000000 + ((n * 1000) << 22)
+    return {
+        "_id": f"https://example.com/{n}.png",
+        "blob_url": f"https://cdn.discordapp.com/{n}.png",
+        "channel_id": 1,
+        "message_id": message_id,
+        "filename": f"{n}.png",
+    }
+
+
+def fake_collection(docs: list[dict]) -> SimpleNamespace:
+    """
+    Stand-in for an AsyncCollection, supporting only
+    the sorted + limited find() used for cache warming.
+    """
+
+    async def find(query: dict, sort: list, limit: int) -> list[dict]:
+        key, direction = sort[0]
+        ordered = sorted(docs, key=lambda d: d[key], reverse=direction < 0)
+        return ordered[:limit]
+
+    return SimpleNamespace(find=find)
+
+
+def test_disk_cache_persists(tmp_path: Path):
+    path = tmp_path / "blobs.sqlite3"
+
+    cache = BlobDiskCache(path)
+    cache.put(blob(1))
+    cache.close()
+
+    reopened = BlobDiskCache(path)
+    assert reopened.get(blob(1)["_id"]) == blob(1)
+    assert reopened.get(blob(2)["_id"]) is None
+
+
+@pytest.mark.parametrize(
+    "policy, survivor, evicted", (("lru", 0, 1), ("fifo", 1, 0))
+)
+def test_disk_cache_eviction(
+    tmp_path: Path, policy: str, survivor: int, evicted: int
+):
+    cache = BlobDiskCache(tmp_path / "blobs.sqlite3", 2, policy)
+    cache.put(blob(0))
+    cache.put(blob(1))
+
+    # Touch the oldest entry; only LRU cares
+    cache.get(blob(0)["_id"])
+    cache.put(blob(2))
+
+    assert len(cache) == 2
+    assert blob(survivor)["_id"] in cache
+    assert blob(evicted)["_id"] not in cache
+
+
+def test_disk_cache_count(tmp_path: Path):
+    path = tmp_path / "blobs.sqlite3"
+
+    cache = BlobDiskCache(path)
+    cache.put_many([blob(0), blob(1), blob(1)])
+    cache.put(blob(0))
+    cache.seed([blob(1), blob(2)])
+    cache.delete(blob(0)["_id"])
+    cache.delete(blob(3)["_id"])
+    assert len(cache) == 2
+
+    # Reads are not lost when closing with their access times unwritten
+    cache.get(blob(1)["_id"])
+    cache.close()
+
+    reopened = BlobDiskCache(path)
+    assert len(reopened) == 2
+    assert reopened.most_recent(1) == [blob(1)]
+
+
+async def test_two_tier_stats(tmp_path: Path):
+    relay_cache = RelayCacheMixin()
+    relay_cache.init_cache(
+        max_size=1, disk_path=str(tmp_path / "blobs.sqlite3")
+    )
+
+    await relay_cache.cache_blob(blob(0))
+    await relay_cache.cache_blob(blob(1))  # pushes blob 0 out of memory
+
+    assert await relay_cache.get_cached_blob(blob(1)["_id"]) == blob(1)
+    assert await relay_cache.get_cached_blob(blob(0)["_id"]) == blob(0)
+    assert await relay_cache.get_cached_blob(blob(2)["_id"]) is None
+
+    stats = relay_cache.cache_stats
+    assert stats["memory_hit"] == 1
+    assert stats["disk_hit"] == 1
+    assert stats["disk_miss"] == 1
+    assert stats["hit"] == 2
+    assert stats["miss"] == 1
+
+    # blob 0 was promoted back into memory
+    assert list(relay_cache.local_cache) == [blob(0)["_id"]]
+
+
+async def test_warm_start(tmp_path: Path):
+    path = str(tmp_path / "blobs.sqlite3")
+
+    # A previous run used blob 0
+    previous_run = RelayCacheMixin()
+    previous_run.init_cache(disk_path=path)
+    await previous_run.cache_blob(blob(0))
+
+    relay_cache = RelayCacheMixin()
+    relay_cache.init_cache(max_size=3, disk_path=path)
+
+    mongo_docs = [blob(n) for n in range(1, 6)]
+    assert await relay_cache.warm_cache(fake_collection(mongo_docs), 5) == 3
+
+    # the blob used before the restart is most recent,
+    # followed by the newest uploads
+    assert list(relay_cache.local_cache) == [
+        blob(4)["_id"],
+        blob(5)["_id"],
+        blob(0)["_id"],
+    ]
+    assert len(relay_cache.disk_cache) == 6
+
+
+async def test_memory_only(tmp_path: Path):
+    relay_cache = RelayCacheMixin()
+    relay_cache.init_cache(max_size=1, disk_path="")
+
+    await relay_cache.cache_blob(blob(0))
+    await relay_cache.cache_blob(blob(1))
+
+    assert relay_cache.disk_cache is None
+    assert await relay_cache.get_cached_blob(blob(0)["_id"]) is None
+    assert relay_cache.cache_stats["disk_miss"] == 0
+
+
+async def test_find_blobs_by_urls(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    # keep the default on-disk cache out of the working directory
+    monkeypatch.chdir(tmp_path)
+
+    queries = []
+
+    async def find(query: dict) -> list[dict]:
+        queries.append(query)
+        return [
+            blob(n) for n in (1, 2) if blob(n)["_id"] in query["_id"]["$in"]
+        ]
+
+    collection = SimpleNamespace(find=find)
+    bot = SimpleNamespace(
+        add_listener=lambda listener: None,
+        async_db=SimpleNamespace(wrap=lambda _: collection),
+    )
+    relay = Relay(bot, None, None)
+    relay.init_cache(disk_path=str(tmp_path / "blobs.sqlite3"))
+    await relay.cache_blob(blob(0))
+
+    urls = [blob(n)["_id"] for n in range(4)]
+    assert await relay.find_blobs_by_urls(urls) == {
+        blob(0)["_id"]: blob(0)["blob_url"],
+        blob(1)["_id"]: blob(1)["blob_url"],
+        blob(2)["_id"]: blob(2)["blob_url"],
+        blob(3)["_id"]: None,
+    }
+
+    # Only the cache misses were queried, in one go
+    assert queries == [{"_id": {"$in": urls[1:]}}]
+    assert blob(2)["_id"] in relay.disk_cache
+
+    # Now served from the cache
+    await relay.find_blobs_by_urls(urls[:3])
+    assert len(queries) == 1
@@ -0,0 +1,310 @@
+import asyncio
+from hashlib import sha256
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import ClientConnectionError, ClientSession, FormData, web
+from aiohttp.test_utils import TestServer
+
+from comrade.core.configuration import RELAY_MAX_BLOB_SIZE
+from comrade.core.relay_system import BlobTooLargeError, Relay
+from comrade.core.relay_system.upload_batcher import (
+    BlobUploadBatcher,
+    StreamReplayError,
+)
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+class FakeContent:
+    """
+    Stand-in for an aiohttp StreamReader, handing out small chunks.
+    """
+
+    def __init__(self, data: bytes, chunk_size: int = 1000):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.pos = 0
+
+    async def read(self, n: int) -> bytes:
+        n = min(n, self.chunk_size)
+        chunk = self.data[self.pos : self.pos + n]
+        self.pos += len(chunk)
+        return chunk
+
+    async def iter_chunked(self, n: int):
+        while chunk := await self.read(n):
+            yield chunk
+
+
+class FakeHTTP:
+    """
+    Consumes the multipart form, as Discord would.
+    """
+
+    def __init__(self):
+        self.received = b""
+
+    async def create_message(self, form: FormData, channel_id: int) -> dict:
+        class Writer:
+            async def write(_, data: bytes):
+                self.received += bytes(data)
+
+        await form().write(Writer())
+        return {
+            "id": "2",
+            "attachments": [{"url": "https://cdn.discordapp.com/blob.png"}],
+        }
+
+
+class ServerHTTP:
+    """
+    Posts the multipart form to a real server, resending it
+    after a 429 as interactions.py does.
+    """
+
+    def __init__(self, session: ClientSession, url):
+        self.session = session
+        self.url = url
+
+    async def create_message(self, form: FormData, channel_id: int) -> dict:
+        for _ in range(2):
+            async with self.session.post(self.url, data=form) as response:
+                if response.status == 429:
+                    continue
+                return await response.json()
+
+
+class FakeChannel:
+    """
+    Records the files of each sent message.
+    """
+
+    id = 1
+
+    def __init__(self):
+        self._client = SimpleNamespace(http=FakeHTTP())
+        self.sent: list[list[str]] = []
+
+    async def send(self, files: list) -> SimpleNamespace:
+        self.sent.append([file.file_name for file in files])
+        return SimpleNamespace(
+            id=len(self.sent),
+            attachments=[
+                SimpleNamespace(url=f"https://cdn.discordapp.com/{i}.png")
+                for i in range(len(files))
+            ],
+        )
+
+
+class FakeCollection:
+    name = "blobStorage"
+
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query: dict) -> dict | None:
+        for doc in self.docs.values():
+            if all(doc.get(k) == v for k, v in query.items()):
+                return doc
+        return None
+
+    async def insert_one(self, document: dict):
+        self.docs[document["_id"]] = document
+
+    async def insert_many(self, documents: list[dict], ordered: bool):
+        self.docs |= {doc["_id"]: doc for doc in documents}
+
+
+@pytest.fixture
+async def blob_server():
+    """
+    Local server serving blobs of any size at /blob?size=...,
+    and accepting uploads at /upload like Discord does.
+    """
+    uploads: list[int] = []
+    rate_limited = []
+
+    async def blob(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(PNG_HEADER)
+        remaining = int(request.query["size"])
+        while remaining > 0:
+            await response.write(bytes(min(remaining, 64 * 1024)))
+            remaining -= 64 * 1024
+        return response
+
+    async def upload(request: web.Request) -> web.Response:
+        size = 0
+        reader = await request.multipart()
+        while part := await reader.next():
+            if part.name == "files[0]":
+                size = len(await part.read())
+        if rate_limited:
+            rate_limited.pop()
+            return web.json_response({"retry_after": 0}, status=429)
+        uploads.append(size)
+        return web.json_response(
+            {
+                "id": "3",
+                "attachments": [{"url": "https://cdn.discordapp.com/3.png"}],
+            }
+        )
+
+    app = web.Application(client_max_size=4 * RELAY_MAX_BLOB_SIZE)
+    app.router.add_get("/blob", blob)
+    app.router.add_post("/upload", upload)
+
+    server = TestServer(app)
+    await server.start_server()
+    server.uploads = uploads
+    server.rate_limited = rate_limited
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+def relay(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Relay:
+    # keep the default on-disk cache out of the working directory
+    monkeypatch.chdir(tmp_path)
+
+    collection = FakeCollection()
+    bot = SimpleNamespace(
+        add_listener=lambda listener: None,
+        async_db=SimpleNamespace(wrap=lambda _: collection),
+    )
+    relay = Relay(bot, None, None)
+    relay.init_cache(disk_path="")
+    relay.upload_batcher = BlobUploadBatcher(FakeChannel(), window=0.01)
+    return relay
+
+
+async def test_stream_upload(relay: Relay):
+    data = PNG_HEADER + bytes(10_000)
+    response = SimpleNamespace(content=FakeContent(data))
+
+    doc = await relay.create_blob_from_stream(
+        response, document_data={"_id": "https://example.com/page"}
+    )
+
+    # type sniffed from the first chunk
+    assert doc["filename"] == "blob.png"
+    assert doc["message_id"] == 2
+    assert doc["blob_url"] == "https://cdn.discordapp.com/blob.png"
+
+    # the whole body made it into the upload
+    received = relay.upload_batcher.channel._client.http.received
+    assert data in received
+    assert b'filename="blob.png"' in received
+    assert relay.upload_batcher.stats["streamed"] == 1
+
+    # cached, and not uploaded again
+    assert await relay.get_cached_blob("https://example.com/page") == doc
+    again = await relay.create_blob_from_stream(
+        SimpleNamespace(content=FakeContent(data)),
+        document_data={"_id": "https://example.com/page"},
+    )
+    assert again == doc
+    assert relay.upload_batcher.stats["streamed"] == 1
+
+
+async def test_stream_size_cap(relay: Relay):
+    data = PNG_HEADER + bytes(2 * RELAY_MAX_BLOB_SIZE)
+    content = FakeContent(data, chunk_size=64 * 1024)
+
+    with pytest.raises(BlobTooLargeError):
+        await relay.create_blob_from_stream(SimpleNamespace(content=content))
+
+    # aborted as soon as the limit was crossed
+    assert content.pos < len(data)
+
+
+async def test_stream_size_cap_over_http(relay: Relay, blob_server):
+    async with ClientSession() as session:
+        relay.upload_batcher.channel._client.http = ServerHTTP(
+            session, blob_server.make_url("/upload")
+        )
+        blob_url = blob_server.make_url("/blob").with_query(
+            size=2 * RELAY_MAX_BLOB_SIZE
+        )
+
+        async with session.get(blob_url) as response:
+            with pytest.raises(BlobTooLargeError):
+                await relay.create_blob_from_stream(response)
+
+        # Under the limit, the blob makes it through whole
+        async with session.get(blob_url.with_query(size=100_000)) as response:
+            doc = await relay.create_blob_from_stream(response)
+
+    assert doc["message_id"] == 3
+    # the aborted upload never completed
+    assert blob_server.uploads == [len(PNG_HEADER) + 100_000]
+
+
+async def test_stream_not_resent(relay: Relay, blob_server):
+    blob_server.rate_limited.append(True)
+
+    async with ClientSession() as session:
+        relay.upload_batcher.channel._client.http = ServerHTTP(
+            session, blob_server.make_url("/upload")
+        )
+        blob_url = blob_server.make_url("/blob").with_query(size=100_000)
+
+        async with session.get(blob_url) as response:
+            with pytest.raises(ClientConnectionError) as e:
+                await relay.create_blob_from_stream(response)
+
+    # rather than uploading an empty attachment
+    assert isinstance(e.value.__cause__, StreamReplayError)
+    assert blob_server.uploads == []
+
+
+async def test_bytes_size_cap(relay: Relay):
+    with pytest.raises(BlobTooLargeError):
+        await relay.create_blob_from_bytes(bytes(RELAY_MAX_BLOB_SIZE + 1))
+
+
+async def test_content_deduplication(relay: Relay):
+    data = PNG_HEADER + bytes(100)
+    channel = relay.upload_batcher.channel
+
+    first = await relay.create_blob_from_bytes(
+        data, document_data={"_id": "https://i3.example.com/1.png"}
+    )
+    second = await relay.create_blob_from_bytes(
+        data, document_data={"_id": "https://i5.example.com/1.png"}
+    )
+
+    # Uploaded once; both source URLs point at the same attachment
+    assert len(channel.sent) == 1
+    assert second["_id"] == "https://i5.example.com/1.png"
+    assert second["blob_url"] == first["blob_url"]
+    assert second["content_hash"] == first["content_hash"]
+
+    # Without a source URL, there is no new document to key
+    assert await relay.create_blob_from_bytes(data) == first
+    assert len(relay._async_collection().docs) == 2
+
+    # Identical blobs within one batch also share an attachment
+    docs = await asyncio.gather(
+        *(
+            relay.create_blob_from_bytes(
+                PNG_HEADER + bytes(200),
+                document_data={"_id": f"https://example.com/{n}.png"},
+            )
+            for n in range(3)
+        )
+    )
+    assert len(channel.sent[1]) == 1
+    assert len({doc["blob_url"] for doc in docs}) == 1
+    assert relay.upload_batcher.stats["deduplicated"] == 2
+
+
+async def test_stream_content_hash(relay: Relay):
+    data = PNG_HEADER + bytes(10_000)
+    doc = await relay.create_blob_from_stream(
+        SimpleNamespace(content=FakeContent(data))
+    )
+    assert doc["content_hash"] == sha256(data).hexdigest()
@@ -0,0 +1,173 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from comrade.core.relay_system.upload_batcher import BlobUploadBatcher
+
+
+class FakeChannel:
+    """
+    Records sent messages, attaching a CDN URL to each file.
+    """
+
+    id = 1
+
+    def __init__(self):
+        self.sent: list[list[str]] = []
+
+    async def send(self, files: list) -> SimpleNamespace:
+        await asyncio.sleep(0)
+        self.sent.append([file.file_name for file in files])
+        return SimpleNamespace(
+            id=len(self.sent),
+            attachments=[
+                SimpleNamespace(url=f"https://cdn.discordapp.com/{f.file_name}")
+                for f in files
+            ],
+        )
+
+
+class FakeCollection:
+    """
+    Stand-in for an AsyncCollection, enforcing unique _ids.
+    """
+
+    def __init__(self, name: str = "blobStorage"):
+        self.name = name
+        self.docs: dict[str, dict] = {}
+        self.insert_calls = 0
+
+    async def insert_many(self, documents: list[dict], ordered: bool):
+        self.insert_calls += 1
+        write_errors = []
+        for idx, doc in enumerate(documents):
+            if doc["_id"] in self.docs:
+                write_errors.append(
+                    {"index": idx, "code": 11000, "errmsg": "duplicate"}
+                )
+            else:
+                self.docs[doc["_id"]] = doc
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors})
+
+    async def find(self, query: dict) -> list[dict]:
+        return [self.docs[_id] for _id in query["_id"]["$in"]]
+
+
+async def test_batches_uploads():
+    channel = FakeChannel()
+    collection = FakeCollection()
+    batcher = BlobUploadBatcher(channel, window=0.01)
+
+    docs = await asyncio.gather(
+        *(
+            batcher.upload(b"data", f"{n}.png", collection, {"_id": str(n)})
+            for n in range(3)
+        )
+    )
+
+    # One message, one insert, but each caller gets its own document
+    assert channel.sent == [["0.png", "1.png", "2.png"]]
+    assert collection.insert_calls == 1
+    assert [doc["_id"] for doc in docs] == ["0", "1", "2"]
+    assert docs[1]["blob_url"] == "https://cdn.discordapp.com/1.png"
+    assert all(doc["message_id"] == 1 for doc in docs)
+    assert batcher.stats["messages"] == 1
+    assert batcher.stats["blobs"] == 3
+
+
+async def test_batch_limits():
+    channel = FakeChannel()
+    collection = FakeCollection()
+
+    # At most 10 attachments per message
+    batcher = BlobUploadBatcher(channel, window=0.01)
+    await asyncio.gather(
+        *(batcher.upload(b"x", f"{n}.png", collection) for n in range(12))
+    )
+    assert [len(files) for files in channel.sent] == [10, 2]
+
+    # At most 20 bytes per message
+    channel.sent.clear()
+    batcher = BlobUploadBatcher(channel, window=0.01, max_bytes=20)
+    await asyncio.gather(
+        *(batcher.upload(b"x" * 5, f"{n}.png", collection) for n in range(9))
+    )
+    assert [len(files) for files in channel.sent] == [4, 4, 1]
+
+
+async def test_flush_now():
+    channel = FakeChannel()
+    batcher = BlobUploadBatcher(channel, window=10)
+
+    # Would otherwise wait 10 seconds for more blobs
+    doc = await asyncio.wait_for(
+        batcher.upload(b"data", "a.png", FakeCollection(), flush_now=True),
+        timeout=1,
+    )
+    assert doc["filename"] == "a.png"
+
+
+async def test_duplicates_return_existing():
+    channel = FakeChannel()
+    collection = FakeCollection()
+    existing = {"_id": "0", "blob_url": "https://cdn.discordapp.com/old.png"}
+    collection.docs["0"] = existing
+
+    batcher = BlobUploadBatcher(channel, window=0.01)
+    docs = await asyncio.gather(
+        batcher.upload(b"data", "0.png", collection, {"_id": "0"}),
+        batcher.upload(b"data", "1.png", collection, {"_id": "1"}),
+    )
+
+    assert docs[0] == existing
+    assert docs[1]["_id"] == "1"
+
+
+async def test_send_failure_propagates():
+    class BrokenChannel(FakeChannel):
+        async def send(self, files: list):
+            raise RuntimeError("discord is down")
+
+    batcher = BlobUploadBatcher(BrokenChannel(), window=0.01)
+
+    with pytest.raises(RuntimeError):
+        await batcher.upload(b"data", "a.png", FakeCollection())
+
+
+async def test_missing_attachments_fail():
+    class LossyChannel(FakeChannel):
+        async def send(self, files: list) -> SimpleNamespace:
+            msg = await super().send(files)
+            msg.attachments = msg.attachments[:1]
+            return msg
+
+    batcher = BlobUploadBatcher(LossyChannel(), window=0.01)
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            *(
+                batcher.upload(b"x", f"{n}.png", FakeCollection())
+                for n in range(2)
+            ),
+            return_exceptions=True,
+        ),
+        timeout=1,
+    )
+
+    # Neither caller is left hanging, nor given the wrong attachment
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_vanished_duplicate_fails():
+    class ForgetfulCollection(FakeCollection):
+        async def find(self, query: dict) -> list[dict]:
+            return []
+
+    collection = ForgetfulCollection()
+    collection.docs["0"] = {"_id": "0"}
+
+    batcher = BlobUploadBatcher(FakeChannel(), window=0.01)
+    with pytest.raises(RuntimeError):
+        await batcher.upload(b"data", "0.png", collection, {"_id": "0"})
@@ -1,10 +1,16 @@
+import asyncio
+
 import booru
+import orjson
 import pytest
 from aiohttp import ClientSession
 
 from comrade.lib.booru_ext import (
     BOORUS,
+    BooruClient,
+    BooruPost,
     BooruSession,
+    TagCache,
     autocomplete_query,
 )
 
@@ -14,6 +20,173 @@ def test_booru_dict():
     assert BOORUS["gelbooru"] == booru.Gelbooru
 
 
+class FakeTagBooru:
+    """
+    Stands in for a booru, suggesting tags from a fixed list.
+    """
+
+    def __init__(self, tags: list[str], page_size: int = 10):
+        self.tags = tags
+        self.page_size = page_size
+        self.lookups = []
+
+    async def find_tags(self, query: str) -> str:
+        self.lookups.append(query)
+        matches = [t for t in self.tags if t.startswith(query)]
+        return orjson.dumps(matches[: self.page_size]).decode()
+
+
+async def test_autocomplete_tag_cache():
+    fake_booru = FakeTagBooru(
+        [
+            "tsushima_yoshiko",
+            "tsushima_(kancolle)",
+            "tsushima_yoshiko_(cosplay)",
+        ]
+    )
+    tag_cache = TagCache()
+
+    suggestions = await autocomplete_query(
+        "1girl tsushima_", fake_booru, tag_cache=tag_cache
+    )
+    assert suggestions[0] == "1girl tsushima_yoshiko"
+
+    # Longer prefixes are answered from the cached tags
+    suggestions = await autocomplete_query(
+        "1girl tsushima_y", fake_booru, tag_cache=tag_cache
+    )
+    assert suggestions == [
+        "1girl tsushima_yoshiko",
+        "1girl tsushima_yoshiko_(cosplay)",
+    ]
+    assert await autocomplete_query(
+        "tsushima_", fake_booru, tag_cache=tag_cache
+    ) == [
+        "tsushima_yoshiko",
+        "tsushima_(kancolle)",
+        "tsushima_yoshiko_(cosplay)",
+    ]
+
+    assert fake_booru.lookups == ["tsushima_"]
+    assert tag_cache.stats == {"miss": 1, "extended": 1, "hit": 1}
+    assert tag_cache.hit_rate == 2 / 3
+
+
+async def test_booru_client_limits():
+    in_flight = max_in_flight = 0
+
+    class SlowBooru:
+        async def find_tags(self, query: str) -> str:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return orjson.dumps([query]).decode()
+
+    client = BooruClient(SlowBooru, rate=0, concurrency=2)
+    assert client.name == "SlowBooru"
+    assert client.supports_tag_search
+
+    results = await asyncio.gather(
+        *(client.find_tags(f"tag_{i}") for i in range(6))
+    )
+
+    assert results[0] == '["tag_0"]'
+    assert max_in_flight == 2
+
+
+class FakePostBooru:
+    """
+    Stands in for a booru, with 2 pages of posts.
+    """
+
+    def __init__(self, page_size: int):
+        self.page_size = page_size
+        self.searches = []
+
+    async def search(self, query: str, page: int, **kwargs) -> str:
+        self.searches.append(page)
+        await asyncio.sleep(0)
+        if page > 2:
+            raise Exception("Failed to get data: no results")
+        return orjson.dumps(
+            [{"id": f"{page}-{i}"} for i in range(self.page_size)]
+        ).decode()
+
+
+def test_booru_post_from_json():
+    danbooru_post = {
+        "id": 6223033,
+        "file_url": "https://cdn.donmai.us/original/ee/3a/ee3a.png",
+        "tag_string": ["kurosawa_dia", "love_live!_sunshine!!"],
+        "md5": "ee3a33cc0cf29e9956f2c2f5a35d6ca8",
+        "rating": "g",
+    }
+    post = BooruPost.from_json(danbooru_post)
+
+    assert post.tags == "kurosawa_dia love_live!_sunshine!!"
+    assert post.id == 6223033
+    assert post.score is None
+    assert not hasattr(post, "__dict__")
+
+
+async def test_booru_session_read_ahead():
+    fake_booru = FakePostBooru(page_size=4)
+    session = BooruSession(fake_booru, "1girl", read_ahead=2)
+
+    assert await session.init_posts(1, limit_count=4)
+    assert await session.advance_post()
+    assert fake_booru.searches == [1]
+
+    # 2 posts from the end, the next page starts loading
+    assert await session.advance_post()
+    await asyncio.sleep(0)
+    assert fake_booru.searches == [1, 2]
+
+    assert await session.advance_post()
+    assert await session.advance_post()
+    assert (session.page_id, session.post_id) == (2, 0)
+    assert session._posts[0].id == "2-0"
+    assert fake_booru.searches == [1, 2]
+
+    # No more pages after that
+    for _ in range(3):
+        assert await session.advance_post()
+    assert not await session.advance_post()
+    assert fake_booru.searches == [1, 2, 3]
+
+
+async def test_booru_session_short_page():
+    fake_booru = FakePostBooru(page_size=4)
+    session = BooruSession(fake_booru, "1girl", read_ahead=2)
+
+    # Fewer posts than asked for: there is no next page to read ahead
+    assert await session.init_posts(1, limit_count=5)
+    for _ in range(3):
+        assert await session.advance_post()
+        await asyncio.sleep(0)
+    assert fake_booru.searches == [1]
+
+
+def test_tag_cache_incomplete_page():
+    tag_cache = TagCache()
+    tags = [f"tag_{i}" for i in range(10)]
+    tag_cache.put("tag_", tags, complete=False)
+
+    # Enough of the most popular tags are known
+    assert tag_cache.get("tag_", 5) == tags[:5]
+    assert tag_cache.get("tag_1", 1) == ["tag_1"]
+
+    # tag_10, tag_11, ... may be missing from the page
+    assert tag_cache.get("tag_1", 5) is None
+    assert tag_cache.get("other", 5) is None
+
+    # Without time to ask the booru, whatever is cached will do
+    assert tag_cache.best_effort("tag_1", 5) == ["tag_1"]
+    assert tag_cache.best_effort("other", 5) == []
+
+
 @pytest.mark.online
 async def test_booru_session_gelbooru(http_session: ClientSession):
     """
@@ -0,0 +1,46 @@
+from comrade.lib.caching import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expiry():
+    clock = FakeClock()
+    cache = TTLCache(max_size=4, ttl=10, clock=clock)
+
+    cache.put("a", 1)
+    cache.put("b", 2, ttl=30)
+    assert cache.get("a") == 1
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    assert cache.stats["hit"] == 2
+    assert cache.stats["expired"] == 1
+    assert len(cache) == 1
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_size=2, ttl=10)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats["evicted"] == 1
+
+
+def test_ttl_cache_disabled():
+    cache = TTLCache(max_size=0, ttl=10)
+    cache.put("a", 1)
+    assert cache.get("a") is None
@@ -0,0 +1,351 @@
+import asyncio
+import gc
+from collections import Counter
+from functools import partial
+from time import monotonic
+
+import pytest
+
+from comrade.lib.concurrency import (
+    Debouncer,
+    OffloadPool,
+    PrefetchScheduler,
+    RateLimiter,
+    SingleFlight,
+    Superseded,
+)
+
+
+async def test_single_flight_coalesces():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "done"
+
+    results = await asyncio.gather(
+        *(flights.run("key", work) for _ in range(5))
+    )
+
+    assert results == ["done"] * 5
+    assert calls == 1
+    assert flights.stats["executed"] == 1
+    assert flights.stats["coalesced"] == 4
+
+    # Once finished, the next call does the work again
+    await asyncio.sleep(0)
+    assert not flights.in_flight
+    await flights.run("key", work)
+    assert calls == 2
+
+
+async def test_single_flight_separate_keys():
+    flights = SingleFlight()
+
+    async def work(n: int) -> int:
+        await asyncio.sleep(0.01)
+        return n
+
+    results = await asyncio.gather(
+        flights.run(1, lambda: work(1)), flights.run(2, lambda: work(2))
+    )
+
+    assert results == [1, 2]
+    assert flights.stats["coalesced"] == 0
+
+
+async def test_single_flight_propagates_errors():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(
+        flights.run("key", work),
+        flights.run("key", work),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+async def test_single_flight_cancelled_caller():
+    """
+    Cancelling the first caller must not cancel the shared work.
+    """
+    flights = SingleFlight()
+
+    async def work() -> str:
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.create_task(flights.run("key", work))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flights.run("key", work))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    assert await second == "done"
+
+
+async def test_single_flight_last_caller_cancelled():
+    """
+    Cancelling the only caller stops the work, before the
+    caller's cancellation completes.
+    """
+    flights = SingleFlight()
+    events = []
+
+    async def work() -> str:
+        try:
+            await asyncio.sleep(10)
+        finally:
+            await asyncio.sleep(0.01)
+            events.append("stopped")
+
+    caller = asyncio.create_task(flights.run("key", work))
+    await asyncio.sleep(0)
+
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+
+    assert events == ["stopped"]
+    assert not flights.in_flight and not flights.waiters
+
+
+async def test_debouncer_latest_only():
+    debouncer = Debouncer(delay=0.01)
+    started = []
+
+    async def work(keystroke: str) -> str:
+        started.append(keystroke)
+        await asyncio.sleep(0.01)
+        return keystroke
+
+    # A burst of keystrokes, faster than the delay
+    calls = []
+    for keystroke in ["t", "ts", "tsu"]:
+        calls.append(
+            asyncio.create_task(debouncer.run("user", partial(work, keystroke)))
+        )
+        await asyncio.sleep(0)
+
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert isinstance(results[0], Superseded)
+    assert isinstance(results[1], Superseded)
+    assert results[2] == "tsu"
+    assert started == ["tsu"]
+    assert debouncer.stats == {"superseded": 2, "executed": 1}
+    assert not debouncer.in_flight
+
+
+async def test_debouncer_timeout():
+    debouncer = Debouncer(delay=0)
+    finished = asyncio.Event()
+
+    async def work() -> str:
+        await asyncio.sleep(0.02)
+        finished.set()
+        return "late"
+
+    with pytest.raises(asyncio.TimeoutError):
+        await debouncer.run("user", work, timeout=0.01)
+
+    # The work still finishes in the background
+    await asyncio.wait_for(finished.wait(), 1)
+    assert debouncer.stats["timed_out"] == 1
+
+    # Until a newer call cancels it
+    running = asyncio.create_task(debouncer.run("user", work))
+    await asyncio.sleep(0.005)
+    debouncer.cancel("user")
+    with pytest.raises(Superseded):
+        await running
+
+
+async def test_debouncer_abandoned_failure():
+    debouncer = Debouncer(delay=0)
+    unhandled = []
+    asyncio.get_running_loop().set_exception_handler(
+        lambda loop, context: unhandled.append(context)
+    )
+
+    async def work():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("booru is down")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await debouncer.run("user", work, timeout=0.01)
+
+    # Nobody awaits the work anymore, yet its failure isn't unhandled
+    while debouncer.in_flight:
+        await asyncio.sleep(0.01)
+    gc.collect()
+    assert unhandled == []
+
+
+async def test_rate_limiter():
+    limiter = RateLimiter(rate=100, burst=2)
+
+    start = monotonic()
+    for _ in range(5):
+        await limiter.acquire()
+    elapsed = monotonic() - start
+
+    # The burst goes through at once, then 1 token every 10 ms
+    assert elapsed >= 0.025
+    assert limiter.stats == {"acquired": 5, "delayed": 3}
+
+
+async def test_prefetch_scheduler_priority():
+    scheduler = PrefetchScheduler(num_workers=1)
+    order = []
+
+    async def work(n: int):
+        order.append(n)
+
+    # The single worker picks up the first job right away;
+    # the rest run in order of priority
+    jobs = [
+        scheduler.submit("owner", n, "https://example.com", partial(work, n), p)
+        for n, p in ((0, 0), (1, 3), (2, 1), (3, 2))
+    ]
+    await asyncio.gather(*(job.future for job in jobs))
+
+    assert order == [0, 2, 3, 1]
+    assert scheduler.stats["completed"] == 4
+    await scheduler.close()
+
+
+async def test_prefetch_scheduler_limits():
+    scheduler = PrefetchScheduler(num_workers=4, per_host_limit=2)
+    running = Counter()
+    peak = Counter()
+
+    async def work(host: str):
+        running[host] += 1
+        peak[host] = max(peak[host], running[host])
+        await asyncio.sleep(0.01)
+        running[host] -= 1
+
+    jobs = [
+        scheduler.submit(
+            "owner", (host, n), f"https://{host}/{n}", partial(work, host)
+        )
+        for host in ("a.com", "b.com")
+        for n in range(4)
+    ]
+    await asyncio.gather(*(job.future for job in jobs))
+
+    assert peak == {"a.com": 2, "b.com": 2}
+    await scheduler.close()
+
+
+async def test_prefetch_scheduler_dedup_and_cancel():
+    scheduler = PrefetchScheduler(num_workers=1)
+    started = []
+
+    async def work(n: int):
+        started.append(n)
+        await asyncio.sleep(0.05)
+
+    jobs = {
+        n: scheduler.submit("owner", n, "https://example.com", partial(work, n))
+        for n in range(3)
+    }
+
+    # Already queued
+    assert scheduler.submit("owner", 1, "", partial(work, 1)) is jobs[1]
+
+    await asyncio.sleep(0.01)
+    assert started == [0]
+
+    # Cancel the running job and one queued job, keeping the other
+    assert scheduler.cancel("owner", keep=[2]) == 2
+    assert jobs[0].future.cancelled()
+    assert jobs[1].future.cancelled()
+
+    await jobs[2].future
+    assert started == [0, 2]
+    assert scheduler.stats["cancelled"] == 2
+    await scheduler.close()
+
+
+async def test_prefetch_scheduler_cancel_holds_host():
+    """
+    A cancelled job running shared (shielded) work keeps its host slot
+    until that work has stopped.
+    """
+    scheduler = PrefetchScheduler(num_workers=2, per_host_limit=1)
+    flights = SingleFlight()
+    active = 0
+    peak = 0
+
+    async def download():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    first = scheduler.submit(
+        "reader",
+        0,
+        "https://example.com/0",
+        lambda: flights.run(0, download),
+    )
+    await asyncio.sleep(0.01)
+    second = scheduler.submit(
+        "other",
+        1,
+        "https://example.com/1",
+        lambda: flights.run(1, download),
+    )
+
+    scheduler.cancel("reader")
+    await second.future
+
+    assert first.future.cancelled()
+    assert peak == 1
+    await scheduler.close()
+
+
+async def test_prefetch_scheduler_failure():
+    scheduler = PrefetchScheduler()
+
+    async def work():
+        raise ValueError("failed")
+
+    job = scheduler.submit("owner", 0, "https://example.com", work)
+
+    with pytest.raises(ValueError):
+        await job.future
+    assert scheduler.stats["failed"] == 1
+    await scheduler.close()
+
+
+@pytest.mark.parametrize("kind", ("thread", "process", "inline"))
+async def test_offload_pool(kind: str):
+    pool = OffloadPool(kind, max_workers=1)
+
+    assert await pool.run(divmod, 7, 2) == (3, 1)
+    with pytest.raises(ZeroDivisionError):
+        await pool.run(divmod, 1, 0)
+
+    # Would otherwise never resolve
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(pool.run(next, iter(())), 5)
+
+    pool.shutdown()
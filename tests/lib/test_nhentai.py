@@ -1,23 +1,45 @@
+import asyncio
+from pathlib import Path
+
 import aiohttp
 import pytest
+from pymongo.errors import OperationFailure
 
+from comrade.lib.concurrency import OffloadPool
 from comrade.lib.nhentai import search as nh_search
+from comrade.lib.nhentai.gallery_cache import GalleryCache
+from comrade.lib.nhentai.health import SourceHealthTracker
+from comrade.lib.nhentai.mirror import MirrorProgress, MirrorStatus
 from comrade.lib.nhentai.page_parser import (
+    gallery_from_html,
     parse_gallery_from_page,
     parse_maximum_search_pages,
     parse_search_result_from_page,
+    raise_for_gallery_page,
+    raise_for_search_page,
+    search_page_from_html,
 )
 from comrade.lib.nhentai.proxies import (
     GoogleTranslateProxy,
     NHentaiSource,
     NHentaiWebProxy,
 )
-from comrade.lib.nhentai.search import get_gallery_page, get_search_page
+from comrade.lib.nhentai.search import (
+    get_gallery,
+    get_search_results,
+    race_sources,
+)
+from comrade.lib.nhentai.search_cache import SearchCache
 from comrade.lib.nhentai.structures import (
     InvalidProxyError,
+    NHentaiGallery,
     NHentaiGallerySession,
+    NHentaiSearchPage,
+    NHentaiSearchResult,
     NHentaiSortOrder,
+    NHentaiWebPage,
     PageParsingError,
+    encode_page_extensions,
 )
 from comrade.lib.nhentai.text_filters import filter_title_text
 
@@ -119,21 +141,16 @@ async def test_gallery_acquisition_nominal(
     """
     gallery_id = 185217
 
-    page = await get_gallery_page(gallery_id, http_session)
-
-    assert page.provider == "nhentai.to Mirror"
+    gallery = await get_gallery(gallery_id, http_session)
 
-    gallery = parse_gallery_from_page(page)
+    assert gallery.provider == "nhentai.to Mirror"
 
     assert gallery.gallery_id == gallery_id
     assert (
         gallery.title == "(C91) [HitenKei (Hiten)] R.E.I.N.A [English] [Scrubs]"
     )
 
-    assert (
-        gallery.image_list[0]
-        == "https://i3.nhentai.net/galleries/1019423/1.jpg"
-    )
+    assert gallery[0] == "https://i3.nhentai.net/galleries/1019423/1.jpg"
 
     assert len(gallery) == 28
 
@@ -170,18 +187,16 @@ async def test_not_present_anywhere(http_session: aiohttp.ClientSession):
     gallery_id = -1
 
     with pytest.raises(PageParsingError):
-        await get_gallery_page(gallery_id, http_session)
+        await get_gallery(gallery_id, http_session)
 
 
 @pytest.mark.online
 async def test_gallery_not_on_nhentai_to(http_session: aiohttp.ClientSession):
     gallery_id = 444797
 
-    page = await get_gallery_page(gallery_id, http_session)
-
-    assert page.provider != "nhentai.to Mirror"
+    gallery = await get_gallery(gallery_id, http_session)
 
-    gallery = parse_gallery_from_page(page)
+    assert gallery.provider != "nhentai.to Mirror"
 
     assert gallery.gallery_id == gallery_id
     assert (
@@ -190,10 +205,7 @@ async def test_gallery_not_on_nhentai_to(http_session: aiohttp.ClientSession):
         " - The Girls' Dormitory [English] [Yuzuru Katsuragi] [Digital]"
     )
 
-    assert (
-        gallery.image_list[0]
-        == "https://i3.nhentai.net/galleries/2485699/1.jpg"
-    )
+    assert gallery[0] == "https://i3.nhentai.net/galleries/2485699/1.jpg"
 
     assert len(gallery) == 313
 
@@ -213,14 +225,11 @@ async def test_search_nominal(http_session: aiohttp.ClientSession, query: str):
     """
     Based on user cases that resulted in bugs previously
     """
-    page = await get_search_page(
+    search_result, num_pages = await get_search_results(
         query, 1, http_session, NHentaiSortOrder.RECENT
     )
-    num_pages = parse_maximum_search_pages(page)
     assert num_pages > 0
 
-    search_result = parse_search_result_from_page(page)
-
     # access all @property to ensure that they are not broken
     assert search_result.short_titles
     assert search_result.title_blocks
@@ -235,16 +244,13 @@ async def test_search_last_page(http_session: aiohttp.ClientSession):
     """
     search_query = "alp love live"
 
-    first_page = await get_search_page(
+    _, num_pages = await get_search_results(
         search_query, 1, http_session, NHentaiSortOrder.POPULAR_ALL_TIME
     )
 
-    num_pages = parse_maximum_search_pages(first_page)
-
-    last_page = await get_search_page(
+    search_result, _ = await get_search_results(
         search_query, num_pages, http_session, NHentaiSortOrder.POPULAR_ALL_TIME
     )
-    search_result = parse_search_result_from_page(last_page)
 
     # access all @property to ensure that they are not broken
     assert search_result.short_titles
@@ -256,7 +262,7 @@ async def test_search_negative(http_session: aiohttp.ClientSession):
     search_query = "this should not exist"
 
     with pytest.raises(PageParsingError):
-        await get_search_page(
+        await get_search_results(
             search_query, 1, http_session, NHentaiSortOrder.RECENT
         )
 
@@ -275,7 +281,7 @@ async def test_bad_proxy_gallery(
     with monkeypatch.context() as m:
         m.setattr(nh_search, "ORDERED_SOURCES", blocked_sources)
         with pytest.raises(InvalidProxyError):
-            await get_gallery_page(gallery_id, http_session)
+            await get_gallery(gallery_id, http_session)
 
 
 @pytest.mark.online
@@ -291,6 +297,388 @@ async def test_bad_proxy_search(
     with monkeypatch.context() as m:
         m.setattr(nh_search, "ORDERED_SOURCES", blocked_sources)
         with pytest.raises(InvalidProxyError):
-            await get_search_page(
+            await get_search_results(
                 "alp love live", 1, http_session, NHentaiSortOrder.RECENT
             )
+
+
+def test_page_turn_interval():
+    session = NHentaiGallerySession(None)
+
+    session.record_page_turn(0)
+    assert session.turn_interval is None
+
+    session.record_page_turn(10)
+    assert session.turn_interval == 10
+
+    # Smoothed towards the latest interval
+    session.record_page_turn(12)
+    assert 2 < session.turn_interval < 10
+
+    # Long breaks are capped
+    session.record_page_turn(10_000)
+    assert session.turn_interval < 300
+
+
+def fake_fetch(delays: dict[str, float], valid: set[str]):
+    """
+    Fetch function for race_sources, where each source answers after
+    a delay with either a valid or a blocked (invalid) page.
+    """
+
+    async def fetch(source: NHentaiSource) -> str:
+        await asyncio.sleep(delays[source.name])
+        return "valid" if source.name in valid else "blocked"
+
+    return fetch
+
+
+def fake_parse(provider: str, html: str) -> NHentaiWebPage:
+    if "blocked" in html:
+        raise InvalidProxyError("blocked")
+    return NHentaiWebPage(provider, html)
+
+
+@pytest.fixture
+def health() -> SourceHealthTracker:
+    """
+    Fresh health tracker, so that tests don't reorder each other's sources
+    """
+    return SourceHealthTracker(failure_threshold=2, cooldown=60)
+
+
+@pytest.mark.parametrize(
+    "hedge_delay, expected_winner",
+    (
+        (0.01, "fast"),  # slow source gets hedged
+        (-1, "slow"),  # no hedging: the preferred source is awaited
+    ),
+)
+async def test_race_sources_hedging(
+    hedge_delay: float, expected_winner: str, health: SourceHealthTracker
+):
+    sources = [NHentaiSource("slow", ""), NHentaiSource("fast", "")]
+    fetch = fake_fetch({"slow": 0.2, "fast": 0.01}, {"slow", "fast"})
+
+    page = await race_sources(sources, fetch, fake_parse, hedge_delay, health)
+    assert page.provider == expected_winner
+
+
+async def test_race_sources_failover(health: SourceHealthTracker):
+    sources = [NHentaiSource("blocked", ""), NHentaiSource("valid", "")]
+    fetch = fake_fetch({"blocked": 0, "valid": 0}, {"valid"})
+
+    # The failed source is replaced right away, without waiting to hedge
+    page = await asyncio.wait_for(
+        race_sources(sources, fetch, fake_parse, 10, health), 1
+    )
+    assert page.provider == "valid"
+
+
+async def test_race_sources_timeout(health: SourceHealthTracker):
+    sources = [NHentaiSource("hangs", "", timeout=0.01)]
+    fetch = fake_fetch({"hangs": 10}, {"hangs"})
+
+    with pytest.raises(InvalidProxyError):
+        await race_sources(sources, fetch, fake_parse, -1, health)
+
+    assert health[sources[0]].errors["InvalidProxyError"] == 1
+
+
+async def test_race_sources_prefers_healthy(health: SourceHealthTracker):
+    sources = [NHentaiSource("blocked", ""), NHentaiSource("valid", "")]
+    fetch = fake_fetch({"blocked": 0, "valid": 0}, {"valid"})
+
+    await race_sources(sources, fetch, fake_parse, -1, health)
+    assert health.order(sources) == sources[::-1]
+
+    # The blocked source is no longer tried first
+    await race_sources(sources, fetch, fake_parse, -1, health)
+    assert health[sources[0]].errors["InvalidProxyError"] == 1
+    assert health[sources[1]].success_rate == 1
+
+
+@pytest.mark.parametrize("hedge_delay", (-1, 10))
+async def test_race_sources_malformed_page(
+    hedge_delay: float, health: SourceHealthTracker
+):
+    html = (FIXTURES / "nhentai_gallery.html").read_text()
+    malformed = html.replace('<a href="/g/185217/1/">', "<span>", 1)
+    sources = [NHentaiSource("malformed", ""), NHentaiSource("valid", "")]
+
+    async def fetch(source: NHentaiSource) -> str:
+        return malformed if source.name == "malformed" else html
+
+    # The source serving a page the parser chokes on is failed over
+    gallery = await asyncio.wait_for(
+        race_sources(sources, fetch, gallery_from_html, hedge_delay, health),
+        5,
+    )
+    assert gallery.provider == "valid"
+    assert health[sources[0]].errors["InvalidProxyError"] == 1
+
+
+def test_source_health_ordering(health: SourceHealthTracker):
+    slow, fast, unknown, missing = (
+        NHentaiSource(name, "") for name in ("slow", "fast", "unknown", "404")
+    )
+    health.record_success(slow, 3.0)
+    health.record_success(fast, 0.2)
+
+    # A page which doesn't exist still counts as a working source
+    health.record_failure(missing, PageParsingError("no gallery"), 0.5)
+    assert health[missing].success_rate == 1
+    assert health[missing].errors["PageParsingError"] == 1
+
+    assert health.order([slow, unknown, fast, missing]) == [
+        fast,
+        missing,
+        unknown,
+        slow,
+    ]
+
+    # A success resets the breaker
+    for _ in range(2):
+        health.record_failure(fast, InvalidProxyError("blocked"), 0.1)
+    assert health[fast].in_cooldown()
+    health.record_success(fast, 0.2)
+    assert not health[fast].in_cooldown()
+
+
+async def test_gallery_cache_memory():
+    cache = GalleryCache(max_size=2, ttl=60)
+    gallery = NHentaiGallery(
+        185217, "title", 1019423, encode_page_extensions(["jpg"]), [], "test"
+    )
+
+    assert await cache.get(185217) is None
+    await cache.put(gallery)
+    assert await cache.get(185217) is gallery
+    assert cache.memory.stats["hit"] == 1
+
+
+async def test_gallery_cache_index_conflict():
+    class ConflictingCollection:
+        def __init__(self):
+            self.index_attempts = 0
+            self.docs = {}
+
+        async def create_index(self, key: str, expireAfterSeconds: int):
+            self.index_attempts += 1
+            raise OperationFailure("IndexOptionsConflict", code=85)
+
+        async def update_one(self, query: dict, update: dict, upsert: bool):
+            self.docs[query["_id"]] = update["$set"]
+
+    collection = ConflictingCollection()
+    cache = GalleryCache(ttl=60, collection=collection)
+
+    for gallery_id in (1, 2):
+        await cache.put(NHentaiGallery(gallery_id, "title", 1, b"", [], "test"))
+
+    # Galleries are still stored, and the index isn't retried on every put
+    assert set(collection.docs) == {1, 2}
+    assert collection.index_attempts == 1
+
+
+def test_search_cache_ttl_by_sort_order():
+    cache = SearchCache(
+        max_size=8,
+        ttls={
+            NHentaiSortOrder.RECENT: 0,
+            NHentaiSortOrder.POPULAR_ALL_TIME: 60,
+        },
+    )
+    page = NHentaiSearchPage(NHentaiSearchResult(1, [185217], ["title"]), 3)
+
+    cache.put("english", 1, NHentaiSortOrder.RECENT, page)
+    cache.put("english", 1, NHentaiSortOrder.POPULAR_ALL_TIME, page)
+
+    # Recent results expire right away, popular ones don't
+    assert cache.get("english", 1, NHentaiSortOrder.RECENT) is None
+    assert cache.get("english", 1, NHentaiSortOrder.POPULAR_ALL_TIME) is page
+
+    # Queries are normalized
+    assert cache.get(" English ", 1, NHentaiSortOrder.POPULAR_ALL_TIME) is page
+    assert cache.get("english", 2, NHentaiSortOrder.POPULAR_ALL_TIME) is None
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture_page(name: str) -> NHentaiWebPage:
+    return NHentaiWebPage("fixture", (FIXTURES / name).read_text())
+
+
+@pytest.mark.parametrize("parser", ("lxml", "bs4"))
+def test_parse_gallery_fixture(parser: str):
+    page = fixture_page("nhentai_gallery.html")
+    raise_for_gallery_page(page, parser)
+
+    gallery = parse_gallery_from_page(page, parser)
+
+    assert gallery.gallery_id == 185217
+    assert gallery.images_id == 1019423
+    assert (
+        gallery.title == "(C91) [HitenKei (Hiten)] R.E.I.N.A [English] [Scrubs]"
+    )
+    assert len(gallery) == 250
+    assert gallery[0] == "https://i3.nhentai.net/galleries/1019423/1.jpg"
+    assert gallery[16] == "https://i3.nhentai.net/galleries/1019423/17.png"
+    assert gallery.tags[:2] == ["sole female", "sole male"]
+    assert gallery.provider == "fixture"
+
+
+def test_gallery_page_urls():
+    gallery = NHentaiGallery(
+        185217,
+        "title",
+        1019423,
+        encode_page_extensions(["png", "jpg", "gif"]),
+        [],
+        "test",
+    )
+    base = "https://i3.nhentai.net/galleries/1019423"
+
+    assert len(gallery) == 3
+    assert list(gallery) == [f"{base}/1.png", f"{base}/2.jpg", f"{base}/3.gif"]
+    assert gallery[-1] == f"{base}/3.gif"
+    assert gallery[1:] == [f"{base}/2.jpg", f"{base}/3.gif"]
+    assert gallery.cover_url == (
+        "https://t.nhentai.net/galleries/1019423/cover.png"
+    )
+    with pytest.raises(IndexError):
+        gallery[3]
+    with pytest.raises(IndexError):
+        gallery[-4]
+
+    session = NHentaiGallerySession(gallery, 2)
+    assert session.current_page_url == f"{base}/2.jpg"
+    assert session.current_page_filename == "185217_page_2.jpg"
+
+
+@pytest.mark.parametrize(
+    "name, page_number, num_results, maximum_pages",
+    (
+        ("nhentai_search.html", 1, 25, 1234),
+        ("nhentai_search_last.html", 1234, 13, 1234),
+    ),
+)
+@pytest.mark.parametrize("parser", ("lxml", "bs4"))
+def test_parse_search_fixture(
+    parser: str,
+    name: str,
+    page_number: int,
+    num_results: int,
+    maximum_pages: int,
+):
+    page = fixture_page(name)
+    raise_for_search_page(page, parser)
+
+    result = parse_search_result_from_page(page, parser)
+
+    assert result.page_number == page_number
+    assert len(result.gallery_ids) == len(result.titles) == num_results
+    assert result.titles[0].endswith("[English] [Digital]")
+    assert parse_maximum_search_pages(page, parser) == maximum_pages
+
+
+def test_parsers_agree():
+    for name in ("nhentai_search.html", "nhentai_search_last.html"):
+        assert parse_search_result_from_page(
+            fixture_page(name), "lxml"
+        ) == parse_search_result_from_page(fixture_page(name), "bs4")
+
+    assert parse_gallery_from_page(
+        fixture_page("nhentai_gallery.html"), "lxml"
+    ) == parse_gallery_from_page(fixture_page("nhentai_gallery.html"), "bs4")
+
+
+@pytest.mark.parametrize("parser", ("lxml", "bs4"))
+@pytest.mark.parametrize(
+    "html, error",
+    (
+        ("", InvalidProxyError),
+        (
+            "<html><head><title>Just a moment...</title></head>"
+            "<body>Just a moment...</body></html>",
+            InvalidProxyError,
+        ),
+        (
+            "<html><head><meta><meta><meta>"
+            "<title>404 - Not Found</title></head><body></body></html>",
+            PageParsingError,
+        ),
+    ),
+)
+def test_raise_for_invalid_gallery_page(parser: str, html: str, error: type):
+    with pytest.raises(error):
+        raise_for_gallery_page(NHentaiWebPage("fixture", html), parser)
+
+
+@pytest.mark.parametrize(
+    "name, old, new",
+    (
+        ("nhentai_gallery.html", '<a href="/g/185217/1/">', "<span>"),
+        ("nhentai_search.html", 'class="caption"', 'class="subtitle"'),
+        ("nhentai_search.html", "page current", "page"),
+    ),
+)
+def test_lxml_parser_missing_elements(name: str, old: str, new: str):
+    html = (FIXTURES / name).read_text()
+    assert old in html
+    page = NHentaiWebPage("fixture", html.replace(old, new, 1))
+
+    parse = (
+        parse_gallery_from_page
+        if name == "nhentai_gallery.html"
+        else parse_search_result_from_page
+    )
+    with pytest.raises(ValueError):
+        parse(page, "lxml")
+
+
+async def test_parse_in_process_pool():
+    """
+    Pages parsed in a worker process come back as plain data,
+    and so do parsing errors.
+    """
+    pool = OffloadPool("process", max_workers=1)
+    html = (FIXTURES / "nhentai_gallery.html").read_text()
+
+    gallery = await pool.run(gallery_from_html, "fixture", html)
+    assert gallery == gallery_from_html("fixture", html)
+
+    with pytest.raises(InvalidProxyError):
+        await pool.run(search_page_from_html, "fixture", "")
+
+    pool.shutdown()
+
+
+def test_mirror_progress_document():
+    gallery = NHentaiGallery(
+        185217,
+        "title",
+        1019423,
+        encode_page_extensions(["jpg"] * 4),
+        ["sole female"],
+        "test",
+    )
+    progress = MirrorProgress(gallery, mirrored_pages=3, failed_pages=[4])
+    progress.uploaded_pages = 2
+    progress.elapsed = 4.0
+
+    doc = progress.to_document()
+    assert doc["_id"] == 185217
+
+    restored = MirrorProgress.from_document(doc)
+    assert restored == progress
+    assert restored.status == MirrorStatus.RUNNING
+    assert restored.throughput == 0.5
+    assert restored.summary == (
+        "running: 3/4 pages (75%), 0.5 pages/s, 1 failed"
+    )
+
+    # Saved by a version with different gallery fields
+    doc["gallery"]["pages"] = doc["gallery"].pop("page_extensions")
+    assert MirrorProgress.from_document(doc) is None
@@ -1,14 +1,27 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+
 import pytest
 from interactions.api.events import MessageCreate
 
 from comrade.core.comrade_client import Comrade
+from comrade.core.configuration import NHENTAI_PREFETCH_MAX_DEPTH
 from comrade.lib.nhentai import search as nh_search
+from comrade.lib.nhentai.gallery_cache import GalleryCache
+from comrade.lib.nhentai.mirror import MirrorProgress, MirrorStatus
 from comrade.lib.nhentai.proxies import NHentaiSource, NHentaiWebProxy
+from comrade.lib.nhentai.structures import (
+    NHentaiGallery,
+    NHentaiGallerySession,
+)
 from comrade.lib.testing_utils import (
     CapturingContext,
     wait_for_message_or_fetch,
 )
 from comrade.modules.nhentai_cmds import NHentai
+from comrade.modules.nhentai_cmds.mirror_cmds import NHMirrorHandler
+from comrade.modules.nhentai_cmds.page_handler import NHPageHandler
 
 
 @pytest.fixture(scope="module")
@@ -135,6 +148,26 @@ async def test_gallery_not_exist(
     assert msg.content == "Gallery `-1` was not found."
 
 
+@pytest.mark.bot
+async def test_gallery_from_cache(
+    offline_ctx: CapturingContext,
+    nhentai_ext: NHentai,
+    blocked_sources: list[NHentaiSource],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    A gallery opened recently is served from the gallery cache,
+    without contacting any source.
+    """
+    with monkeypatch.context() as m:
+        m.setattr(nh_search, "ORDERED_SOURCES", blocked_sources)
+
+        await nhentai_ext.nhentai_gallery.callback(offline_ctx, 266745)
+
+        start_embed = offline_ctx.captured_message.embeds[0]
+        assert start_embed.url == "https://nhentai.net/g/266745/"
+
+
 @pytest.mark.bot
 async def test_bad_proxy(
     offline_ctx: CapturingContext,
@@ -144,6 +177,7 @@ async def test_bad_proxy(
 ):
     with monkeypatch.context() as m:
         m.setattr(nh_search, "ORDERED_SOURCES", blocked_sources)
+        m.setattr(nhentai_ext, "gallery_cache", GalleryCache())
 
         await nhentai_ext.nhentai_gallery.callback(offline_ctx, 266745)
 
@@ -152,3 +186,81 @@ async def test_bad_proxy(
             msg.content
             == "No NHentai proxies returned a valid response (bot was defeated by anti-bot mechanisms)"
         )
+
+
+@pytest.mark.bot
+async def test_gallery_mirror(
+    offline_ctx: CapturingContext,
+    nhentai_ext: NHentai,
+    blocked_sources: list[NHentaiSource],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    A fully mirrored gallery is read without contacting any source.
+    """
+    gallery = await nhentai_ext.fetch_gallery(266745)
+    progress = await nhentai_ext.mirror_gallery(MirrorProgress(gallery))
+
+    assert progress.status == MirrorStatus.DONE
+    assert progress.mirrored_pages == len(gallery)
+    assert 266745 not in nhentai_ext.mirror_jobs
+
+    with monkeypatch.context() as m:
+        m.setattr(nh_search, "ORDERED_SOURCES", blocked_sources)
+        m.setattr(nhentai_ext, "gallery_cache", GalleryCache())
+
+        await nhentai_ext.nhentai_gallery.callback(offline_ctx, 266745)
+
+        start_embed = offline_ctx.captured_message.embeds[0]
+        assert start_embed.url == "https://nhentai.net/g/266745/"
+
+
+def test_adaptive_prefetch_depth():
+    handler = NHPageHandler()
+    handler.page_response_times = deque([0.1] * 8 + [3.0] * 2)
+
+    fast_reader = NHentaiGallerySession(None, turn_interval=1.0)
+    slow_reader = NHentaiGallerySession(None, turn_interval=120.0)
+    new_reader = NHentaiGallerySession(None)
+
+    assert handler.prefetch_depth(fast_reader) == 3
+    assert handler.prefetch_depth(slow_reader) == 1
+    assert handler.prefetch_depth(new_reader) == 2
+
+    # Never beyond the configured maximum
+    frantic_reader = NHentaiGallerySession(None, turn_interval=0.01)
+    assert handler.prefetch_depth(frantic_reader) == NHENTAI_PREFETCH_MAX_DEPTH
+
+
+async def test_mirror_resume_waits_for_relay():
+    gallery = NHentaiGallery(123456, "title", 1, b"\x00" * 3, [], "test")
+    saved: list[dict] = []
+
+    class FakeMirrors:
+        async def find(self, query: dict) -> list[dict]:
+            return [MirrorProgress(gallery).to_document()]
+
+        async def update_one(self, query: dict, update: dict, upsert: bool):
+            saved.append(update["$set"])
+
+    handler = NHMirrorHandler()
+    handler.bot = SimpleNamespace(
+        relay_ready=asyncio.Event(),
+        async_db=SimpleNamespace(nhentaiMirrors=FakeMirrors()),
+    )
+
+    resume = asyncio.create_task(handler.resume_mirror_jobs.callback(handler))
+    await asyncio.sleep(0.01)
+    assert not resume.done()
+    assert 123456 not in handler.mirror_jobs
+
+    # A relay which never came up crashes the job; it is marked as failed
+    handler.bot.relay_ready.set()
+    await resume
+    while handler.mirror_tasks:
+        await asyncio.sleep(0.01)
+    assert saved[-1]["status"] == MirrorStatus.FAILED
+
+    # Resumed only once, whenever on_ready fires again
+    await handler.resume_mirror_jobs.callback(handler)
+    assert len(saved) == 1
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from interactions import (
     ComponentType,
@@ -5,13 +7,21 @@ from interactions import (
 )
 
 from comrade.core.comrade_client import Comrade
+from comrade.core.configuration import NHENTAI_SEARCH_PREFETCH_COUNT
+from comrade.lib.concurrency import PrefetchScheduler
 from comrade.lib.nhentai import search as nh_search
 from comrade.lib.nhentai.proxies import NHentaiSource, NHentaiWebProxy
-from comrade.lib.nhentai.structures import NHentaiSortOrder
+from comrade.lib.nhentai.search_cache import SearchCache
+from comrade.lib.nhentai.structures import (
+    NHentaiSearchResult,
+    NHentaiSearchSession,
+    NHentaiSortOrder,
+)
 from comrade.lib.testing_utils import (
     CapturingContext,
 )
 from comrade.modules.nhentai_cmds import NHentai
+from comrade.modules.nhentai_cmds.search_cmds import NHSearchHandler
 
 
 @pytest.fixture(scope="module")
@@ -118,6 +128,7 @@ async def test_search_bad_proxy(
 ):
     with monkeypatch.context() as m:
         m.setattr(nh_search, "ORDERED_SOURCES", blocked_sources)
+        m.setattr(nhentai_ext, "search_cache", SearchCache())
 
         await nhentai_ext.nhentai_search.callback(
             offline_ctx,
@@ -129,3 +140,43 @@ async def test_search_bad_proxy(
         assert start_msg.content == (
             "No NHentai proxies returned a valid response (bot was defeated by anti-bot mechanisms)"
         )
+
+
+async def test_search_prefetch_top_results(monkeypatch: pytest.MonkeyPatch):
+    handler = NHSearchHandler()
+    prefetched = []
+
+    async def prefetch_gallery_start(gallery_id: int):
+        prefetched.append(gallery_id)
+        await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(
+        handler, "prefetch_gallery_start", prefetch_gallery_start
+    )
+    monkeypatch.setattr(handler, "prefetch_scheduler", PrefetchScheduler(2, 1))
+
+    session = NHentaiSearchSession("english", {}, 2, NHentaiSortOrder.RECENT)
+    first_page = NHentaiSearchResult(1, list(range(100, 125)), ["title"] * 25)
+    second_page = NHentaiSearchResult(2, list(range(200, 225)), ["title"] * 25)
+
+    assert (
+        handler.schedule_search_prefetch(session, first_page)
+        == NHENTAI_SEARCH_PREFETCH_COUNT
+    )
+
+    # Moving to the next page cancels the rest of the first page
+    async def first_prefetch():
+        while not prefetched:
+            await asyncio.sleep(0)
+
+    await asyncio.wait_for(first_prefetch(), timeout=1)
+    handler.schedule_search_prefetch(session, second_page)
+    await asyncio.sleep(0.1)
+
+    # One gallery at a time, best ranked first
+    assert prefetched[0] == 100
+    assert prefetched[1:] == list(
+        range(200, 200 + NHENTAI_SEARCH_PREFETCH_COUNT)
+    )
+
+    await handler.prefetch_scheduler.close()